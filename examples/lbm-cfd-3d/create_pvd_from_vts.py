@@ -5,11 +5,30 @@ Creates ParaView Data (PVD) files for both vorticity and velocity visualization.
 Auto-detects available VTS files and creates appropriate PVD collections.
 """
 
+import json
 import os
 import re
 import argparse
 import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import numpy as np
+
+# VTK XML data types -> NumPy (little endian, as declared by byte_order in the files)
+VTK_TYPES = {
+    'Int8': '<i1', 'UInt8': '<u1', 'Int16': '<i2', 'UInt16': '<u2', 'Int32': '<i4', 'UInt32': '<u4',
+    'Int64': '<i8', 'UInt64': '<u8', 'Float32': '<f4', 'Float64': '<f8'
+}
+CHUNK_SIZE = 16 * 1024 * 1024     # bytes of ASCII read per step while parsing
+ZLIB_BLOCK_SIZE = 1024 * 1024     # uncompressed bytes per compressed block
+
+# per-rank piece files: <dataset>_p<rank>.vts, grouped into <dataset>.pvts
+PIECE_PATTERN = re.compile(r'^(.+_t\d+)_p\d+\.vts$')
+TAG_PATTERN = re.compile(rb'<(/?)(StructuredGrid|Piece|Points|PointData|CellData|DataArray|AppendedData)\b([^>]*)>')
+INDEX_FILE = '.pvd_index.jsonl'
+PVD_TAIL = '  </Collection>\n</VTKFile>\n'
 
 def extract_timestep(filename):
     """Extract timestep from VTS filename."""
@@ -39,12 +58,196 @@ def create_pvd_file(vts_files, output_file, data_type):
     print(f"  ✓ {data_type.capitalize()}: {len(vts_files)} files (t={min(timesteps)}-{max(timesteps)})")
     return True
 
-def scan_vts_files(input_dir):
-    """Scan directory for VTS files and categorize them."""
+def parse_attributes(tag):
+    """Parse the attributes of an XML start tag into a dict."""
+    return dict(re.findall(r'([\w:]+)="([^"]*)"', tag))
+
+def read_ascii_vts(path):
+    """
+    Stream-parse an ASCII VTS file into its XML skeleton and NumPy arrays.
+    Only one chunk of text is held at a time, values are parsed as they are read.
+    Returns a list of items: str for the XML between arrays, (attributes, array) for each DataArray.
+    """
+    items = []
+    text = []
+    open_tag = b'<DataArray'
+    close_tag = b'</DataArray>'
+    with open(path, 'rb') as f:
+        buffer = b''
+        at_end = False
+        array = None
+        while True:
+            if array is None:
+                # outside of a DataArray: copy text until the next DataArray start tag is complete
+                start = buffer.find(open_tag)
+                tag_end = buffer.find(b'>', start) if start >= 0 else -1
+                if tag_end >= 0:
+                    text.append(buffer[:start])
+                    tag = buffer[start:tag_end + 1].decode()
+                    buffer = buffer[tag_end + 1:]
+                    attributes = parse_attributes(tag)
+                    if tag.endswith('/>') or attributes.get('format', 'ascii') != 'ascii':
+                        # nothing to convert (empty, or not written by the simulation)
+                        text.append(tag.encode())
+                    else:
+                        items.append(b''.join(text).decode())
+                        text = []
+                        array = (attributes, [])
+                    continue
+                if at_end:
+                    text.append(buffer)
+                    items.append(b''.join(text).decode())
+                    break
+                if start < 0 and len(buffer) >= len(open_tag):
+                    # keep a possible partial start tag for the next chunk
+                    keep = len(open_tag) - 1
+                    text.append(buffer[:-keep])
+                    buffer = buffer[-keep:]
+            else:
+                # inside a DataArray: parse complete numbers, keep a possibly cut one for the next chunk
+                attributes, parts = array
+                dtype = np.dtype(VTK_TYPES[attributes.get('type', 'Float32')])
+                end = buffer.find(close_tag)
+                if end >= 0:
+                    parts.append(np.fromstring(buffer[:end], dtype=dtype, sep=' '))
+                    buffer = buffer[end + len(close_tag):]
+                    items.append((attributes, np.concatenate(parts)))
+                    array = None
+                    continue
+                if at_end:
+                    raise ValueError(f'{path}: unterminated DataArray {attributes.get("Name", "")}')
+                cut = max(buffer.rfind(b' '), buffer.rfind(b'\n'), buffer.rfind(b'\t'))
+                if cut > 0:
+                    parts.append(np.fromstring(buffer[:cut], dtype=dtype, sep=' '))
+                    buffer = buffer[cut:]
+            chunk = f.read(CHUNK_SIZE)
+            at_end = not chunk
+            buffer += chunk
+    return items
+
+def encode_block(values, compression, zlib_level):
+    """Encode array as VTK appended data block (UInt64 header, optionally zlib compressed in blocks)."""
+    data = memoryview(np.ascontiguousarray(values)).cast('B')
+    if compression == 'raw':
+        return [np.array([len(data)], dtype='<u8').tobytes(), data]
+    blocks = [zlib.compress(data[start:start + ZLIB_BLOCK_SIZE], zlib_level) for start in range(0, len(data), ZLIB_BLOCK_SIZE)]
+    # header: number of blocks, block size, size of the last block, compressed size of every block
+    last_size = len(data) - (len(blocks) - 1) * ZLIB_BLOCK_SIZE if blocks else 0
+    header = np.array([len(blocks), ZLIB_BLOCK_SIZE, last_size] + [len(block) for block in blocks], dtype='<u8')
+    return [header.tobytes()] + blocks
+
+def write_binary_vts(path, items, compression, zlib_level):
+    """Write parsed VTS items as binary appended VTS (written to a temporary file, then renamed)."""
+    xml = []
+    appended = []
+    offset = 0
+    for item in items:
+        if isinstance(item, str):
+            if '<VTKFile' in item:
+                # appended blocks use UInt64 headers (VTK XML format version 1.0)
+                start = item.index('<VTKFile')
+                end = item.index('>', start)
+                attributes = parse_attributes(item[start:end])
+                attributes.update(version='1.0', header_type='UInt64')
+                if compression == 'zlib':
+                    attributes['compressor'] = 'vtkZLibDataCompressor'
+                tag = '<VTKFile ' + ' '.join(f'{key}="{value}"' for key, value in attributes.items()) + '>'
+                item = item[:start] + tag + item[end + 1:]
+            if '</VTKFile>' in item:
+                end = item.index('</VTKFile>')
+                xml.append(item[:end])
+                xml.append(None)
+                xml.append(item[end:])
+            else:
+                xml.append(item)
+        else:
+            attributes, values = item
+            attributes = {key: value for key, value in attributes.items() if key != 'format'}
+            attributes.update(format='appended', offset=str(offset))
+            xml.append('<DataArray ' + ' '.join(f'{key}="{value}"' for key, value in attributes.items()) + '/>')
+            blocks = encode_block(values, compression, zlib_level)
+            appended.extend(blocks)
+            offset += sum(len(block) for block in blocks)
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        for text in xml:
+            if text is None:
+                f.write(b'  <AppendedData encoding="raw">\n   _')
+                for block in appended:
+                    f.write(block)
+                f.write(b'\n  </AppendedData>\n')
+            else:
+                f.write(text.encode())
+    os.replace(temporary, path)
+
+def is_converted(source, target, compression):
+    """Check whether target is a conversion of source with the requested compression."""
+    if not os.path.exists(target):
+        return False
+    if os.path.exists(source) and os.path.getmtime(target) < os.path.getmtime(source):
+        return False
+    with open(target, 'rb') as f:
+        header = f.read(512)
+    return (b'vtkZLibDataCompressor' in header) == (compression == 'zlib')
+
+def convert_file(source, target, compression, zlib_level, remove_ascii):
+    """Convert one ASCII VTS file (runs in a worker process). Returns (source size, target size)."""
+    items = read_ascii_vts(source)
+    write_binary_vts(target, items, compression, zlib_level)
+    source_size = os.path.getsize(source)
+    if remove_ascii:
+        os.remove(source)
+    return (source_size, os.path.getsize(target))
+
+def convert_vts_files(input_dir, output_dir, filenames, compression, zlib_level, jobs, remove_ascii):
+    """Convert VTS files in parallel, skipping files already converted. Returns the names that are converted."""
+    if not filenames:
+        return set()
+    os.makedirs(output_dir, exist_ok=True)
+    pending = []
+    converted = set()
+    for filename in filenames:
+        source, target = os.path.join(input_dir, filename), os.path.join(output_dir, filename)
+        if os.path.exists(source) and not is_converted(source, target, compression):
+            pending.append(filename)
+        elif os.path.exists(target):
+            # source removed earlier -> keep the converted file even if it was written with another compression
+            converted.add(filename)
+            if remove_ascii and os.path.exists(source):
+                os.remove(source)
+    if not pending:
+        print(f"  ✓ Conversion: {len(converted)} files already converted")
+        return converted
+
+    start = time.perf_counter()
+    total_source = total_target = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {filename: pool.submit(convert_file, os.path.join(input_dir, filename), os.path.join(output_dir, filename),
+                                         compression, zlib_level, remove_ascii)
+                   for filename in pending}
+        for filename, future in futures.items():
+            try:
+                source_size, target_size = future.result()
+            except (OSError, ValueError, KeyError) as error:
+                print(f"  ✗ {filename}: {error}")
+                continue
+            converted.add(filename)
+            total_source += source_size
+            total_target += target_size
+    elapsed = time.perf_counter() - start
+    ratio = total_source / total_target if total_target else 0
+    print(f"  ✓ Conversion ({compression}): {len(pending)} files, {total_source / 2**20:.1f} MiB -> "
+          f"{total_target / 2**20:.1f} MiB ({ratio:.1f}x smaller) in {elapsed:.1f}s, "
+          f"{len(converted) - len(pending)} already converted")
+    return converted
+
+def scan_vts_files(input_dir, filenames=None):
+    """Scan directory (or the given filenames) for VTS files and categorize them."""
     vorticity_files = []
     velocity_files = []
     
-    for filename in os.listdir(input_dir):
+    for filename in (os.listdir(input_dir) if filenames is None else filenames):
         if filename.endswith('.vts'):
             timestep = extract_timestep(filename)
             if timestep is not None:
@@ -55,6 +258,285 @@ def scan_vts_files(input_dir):
     
     return vorticity_files, velocity_files
 
+def scan_vts_pieces(filenames):
+    """Group per-rank piece files by their parallel dataset name (e.g. simulation_state_t00500)."""
+    pieces = {}
+    for filename in filenames:
+        match = PIECE_PATTERN.match(filename)
+        if match and match.group(1).startswith(('simulation_state_', 'velocity_vectors_')):
+            pieces.setdefault(match.group(1), []).append(filename)
+    return pieces
+
+def is_complete(path):
+    """Check whether a VTS file was written completely (the simulation may still be writing it)."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 64))
+            return b'</VTKFile>' in f.read()
+    except OSError:
+        return False
+
+def read_piece_info(path, arrays=True):
+    """Read the extents and (with arrays) the array declarations of a VTS piece, the data itself is skipped."""
+    info = {'whole_extent': None, 'extent': None, 'points': None, 'point_data': [], 'cell_data': []}
+    section = None
+    with open(path, 'rb') as f:
+        buffer = b''
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            buffer += chunk
+            # only look at complete tags, a tag cut at the end of the chunk is kept for the next one
+            end = buffer.rfind(b'<') if chunk else len(buffer)
+            for match in TAG_PATTERN.finditer(buffer, 0, max(end, 0)):
+                closing, name, attributes = match.group(1), match.group(2).decode(), parse_attributes(match.group(3).decode())
+                if name == 'AppendedData' or (closing and name == 'Piece'):
+                    return info
+                if closing:
+                    section = None
+                elif name == 'StructuredGrid':
+                    info['whole_extent'] = attributes['WholeExtent']
+                elif name == 'Piece':
+                    info['extent'] = attributes['Extent']
+                    if not arrays:
+                        return info
+                elif name in ('Points', 'PointData', 'CellData'):
+                    section = name
+                elif section == 'Points':
+                    info['points'] = attributes
+                elif section == 'PointData':
+                    info['point_data'].append(attributes)
+                elif section == 'CellData':
+                    info['cell_data'].append(attributes)
+            if not chunk:
+                return info
+            buffer = buffer[end:] if end >= 0 else b''
+
+def count_cells(extent):
+    """Number of cells in a VTK extent string ("x0 x1 y0 y1 z0 z1"), flat axes count as one cell."""
+    bounds = [int(value) for value in extent.split()]
+    return max(bounds[1] - bounds[0], 1) * max(bounds[3] - bounds[2], 1) * max(bounds[5] - bounds[4], 1)
+
+def write_pvts_file(path, info, pieces):
+    """Write a parallel VTS file with the arrays declared in info for a list of (piece filename, extent)."""
+    def declaration(attributes):
+        return (f'<PDataArray type="{attributes.get("type", "Float32")}" Name="{attributes.get("Name", "")}" '
+                f'NumberOfComponents="{attributes.get("NumberOfComponents", "1")}"/>')
+
+    lines = ['<?xml version="1.0"?>',
+             '<VTKFile type="PStructuredGrid" version="0.1" byte_order="LittleEndian">',
+             f'  <PStructuredGrid WholeExtent="{info["whole_extent"]}" GhostLevel="0">']
+    for tag, key in (('PPointData', 'point_data'), ('PCellData', 'cell_data')):
+        if info[key]:
+            lines.append(f'    <{tag}>')
+            lines.extend(f'      {declaration(attributes)}' for attributes in info[key])
+            lines.append(f'    </{tag}>')
+    lines.append('    <PPoints>')
+    lines.append(f'      {declaration(info["points"] or {"NumberOfComponents": "3"})}')
+    lines.append('    </PPoints>')
+    lines.extend(f'    <Piece Extent="{extent}" Source="{filename}"/>' for filename, extent in pieces)
+    lines.append('  </PStructuredGrid>')
+    lines.append('</VTKFile>')
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(temporary, path)
+
+def append_pvd_file(vts_files, output_file, data_type):
+    """Append datasets to an existing PVD file without rewriting it. Returns False if the file has to be rebuilt."""
+    tail = PVD_TAIL.encode()
+    try:
+        with open(output_file, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - len(tail)))
+            if f.read() != tail:
+                return False
+            f.seek(size - len(tail))
+            f.truncate()
+            for filename, timestep in sorted(vts_files, key=lambda x: x[1]):
+                f.write(f'    <DataSet timestep="{float(timestep)}" group="" part="0" file="{filename}"/>\n'.encode())
+            f.write(tail)
+    except FileNotFoundError:
+        return False
+    timesteps = [timestep for _, timestep in vts_files]
+    print(f"  ✓ {data_type.capitalize()}: +{len(vts_files)} files (t={min(timesteps)}-{max(timesteps)})")
+    return True
+
+# Datasets listed in the PVD files, persisted next to them so later updates only handle new files
+#
+# JSON lines: a settings line, then one line per dataset ({"pvd", "file", "timestep", "sources"}). Lines are only
+# appended, so an update costs O(new files) no matter how many time steps the run already has.
+class CollectionIndex:
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.entries = {}
+        self.sources = set()
+
+    def load(self):
+        """Load the index. Returns False if it is missing or was written with other settings."""
+        try:
+            with open(self.path) as f:
+                if json.loads(f.readline() or 'null') != {'settings': self.settings}:
+                    return False
+                for line in f:
+                    if not line.endswith('\n'):
+                        # interrupted while appending
+                        break
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry['pvd'], []).append((entry['file'], entry['timestep']))
+                    self.sources.update(entry['sources'])
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def reset(self):
+        """Start an empty index."""
+        self.entries = {}
+        self.sources = set()
+        with open(self.path, 'w') as f:
+            f.write(json.dumps({'settings': self.settings}) + '\n')
+
+    def add(self, pvd, datasets):
+        """Record new datasets of a PVD file, [(file, timestep, sources)]."""
+        with open(self.path, 'a') as f:
+            for filename, timestep, sources in datasets:
+                f.write(json.dumps({'pvd': pvd, 'file': filename, 'timestep': timestep, 'sources': sources}) + '\n')
+                self.entries.setdefault(pvd, []).append((filename, timestep))
+                self.sources.update(sources)
+
+def collect_datasets(input_dir, filenames, args, pending_pieces):
+    """
+    Turn new VTS files into PVD datasets: convert them (if requested) and group complete sets of
+    pieces into .pvts files. Pieces of incomplete sets stay in pending_pieces for a later update.
+    Returns {data type: [(dataset path relative to input_dir, timestep, source filenames)]}.
+    """
+    dataset_dir = os.path.join(input_dir, args.converted_dir) if args.convert else input_dir
+
+    def locate(filename):
+        # converted files whose ASCII source was removed are used as they are
+        source = os.path.join(input_dir, filename)
+        return source if os.path.exists(source) else os.path.join(dataset_dir, filename)
+
+    # sets of pieces are complete once their cells cover the whole extent (pieces only share boundary points)
+    for name, pieces in scan_vts_pieces(filenames).items():
+        for filename in pieces:
+            info = read_piece_info(locate(filename), arrays=False)
+            pending_pieces.setdefault(name, {'whole_extent': info['whole_extent'], 'extents': {}})['extents'][filename] = info['extent']
+    complete = {}
+    for name, group in pending_pieces.items():
+        if sum(count_cells(extent) for extent in group['extents'].values()) >= count_cells(group['whole_extent']):
+            complete[name] = dict(sorted(group['extents'].items()))
+    for name in complete:
+        del pending_pieces[name]
+
+    vorticity_files, velocity_files = scan_vts_files(input_dir, filenames)
+    if args.convert:
+        pieces = [filename for extents in complete.values() for filename in extents]
+        converted = convert_vts_files(input_dir, dataset_dir, [filename for filename, _ in vorticity_files + velocity_files] + pieces,
+                                      args.convert, args.zlib_level, args.jobs, args.remove_ascii)
+        vorticity_files = [(filename, timestep) for filename, timestep in vorticity_files if filename in converted]
+        velocity_files = [(filename, timestep) for filename, timestep in velocity_files if filename in converted]
+        complete = {name: extents for name, extents in complete.items() if all(filename in converted for filename in extents)}
+
+    relative_dir = os.path.relpath(dataset_dir, input_dir)
+    datasets = {
+        'vorticity': [(Path(relative_dir, filename).as_posix(), timestep, [filename]) for filename, timestep in vorticity_files],
+        'velocity': [(Path(relative_dir, filename).as_posix(), timestep, [filename]) for filename, timestep in velocity_files]
+    }
+    for name, extents in complete.items():
+        # array declarations are the same in every piece (converted pieces have them in the first few hundred bytes)
+        info = read_piece_info(os.path.join(dataset_dir, next(iter(extents))))
+        write_pvts_file(os.path.join(dataset_dir, name + '.pvts'), info, list(extents.items()))
+        data_type = 'vorticity' if name.startswith('simulation_state_') else 'velocity'
+        datasets[data_type].append((Path(relative_dir, name + '.pvts').as_posix(), extract_timestep(name + '.vts'), list(extents)))
+    return datasets
+
+def list_new_files(input_dir, args, known, pending, incomplete, rescan=True):
+    """
+    List VTS files not handled yet and completely written (without rescan: only check the incomplete ones again).
+    known: filenames in the index, pending: pieces waiting for the rest of their set.
+    """
+    filenames = set(incomplete)
+    converted_dir = os.path.join(input_dir, args.converted_dir)
+    directories = [input_dir]
+    if args.convert and os.path.isdir(converted_dir):
+        # converted files whose ASCII source was removed
+        directories.append(converted_dir)
+    if rescan:
+        for directory in directories:
+            filenames.update(filename for filename in os.listdir(directory)
+                             if filename.endswith('.vts') and filename not in known and filename not in pending)
+    new_files = []
+    for filename in filenames:
+        if filename.endswith('.vts'):
+            if is_complete(os.path.join(input_dir, filename)) or is_complete(os.path.join(converted_dir, filename)):
+                new_files.append(filename)
+                incomplete.discard(filename)
+            else:
+                incomplete.add(filename)
+    return new_files
+
+def rebuild_collections(input_dir, args, index, pending_pieces):
+    """Create the PVD files and the index from all VTS files in the input directory."""
+    incomplete = set()
+    filenames = list_new_files(input_dir, args, set(), set(), incomplete)
+    datasets = collect_datasets(input_dir, filenames, args, pending_pieces)
+    index.reset()
+    for data_type, output in (('vorticity', args.vorticity_output), ('velocity', args.velocity_output)):
+        if datasets[data_type]:
+            create_pvd_file([(filename, timestep) for filename, timestep, _ in datasets[data_type]],
+                            os.path.join(input_dir, output), data_type)
+            index.add(output, datasets[data_type])
+    return incomplete
+
+def update_collections(input_dir, args, index, pending_pieces, incomplete, rescan):
+    """Append the datasets of new VTS files to the PVD files. Returns whether anything was added."""
+    pending = {filename for group in pending_pieces.values() for filename in group['extents']}
+    filenames = list_new_files(input_dir, args, index.sources, pending, incomplete, rescan)
+    if not filenames:
+        return False
+    datasets = collect_datasets(input_dir, filenames, args, pending_pieces)
+    for data_type, output in (('vorticity', args.vorticity_output), ('velocity', args.velocity_output)):
+        if datasets[data_type]:
+            index.add(output, datasets[data_type])
+            output_path = os.path.join(input_dir, output)
+            if not append_pvd_file([(filename, timestep) for filename, timestep, _ in datasets[data_type]], output_path, data_type):
+                # missing or edited -> write again from the index
+                create_pvd_file(list(index.entries[output]), output_path, data_type)
+    return True
+
+def watch_collections(input_dir, args):
+    """Keep the PVD files up to date while the simulation writes VTS files (until interrupted)."""
+    index = CollectionIndex(os.path.join(input_dir, INDEX_FILE), index_settings(args))
+    pending_pieces = {}
+    incomplete = set()
+    if not index.load():
+        incomplete = rebuild_collections(input_dir, args, index, pending_pieces)
+    print(f"Watching {input_dir} for new VTS files (Ctrl+C to stop)...")
+    directories_mtime = None
+    try:
+        while True:
+            # the directory listing only changes when files are added or removed
+            mtime = tuple(os.stat(path).st_mtime_ns for path in (input_dir, os.path.join(input_dir, args.converted_dir))
+                          if os.path.isdir(path))
+            if mtime != directories_mtime or incomplete:
+                update_collections(input_dir, args, index, pending_pieces, incomplete, rescan=mtime != directories_mtime)
+                directories_mtime = mtime
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+def index_settings(args):
+    """Settings the index depends on (a different setting rebuilds the PVD files)."""
+    return {
+        'vorticity_output': args.vorticity_output,
+        'velocity_output': args.velocity_output,
+        'convert': args.convert,
+        'converted_dir': args.converted_dir if args.convert else None
+    }
+
 def main():
     parser = argparse.ArgumentParser(
         description="Create PVD files from VTS files for LBM-CFD visualization",
@@ -63,6 +545,8 @@ def main():
 Examples:
   python create_pvd_from_vts.py --input-dir ./paraview
   python create_pvd_from_vts.py --input-dir . --vorticity-output custom_vorticity.pvd
+  python create_pvd_from_vts.py --input-dir ./paraview --convert zlib --jobs 8
+  python create_pvd_from_vts.py --input-dir ./paraview --watch
         """
     )
     
@@ -78,6 +562,38 @@ Examples:
                        default='velocity_vectors.pvd',
                        help='Output filename for velocity PVD (default: velocity_vectors.pvd)')
     
+    parser.add_argument('--convert',
+                       choices=['raw', 'zlib'],
+                       help='Convert ASCII VTS files to binary appended VTS (raw or zlib-compressed) '
+                            'and write the PVD files against the converted files')
+
+    parser.add_argument('--converted-dir',
+                       default='binary',
+                       help='Directory for converted VTS files, relative to the input directory (default: binary)')
+
+    parser.add_argument('--jobs', '-j',
+                       type=int,
+                       default=os.cpu_count(),
+                       help='Number of files converted in parallel (default: number of CPUs)')
+
+    parser.add_argument('--zlib-level',
+                       type=int,
+                       default=6,
+                       help='zlib compression level, 1 (fastest) to 9 (smallest) (default: 6)')
+
+    parser.add_argument('--remove-ascii',
+                       action='store_true',
+                       help='Remove ASCII VTS files after they were converted')
+
+    parser.add_argument('--watch',
+                       action='store_true',
+                       help='Keep running and append new time steps to the PVD files as the simulation writes them')
+
+    parser.add_argument('--interval',
+                       type=float,
+                       default=2.0,
+                       help='Seconds between checks for new files in watch mode (default: 2)')
+
     args = parser.parse_args()
     
     # Convert to absolute path
@@ -87,22 +603,16 @@ Examples:
         print(f"Error: Directory '{input_dir}' does not exist")
         sys.exit(1)
     
-    # Scan for VTS files
-    vorticity_files, velocity_files = scan_vts_files(input_dir)
-    
-    created_files = 0
-    
-    # Create vorticity PVD if files exist
-    if vorticity_files:
-        vorticity_path = os.path.join(input_dir, args.vorticity_output)
-        if create_pvd_file(vorticity_files, vorticity_path, "vorticity"):
-            created_files += 1
-    
-    # Create velocity PVD if files exist  
-    if velocity_files:
-        velocity_path = os.path.join(input_dir, args.velocity_output)
-        if create_pvd_file(velocity_files, velocity_path, "velocity"):
-            created_files += 1
+    if args.watch:
+        watch_collections(input_dir, args)
+        return
+
+    # Scan for VTS files, convert them (files converted before are skipped) and create the PVD files
+    index = CollectionIndex(os.path.join(input_dir, INDEX_FILE), index_settings(args))
+    pending_pieces = {}
+    rebuild_collections(input_dir, args, index, pending_pieces)
+    for name, pieces in sorted(pending_pieces.items()):
+        print(f"  ! {name}: {len(pieces['extents'])} pieces do not cover the whole extent yet, skipped")
     
 if __name__ == "__main__":
     main()
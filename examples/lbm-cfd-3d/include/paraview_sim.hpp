@@ -15,6 +15,8 @@ class LbmDQ;
 void getBest3DPartition(int num_ranks, int dim_x, int dim_y, int dim_z, int *n_x, int *n_y, int *n_z);
 void gatherVelocityComponents(int rank, int num_ranks, LbmDQ* lbm, float* vx_global, float* vy_global, float* vz_global);
 void sendVelocityToRank0(LbmDQ* lbm);
+float* extendBlockToNeighbors(int rank, int num_ranks, LbmDQ* lbm, float** components, int num_components, int* ext_x, int* ext_y, int* ext_z);
+void exportPieceToVTS(int rank, int num_ranks, LbmDQ* lbm, const char* filename, const char* name, float** components, int num_components, double value_scale);
 
 void exportSimulationStateToVTS(LbmDQ* lbm, const char* filename, double dt, double dx, double physical_density, uint32_t time_steps) {
     float* gathered = lbm->getGatheredVorticity();
@@ -305,6 +307,143 @@ void sendVelocityToRank0(LbmDQ* lbm) {
     MPI_Send(vz_local, local_size, MPI_FLOAT, 0, 202, MPI_COMM_WORLD);
 }
 
+// Extend the block owned by this rank by the first plane of its +x, +y and +z neighbors, so neighboring pieces
+// share their boundary points (VTK needs the piece extents to overlap). The axes are exchanged one after the other,
+// so edge and corner points arrive through the planes extended before
+// returns interleaved components (caller deletes), dimensions of the extended block in ext_x, ext_y, ext_z
+float* extendBlockToNeighbors(int rank, int num_ranks, LbmDQ* lbm, float** components, int num_components, int* ext_x, int* ext_y, int* ext_z) {
+    int dims[3] = {int(lbm->getDimX()), int(lbm->getDimY()), int(lbm->getDimZ())};
+    int n[3];
+    getBest3DPartition(num_ranks, lbm->getTotalDimX(), lbm->getTotalDimY(), lbm->getTotalDimZ(), &n[0], &n[1], &n[2]);
+    int coords[3] = {rank % n[0], (rank / n[0]) % n[1], rank / (n[0] * n[1])};
+    int strides[3] = {1, n[0], n[0] * n[1]};
+    int extended[3] = {dims[0] + (coords[0] < n[0]-1 ? 1 : 0), dims[1] + (coords[1] < n[1]-1 ? 1 : 0), dims[2] + (coords[2] < n[2]-1 ? 1 : 0)};
+
+    float* block = new float[extended[0] * extended[1] * extended[2] * num_components];
+    for (int k = 0; k < dims[2]; ++k) {
+        for (int j = 0; j < dims[1]; ++j) {
+            for (int i = 0; i < dims[0]; ++i) {
+                int local_idx = i + dims[0] * (j + dims[1] * k);
+                int block_idx = i + extended[0] * (j + extended[1] * k);
+                for (int c = 0; c < num_components; ++c) {
+                    block[block_idx * num_components + c] = components[c][local_idx];
+                }
+            }
+        }
+    }
+
+    // size of the block filled so far (grows by one plane per axis that has a + neighbor)
+    int filled[3] = {dims[0], dims[1], dims[2]};
+    for (int axis = 0; axis < 3; ++axis) {
+        int a1 = (axis + 1) % 3;
+        int a2 = (axis + 2) % 3;
+        int plane_size = filled[a1] * filled[a2] * num_components;
+        float* send_plane = new float[plane_size];
+        float* recv_plane = new float[plane_size];
+        int pos[3];
+        // own first plane goes to the - neighbor, first plane of the + neighbor is appended
+        pos[axis] = 0;
+        for (int q = 0; q < filled[a2]; ++q) {
+            for (int p = 0; p < filled[a1]; ++p) {
+                pos[a1] = p;
+                pos[a2] = q;
+                int block_idx = pos[0] + extended[0] * (pos[1] + extended[1] * pos[2]);
+                for (int c = 0; c < num_components; ++c) {
+                    send_plane[(p + filled[a1] * q) * num_components + c] = block[block_idx * num_components + c];
+                }
+            }
+        }
+        int minus = (coords[axis] > 0) ? rank - strides[axis] : MPI_PROC_NULL;
+        int plus = (coords[axis] < n[axis]-1) ? rank + strides[axis] : MPI_PROC_NULL;
+        MPI_Sendrecv(send_plane, plane_size, MPI_FLOAT, minus, 300 + axis,
+                     recv_plane, plane_size, MPI_FLOAT, plus, 300 + axis, MPI_COMM_WORLD, MPI_STATUS_IGNORE);
+        if (plus != MPI_PROC_NULL) {
+            pos[axis] = filled[axis];
+            for (int q = 0; q < filled[a2]; ++q) {
+                for (int p = 0; p < filled[a1]; ++p) {
+                    pos[a1] = p;
+                    pos[a2] = q;
+                    int block_idx = pos[0] + extended[0] * (pos[1] + extended[1] * pos[2]);
+                    for (int c = 0; c < num_components; ++c) {
+                        block[block_idx * num_components + c] = recv_plane[(p + filled[a1] * q) * num_components + c];
+                    }
+                }
+            }
+            filled[axis] += 1;
+        }
+        delete[] send_plane;
+        delete[] recv_plane;
+    }
+
+    *ext_x = extended[0];
+    *ext_y = extended[1];
+    *ext_z = extended[2];
+    return block;
+}
+
+// Write the block owned by this rank as one piece of the domain (no gather on rank 0)
+// create_pvd_from_vts.py groups the pieces of a time step into a .pvts file
+// scalar field: components = {x}, vector field: components = {x, y, z}
+void exportPieceToVTS(int rank, int num_ranks, LbmDQ* lbm, const char* filename, const char* name, float** components, int num_components, double value_scale) {
+    int local_x, local_y, local_z;
+    float* block = extendBlockToNeighbors(rank, num_ranks, lbm, components, num_components, &local_x, &local_y, &local_z);
+    int offset_x = lbm->getOffsetX();
+    int offset_y = lbm->getOffsetY();
+    int offset_z = lbm->getOffsetZ();
+
+    FILE* fp = fopen(filename, "w");
+    if (!fp) {
+        fprintf(stderr, "Error: could not open %s for writing\n", filename);
+        delete[] block;
+        return;
+    }
+
+    // Write VTS XML header (whole extent is the global domain, piece extent the block of this rank)
+    fprintf(fp, "<?xml version=\"1.0\"?>\n");
+    fprintf(fp, "<VTKFile type=\"StructuredGrid\" version=\"0.1\" byte_order=\"LittleEndian\">\n");
+    fprintf(fp, "  <StructuredGrid WholeExtent=\"0 %d 0 %d 0 %d\">\n", lbm->getTotalDimX()-1, lbm->getTotalDimY()-1, lbm->getTotalDimZ()-1);
+    fprintf(fp, "    <Piece Extent=\"%d %d %d %d %d %d\">\n", offset_x, offset_x+local_x-1, offset_y, offset_y+local_y-1, offset_z, offset_z+local_z-1);
+
+    // Write points (global coordinates)
+    fprintf(fp, "      <Points>\n");
+    fprintf(fp, "        <DataArray type=\"Float32\" Name=\"Points\" NumberOfComponents=\"3\" format=\"ascii\">\n");
+    for (int k = 0; k < local_z; ++k) {
+        for (int j = 0; j < local_y; ++j) {
+            for (int i = 0; i < local_x; ++i) {
+                fprintf(fp, "          %d %d %d\n", offset_x + i, offset_y + j, offset_z + k);
+            }
+        }
+    }
+    fprintf(fp, "        </DataArray>\n");
+    fprintf(fp, "      </Points>\n");
+
+    // Write point data
+    fprintf(fp, "      <PointData>\n");
+    if (num_components == 3) {
+        fprintf(fp, "        <DataArray type=\"Float32\" Name=\"%s\" NumberOfComponents=\"3\" format=\"ascii\">\n", name);
+    } else {
+        fprintf(fp, "        <DataArray type=\"Float32\" Name=\"%s\" format=\"ascii\">\n", name);
+    }
+    int num_points = local_x * local_y * local_z;
+    for (int idx = 0; idx < num_points; ++idx) {
+        if (num_components == 3) {
+            fprintf(fp, "          %.6f %.6f %.6f\n", block[3*idx] * value_scale, block[3*idx+1] * value_scale, block[3*idx+2] * value_scale);
+        } else {
+            fprintf(fp, "          %.6f\n", block[idx] * value_scale);
+        }
+    }
+    fprintf(fp, "        </DataArray>\n");
+    fprintf(fp, "      </PointData>\n");
+
+    // Close XML structure
+    fprintf(fp, "    </Piece>\n");
+    fprintf(fp, "  </StructuredGrid>\n");
+    fprintf(fp, "</VTKFile>\n");
+
+    fclose(fp);
+    delete[] block;
+}
+
 inline void printSimulationDiagnostics(int t, int rank, LbmDQ* lbm, double dt, double dx, double physical_density, uint32_t time_steps) {
     if (t % 500 == 0 && t <= 10000) {
         lbm->computeVorticity();
@@ -332,4 +471,23 @@ inline void exportVelocityDiagnostics(int t, int rank, int num_ranks, LbmDQ* lbm
     }
 }
 
+inline void exportPieceDiagnostics(int t, int rank, int num_ranks, LbmDQ* lbm, double dt, double dx, bool output_vorticity, bool output_velocity) {
+    // Every rank writes its own piece files in parallel
+    if (t % 500 == 0 && t <= 10000) {
+        char piece_filename[128];
+        double speed_scale = dx / dt;
+        if (output_vorticity) {
+            lbm->computeVorticity();
+            float* vorticity[1] = {lbm->getVorticity()};
+            snprintf(piece_filename, sizeof(piece_filename), "paraview/simulation_state_t%05d_p%04d.vts", t, rank);
+            exportPieceToVTS(rank, num_ranks, lbm, piece_filename, "vorticity", vorticity, 1, speed_scale / dx);
+        }
+        if (output_velocity) {
+            float* velocity[3] = {lbm->getVelocityX(), lbm->getVelocityY(), lbm->getVelocityZ()};
+            snprintf(piece_filename, sizeof(piece_filename), "paraview/velocity_vectors_t%05d_p%04d.vts", t, rank);
+            exportPieceToVTS(rank, num_ranks, lbm, piece_filename, "velocity", velocity, 3, speed_scale);
+        }
+    }
+}
+
 #endif // PARAVIEW_SIM_HPP 
@@ -6,18 +6,31 @@
 #include <cstdint>
 #include <string>
 #include <cstring>
+#include <cstdlib>
 
+#ifdef ASCENT_ENABLED
+#include <ascent.hpp>
+#endif
 
 #include "lbm_mpi.hpp"
 #include "paraview_sim.hpp"
 
-void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y, uint32_t dim_z, uint32_t time_steps, LbmDQ::LatticeType lattice_type, bool output_vorticity, bool output_velocity);
+void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y, uint32_t dim_z, uint32_t time_steps, LbmDQ::LatticeType lattice_type, bool output_vorticity, bool output_velocity, bool output_pieces, void *ptr);
 void exportSimulationStateToVTS(LbmDQ* lbm, const char* filename, double dt, double dx, double physical_density, uint32_t time_steps);
 void exportVelocityDiagnostics(int t, int rank, int num_ranks, LbmDQ* lbm, double dt, double dx, double physical_density, uint32_t time_steps);
+#ifdef ASCENT_ENABLED
+void updateAscentData(int rank, int num_ranks, int step, double time, conduit::Node &mesh);
+void runAscentInSituTasks(conduit::Node &mesh, ascent::Ascent *ascent_ptr);
+void steeringCallback(conduit::Node &params, conduit::Node &output);
+int32_t readFile(const char *filename, char** data_ptr);
+#endif
 
 // global vars for LBM and Barriers
 std::vector<Barrier*> barriers;
 LbmDQ *lbm;
+// inlet speed (m/s), can be changed from the Trame viewer up to the highest speed dt was chosen for
+double flow_speed;
+double max_flow_speed;
 
 int main(int argc, char **argv) {
     int rc, rank, num_ranks;
@@ -41,6 +54,7 @@ int main(int argc, char **argv) {
     bool model_specified = false;
     bool output_vorticity = false;
     bool output_velocity = false;
+    bool output_pieces = false;
 
     // Check for compile-time defaults (for Makefile compatibility)
 #ifdef OUTPUT_VORTICITY
@@ -70,6 +84,9 @@ int main(int argc, char **argv) {
 	else if (strcmp(argv[i], "--output-velocity") == 0) {
 	    output_velocity = true;
 	}
+	else if (strcmp(argv[i], "--output-pieces") == 0) {
+	    output_pieces = true;
+	}
 	else if (strcmp(argv[i], "--help") == 0 || strcmp(argv[i], "-h") == 0) {
 	    if (rank == 0) {
 		printf("Usage: %s [OPTIONS]\n", argv[0]);
@@ -79,6 +96,7 @@ int main(int argc, char **argv) {
 		printf("  --d3q27              Use D3Q27 lattice model\n");
 		printf("  --output-vorticity   Enable vorticity output to VTS files\n");
 		printf("  --output-velocity    Enable velocity vector output to VTS files\n");
+		printf("  --output-pieces      Every rank writes its own VTS piece files (no gather on rank 0)\n");
 		printf("  --help, -h           Show this help message\n");
 	    }
 	    MPI_Finalize();
@@ -99,16 +117,45 @@ int main(int argc, char **argv) {
         std::cout << "LBM-CFD> resolution=" << dim_x << "x" << dim_y << "x" << dim_z << ", time steps=" << time_steps << std::endl;
         std::cout << "LBM-CFD> using " << (lattice_type == LbmDQ::D3Q15 ? "D3Q15" : (lattice_type == LbmDQ::D3Q19 ? "D3Q19" : "D3Q27")) << " lattice model" << std::endl;
 	std::cout << "LBM-CFD> output options: vorticity=" << (output_vorticity ? "enabled" : "disabled")
-                  << ", velocity=" << (output_velocity ? "enabled" : "disabled") << std::endl;
+                  << ", velocity=" << (output_velocity ? "enabled" : "disabled")
+                  << ", pieces=" << (output_pieces ? "enabled" : "disabled") << std::endl;
     }
 
+    void *ascent_ptr = NULL;
+
+#ifdef ASCENT_ENABLED
+    if (rank == 0) std::cout << "LBM-CFD> Ascent in situ: ENABLED" << std::endl;
+
+    // Copy MPI Communicator to use with Ascent
+    MPI_Comm comm;
+    MPI_Comm_dup(MPI_COMM_WORLD, &comm);
+
+    // Create Ascent object
+    ascent::Ascent ascent;
+
+    // Set Ascent options
+    conduit::Node ascent_opts;
+    ascent_opts["mpi_comm"] = MPI_Comm_c2f(comm);
+    ascent.open(ascent_opts);
+
+    // slices are extracted by the bridge itself -> no repartition callback needed
+    ascent::register_callback("steeringCallback", steeringCallback);
+
+    ascent_ptr = &ascent;
+#endif
+
     // Run simulation
-    runLbmCfdSimulation(rank, num_ranks, dim_x, dim_y, dim_z, time_steps, lattice_type, output_vorticity, output_velocity);
+    runLbmCfdSimulation(rank, num_ranks, dim_x, dim_y, dim_z, time_steps, lattice_type, output_vorticity, output_velocity, output_pieces, ascent_ptr);
+
+#ifdef ASCENT_ENABLED
+    ascent.close();
+#endif
+
     MPI_Finalize();
     return 0;
 }
 
-void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y, uint32_t dim_z, uint32_t time_steps, LbmDQ::LatticeType lattice_type, bool output_vorticity, bool output_velocity)
+void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y, uint32_t dim_z, uint32_t time_steps, LbmDQ::LatticeType lattice_type, bool output_vorticity, bool output_velocity, bool output_pieces, void *ptr)
 {
     // simulate corn syrup at 25 C in a 2 m pipe, moving 0.25 m/s
     double physical_density = 1380.0;     // kg/m^3
@@ -264,6 +311,9 @@ void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y
     lbm->initBarrier(barriers);
     lbm->initFluid(physical_speed);
     lbm->checkGuards();
+    flow_speed = physical_speed;
+    // dt is fixed for the whole run -> faster inlet speeds would break the Mach number (and CFL) limits used above
+    max_flow_speed = std::min(cfl_max, 0.1 * lattice_cs) * dx / dt;
 
     // sync all processes
     MPI_Barrier(MPI_COMM_WORLD);
@@ -283,7 +333,7 @@ void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y
     for (t = 0; t < time_steps; t++)
     {
         // enforce inlet boundary at every step
-	lbm->updateFluid(physical_speed);
+	lbm->updateFluid(flow_speed);
 	// Output data at regular intervals
         double current_time = t * dt;  // Current simulation time
         if (current_time >= next_output_time)
@@ -299,17 +349,29 @@ void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y
             {
                 fprintf(stderr, "LBM-CFD> Warning: simulation has become unstable (more time steps needed)");
             } 
+
+#ifdef ASCENT_ENABLED
+            ascent::Ascent *ascent_ptr = static_cast<ascent::Ascent*>(ptr);
+            conduit::Node mesh;
+            updateAscentData(rank, num_ranks, t, current_time, mesh);
+            runAscentInSituTasks(mesh, ascent_ptr);
+#endif
             output_count++;
             next_output_time = output_count * output_frequency;
         }
 
+	// Export pieces of every rank in parallel (grouped into .pvts files by create_pvd_from_vts.py)
+	if (output_pieces) {
+            exportPieceDiagnostics(t, rank, num_ranks, lbm, dt, dx, output_vorticity, output_velocity);
+        }
+
 	// Export vorticity for visualization
-	if (output_vorticity) {
+	if (output_vorticity && !output_pieces) {
             printSimulationDiagnostics(t, rank, lbm, dt, dx, physical_density, time_steps);
         }
         
         // Export velocity vectors for streamline visualization
-        if (output_velocity) {
+        if (output_velocity && !output_pieces) {
             exportVelocityDiagnostics(t, rank, num_ranks, lbm, dt, dx, physical_density, time_steps);
         }
 
@@ -391,3 +453,139 @@ void runLbmCfdSimulation(int rank, int num_ranks, uint32_t dim_x, uint32_t dim_y
     }
     barriers.clear();
 }
+
+#ifdef ASCENT_ENABLED
+void updateAscentData(int rank, int num_ranks, int step, double time, conduit::Node &mesh)
+{
+    // vorticity needs the neighboring planes -> computed on all ranks, only the slice is sent by the bridge
+    lbm->computeVorticity();
+    lbm->computeSpeed();
+
+    uint32_t dim_x = lbm->getDimX();
+    uint32_t dim_y = lbm->getDimY();
+    uint32_t dim_z = lbm->getDimZ();
+    uint32_t prop_size = dim_x * dim_y * dim_z;
+
+    // local arrays hold owned cells only (no ghost cells) -> owned cells start at 0
+    mesh["state/domain_id"] = rank;
+    mesh["state/num_domains"] = num_ranks;
+    mesh["state/cycle"] = step;
+    mesh["state/time"] = time;
+    mesh["state/coords/start/x"] = 0u;
+    mesh["state/coords/start/y"] = 0u;
+    mesh["state/coords/start/z"] = 0u;
+    mesh["state/coords/size/x"] = dim_x;
+    mesh["state/coords/size/y"] = dim_y;
+    mesh["state/coords/size/z"] = dim_z;
+    // barriers are fixed in 3D (not drawn in the viewer)
+    mesh["state/num_barriers"] = 0;
+    // the viewer starts its flow speed slider at the current speed and limits it to what dt allows
+    mesh["state/flow_speed"] = flow_speed;
+    mesh["state/max_flow_speed"] = max_flow_speed;
+
+    mesh["coordsets/coords/type"] = "uniform";
+    mesh["coordsets/coords/dims/i"] = dim_x + 1;
+    mesh["coordsets/coords/dims/j"] = dim_y + 1;
+    mesh["coordsets/coords/dims/k"] = dim_z + 1;
+
+    mesh["coordsets/coords/origin/x"] = lbm->getOffsetX();
+    mesh["coordsets/coords/origin/y"] = lbm->getOffsetY();
+    mesh["coordsets/coords/origin/z"] = lbm->getOffsetZ();
+    mesh["coordsets/coords/spacing/dx"] = 1;
+    mesh["coordsets/coords/spacing/dy"] = 1;
+    mesh["coordsets/coords/spacing/dz"] = 1;
+
+    mesh["topologies/topo/type"] = "uniform";
+    mesh["topologies/topo/coordset"] = "coords";
+
+    mesh["fields/vorticity/association"] = "element";
+    mesh["fields/vorticity/topology"] = "topo";
+    mesh["fields/vorticity/values"].set_external(lbm->getVorticity(), prop_size);
+
+    // further fields the viewer can select (only the selected one is sliced)
+    mesh["fields/speed/association"] = "element";
+    mesh["fields/speed/topology"] = "topo";
+    mesh["fields/speed/values"].set_external(lbm->getSpeed(), prop_size);
+
+    mesh["fields/density/association"] = "element";
+    mesh["fields/density/topology"] = "topo";
+    mesh["fields/density/values"].set_external(lbm->getDensity(), prop_size);
+
+    mesh["fields/velocity_x/association"] = "element";
+    mesh["fields/velocity_x/topology"] = "topo";
+    mesh["fields/velocity_x/values"].set_external(lbm->getVelocityX(), prop_size);
+
+    mesh["fields/velocity_y/association"] = "element";
+    mesh["fields/velocity_y/topology"] = "topo";
+    mesh["fields/velocity_y/values"].set_external(lbm->getVelocityY(), prop_size);
+
+    mesh["fields/velocity_z/association"] = "element";
+    mesh["fields/velocity_z/topology"] = "topo";
+    mesh["fields/velocity_z/values"].set_external(lbm->getVelocityZ(), prop_size);
+}
+
+void runAscentInSituTasks(conduit::Node &mesh, ascent::Ascent *ascent_ptr)
+{
+    ascent_ptr->publish(mesh);
+
+    conduit::Node actions;
+    conduit::Node &add_extracts = actions.append();
+    add_extracts["action"] = "add_extracts";
+    conduit::Node &extracts = add_extracts["extracts"];
+
+    // bridge of the 2D example (detects the 3D mesh and sends the slice selected in the viewer)
+    const char *bridge_path = getenv("ASCENT_TRAME_BRIDGE");
+    if (bridge_path == NULL)
+    {
+        bridge_path = "../lbm-cfd/ascent/ascent_trame_bridge.py";
+        // the bridge imports its helper modules from its own directory
+        setenv("ASCENT_TRAME_BRIDGE", bridge_path, 0);
+    }
+    char *py_script;
+    if (readFile(bridge_path, &py_script) >= 0)
+    {
+        extracts["e1/type"] = "python";
+        extracts["e1/params/source"] = py_script;
+        free(py_script);
+    }
+
+    ascent_ptr->execute(actions);
+}
+
+void steeringCallback(conduit::Node &params, conduit::Node &output)
+{
+    // barriers sent by the viewer are 2D segments -> only the flow speed applies to the 3D domain
+    if (params.has_path("flow_speed"))
+    {
+        flow_speed = std::min(std::max(params["flow_speed"].as_float64(), 0.0), max_flow_speed);
+        lbm->updateFluid(flow_speed);
+    }
+}
+
+int32_t readFile(const char *filename, char** data_ptr)
+{
+    FILE *fp = fopen(filename, "rb");
+    if (fp == NULL)
+    {
+        std::cerr << "Error: cannot open " << filename << std::endl;
+        return -1;
+    }
+
+    fseek(fp, 0, SEEK_END);
+    int32_t fsize = ftell(fp);
+    fseek(fp, 0, SEEK_SET);
+
+    *data_ptr = (char*)malloc(fsize + 1);
+    size_t read = fread(*data_ptr, fsize, 1, fp);
+    fclose(fp);
+    if (read != 1)
+    {
+        std::cerr << "Error: cannot read " << filename << std::endl;
+        free(*data_ptr);
+        return -1;
+    }
+    (*data_ptr)[fsize] = '\0';
+
+    return fsize;
+}
+#endif
@@ -1,14 +1,173 @@
 import sys
+import os
 sys.path.append(f'../../.venv/lib/python{sys.version_info.major}.{sys.version_info.minor}/site-packages')
+# connection helpers shared with the synthetic stand-in live next to this script (Ascent only passes its source,
+# ASCENT_TRAME_BRIDGE gives its path when the simulation does not run from the lbm-cfd directory)
+sys.path.append(os.path.dirname(os.path.abspath(os.environ.get('ASCENT_TRAME_BRIDGE', 'ascent/ascent_trame_bridge.py'))))
+import select
 import time
+from collections import deque
 import numpy as np
-from multiprocessing.managers import BaseManager
+from multiprocessing import AuthenticationError
 from mpi4py import MPI
 import conduit
 import ascent.mpi
+from bridge_transport import SharedFrameWriter, connectToViewer, getAuthkey, packField, parseAddress, receiveMessage, sendMessage
 
-class QueueManager(BaseManager):
-    pass
+# Connection to the Trame viewer, kept across invocations of this script
+#
+# Every rank keeps the same session state (only changed from broadcast values), so all ranks know
+# without communicating on which invocations a connection attempt or a sample happens
+class TrameSession:
+    def __init__(self):
+        self.connected = False
+        self.invocation = 0
+        self.sample_every = 1
+        self.sample_on_demand = False
+        # level of detail: width the field is reduced to on each rank before gathering (0: full field)
+        self.lod_width = 0
+        self.lod_method = 'mean'
+        self.grid_dims = None
+        # region of interest requested by the viewer (x0, y0, x1, y1 in grid cells, None: whole grid)
+        self.roi = None
+        # published field sent to the viewer (only this one is reduced and gathered)
+        self.field = 'vorticity'
+        # 3D meshes: global cell dims (x, y, z) and the axis-aligned slice plane sent to the viewer (None: 2D mesh)
+        self.volume_dims = None
+        self.slice_axis = 'z'
+        self.slice_index = 0
+        self._next_attempt = 0
+        self._backoff = 1
+        # main task only
+        self.options = {}
+        self.demanded = False
+        self._socket = None
+        self._steering = deque()
+        self._view = {}
+        # durations (ms, < 0: not measured) that are only known after a frame was sent -> go with the next one
+        self.connect_ms = -1.0
+        self.send_ms = -1.0
+        self.wait_ms = -1.0
+        self.prev_step = -1
+        # last steering values sent to the simulation
+        self.steering_version = 0
+        self.flow_speed = None
+        self.barriers = None
+
+    """
+    return: whether this invocation should try to connect to Trame
+    """
+    def shouldConnect(self):
+        return not self.connected and self.invocation >= self._next_attempt
+
+    """
+    Connect to the Trame viewer (ASCENT_TRAME_ADDRESS, host:port or Unix socket path) and authenticate (main task only)
+    return: whether connecting succeeded
+    """
+    def connect(self):
+        address = parseAddress(os.environ.get('ASCENT_TRAME_ADDRESS', '127.0.0.1:8000'))
+        try:
+            self._socket, self.options = connectToViewer(address, getAuthkey(), _CONNECT_TIMEOUT)
+        except (OSError, EOFError, ValueError, KeyError, AuthenticationError):
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self._steering.clear()
+        self._view = {}
+        self.demanded = False
+
+    """
+    Send frame to the viewer: JSON header, then the raw bytes of every array (main task only)
+    return: None
+    """
+    def sendFrame(self, frame):
+        sendMessage(self._socket, 'frame', frame)
+
+    """
+    Get steering updates from the viewer (main task only), pending view settings are merged in
+    wait: block until the next update arrives (sync mode), otherwise merge all pending updates (latest wins)
+    return: dict of steering updates (empty if nothing is pending)
+    """
+    def receiveSteering(self, wait):
+        self._receivePending()
+        if wait:
+            while not self._steering:
+                self._dispatch(*receiveMessage(self._socket))
+            update = self._steering.popleft()
+        else:
+            update = {}
+            while self._steering:
+                update.update(self._steering.popleft())
+        # view settings go with whatever step comes next (latest wins)
+        update.update(self._view)
+        self._view = {}
+        return update
+
+    def _receivePending(self):
+        # messages are written as a whole -> once data is readable the rest of the message follows
+        while select.select([self._socket], [], [], 0)[0]:
+            self._dispatch(*receiveMessage(self._socket))
+
+    def _dispatch(self, kind, message):
+        if kind == 'demand':
+            self.demanded = bool(message['demanded'])
+        elif kind == 'steering':
+            self._steering.append(message)
+        elif kind == 'view':
+            self._view.update(message)
+        elif kind == 'options':
+            self.options.update(message)
+
+    """
+    Apply result of a connection attempt or a lost connection (all tasks)
+    return: None
+    """
+    def setConnected(self, connected, sample_every=1, sample_on_demand=False, lod_width=0, lod_method='mean'):
+        self.connected = connected
+        if connected:
+            self._backoff = 1
+            self.sample_every = max(1, sample_every)
+            self.sample_on_demand = sample_on_demand
+            self.lod_width = max(0, lod_width)
+            self.lod_method = lod_method
+        else:
+            # no viewer -> try again after exponentially growing number of invocations
+            self._next_attempt = self.invocation + self._backoff
+            self._backoff = min(2 * self._backoff, _MAX_BACKOFF)
+            self.close()
+
+    """
+    return: whether this invocation is on the sampling cadence
+    """
+    def isSampleStep(self):
+        return self.invocation % self.sample_every == 0
+
+    """
+    Ask Trame whether any viewer currently wants frames (main task only)
+    return: (demanded, still connected)
+    """
+    def isDemanded(self):
+        try:
+            # viewer sends a message whenever demand changes -> only read what is pending
+            self._receivePending()
+            return (self.demanded, True)
+        except (OSError, EOFError, ValueError):
+            return (False, False)
+
+_MAX_BACKOFF = 64
+_CONNECT_TIMEOUT = 5.0
+_LOD_METHODS = ('mean', 'minmax')
+
+# session and shared memory frame writer are kept across invocations of this script
+if '_session' not in globals():
+    _session = TrameSession()
+if '_frame_writer' not in globals():
+    _frame_writer = None
 
 def main():
     # obtain a mpi4py mpi comm object
@@ -18,93 +177,496 @@ def main():
     task_id = comm.Get_rank()
     num_tasks = comm.Get_size()
 
+    session = _session
+    session.invocation += 1
+
+    # attempt to connect to Trame (with backoff while no viewer is running)
+    if session.shouldConnect():
+        request = np.zeros(5, dtype=np.int32)
+        if task_id == 0:
+            start = time.perf_counter()
+            if session.connect():
+                session.connect_ms = _elapsedMs(start)
+                request[:] = (1, session.options.get('sample_every', 1), session.options.get('sample_on_demand', False),
+                              session.options.get('lod_width', 0), _LOD_METHODS.index(session.options.get('lod_method', 'mean')))
+        comm.Bcast(request, root=0)
+        session.setConnected(bool(request[0]), int(request[1]), bool(request[2]), int(request[3]), _LOD_METHODS[request[4]])
+    if not session.connected:
+        return
+
+    # skip steps that are not sampled -> no communication at all on those
+    if not session.isSampleStep():
+        return
+    if session.sample_on_demand:
+        demand = np.zeros(2, dtype=np.int32)
+        if task_id == 0:
+            demand[:] = session.isDemanded()
+        comm.Bcast(demand, root=0)
+        if not demand[1]:
+            session.setConnected(False)
+        if not demand[0]:
+            return
+
+    # 3D mesh -> only the selected slice plane is extracted and sent
+    if session.volume_dims is None and ascent_data().child(0).has_path('coordsets/coords/dims/k'):
+        determineVolumeDims(comm, session)
+
     # run Trame tasks
-    interactive = np.array([False], bool)
     update_data = None
     if task_id == 0:
-        update_data = executeMainTask(task_id, num_tasks, comm)
+        update_data = executeMainTask(task_id, num_tasks, comm, session)
     else:
-        executeDependentTask(task_id, num_tasks, comm)
+        executeDependentTask(task_id, num_tasks, comm, session)
     
     # broadcast updates to all ranks
-    update_data = comm.bcast(update_data, root=0)
+    flags, flow_speed, barriers = broadcastSteeringUpdate(task_id, comm, session, update_data)
+    if flags & _STEERING_DISCONNECTED:
+        session.setConnected(False)
+        return
+    if not flags & _STEERING_CHANGED:
+        # nothing new -> simulation keeps its current settings
+        return
 
     #  pass updates to Ascent callback
     update_node = conduit.Node()
     update_node['task_id'] = task_id
-    if 'flow_speed' in update_data:
-        update_node['flow_speed'] = update_data['flow_speed']
-    if 'barriers' in update_data:
-        num_barriers = update_data['barriers'].shape[0]
-        update_node['num_barriers'] = num_barriers
-        update_node['barriers'].set_external(update_data['barriers'].reshape(num_barriers * 4))
+    update_node['flow_speed'] = flow_speed
+    num_barriers = barriers.shape[0]
+    update_node['num_barriers'] = num_barriers
+    update_node['barriers'].set_external(barriers.reshape(num_barriers * 4))
     output = conduit.Node()
     ascent.mpi.execute_callback('steeringCallback', update_node, output)
 
 
-def executeMainTask(task_id, num_tasks, comm):
-    interactive = np.array([False], bool)
-    update_data = {}    
+def broadcastSteeringUpdate(task_id, comm, session, update_data):
+    # fixed layout: float64 header (flags, version, flow speed, number of barriers, region of interest x0, y0, x1, y1,
+    # field index, slice axis, slice index), then int32 barriers
+    header = np.zeros(11, dtype=np.float64)
+    field_names = getFieldNames(ascent_data().child(0))
+    barriers = None
+    if task_id == 0:
+        flags = 0
+        if update_data.get('disconnected', False):
+            flags = _STEERING_DISCONNECTED
+        else:
+            # the simulation needs flow speed and barriers together -> fill in what was sent last
+            flow_speed = update_data.get('flow_speed', session.flow_speed)
+            barriers = update_data.get('barriers', session.barriers)
+            if flow_speed is not None and barriers is not None:
+                barriers = np.ascontiguousarray(barriers, dtype=np.int32).reshape((-1, 4))
+                if flow_speed != session.flow_speed or not np.array_equal(barriers, session.barriers):
+                    session.steering_version += 1
+                    session.flow_speed = flow_speed
+                    session.barriers = barriers
+                    flags |= _STEERING_CHANGED
+                    header[1:4] = (session.steering_version, flow_speed, barriers.shape[0])
+            # empty region of interest -> whole grid
+            if 'roi' in update_data:
+                roi = tuple(int(v) for v in update_data['roi']) if update_data['roi'] else None
+                if roi != session.roi:
+                    flags |= _STEERING_ROI
+                    header[4:8] = roi if roi is not None else 0
+            # field names are the same on all ranks -> only the index is sent
+            field = update_data.get('field', session.field)
+            if field != session.field and field in field_names:
+                flags |= _STEERING_FIELD
+                header[8] = field_names.index(field)
+            # slice plane of a 3D mesh (index clipped to the volume)
+            if 'slice' in update_data and session.volume_dims is not None:
+                axis, index = update_data['slice']
+                if axis in _SLICE_AXES:
+                    index = min(max(int(index), 0), session.volume_dims[_SLICE_AXES.index(axis)] - 1)
+                    if (axis, index) != (session.slice_axis, session.slice_index):
+                        flags |= _STEERING_SLICE
+                        header[9:11] = (_SLICE_AXES.index(axis), index)
+        header[0] = flags
+    comm.Bcast(header, root=0)
 
-    # attempt to connect to Trame queue manager
-    QueueManager.register('get_data_queue')
-    QueueManager.register('get_signal_queue')
-    mgr = QueueManager(address=('127.0.0.1', 8000), authkey=b'ascent-trame')
-    try:
-        mgr.connect()
-        interactive[0] = True
-    except:
-        mgr = None
+    flags = int(header[0])
+    if flags & _STEERING_ROI:
+        # used from the next sampled step on (same on all ranks)
+        roi = tuple(int(v) for v in header[4:8])
+        session.roi = roi if roi[2] > roi[0] and roi[3] > roi[1] else None
+    if flags & _STEERING_FIELD:
+        session.field = field_names[int(header[8])]
+    if flags & _STEERING_SLICE:
+        axis = _SLICE_AXES[int(header[9])]
+        if axis != session.slice_axis:
+            # region of interest is given in coordinates of the previous plane
+            session.roi = None
+        session.slice_axis, session.slice_index = axis, int(header[10])
+    num_barriers = int(header[3])
+    if flags & _STEERING_CHANGED:
+        if task_id != 0:
+            barriers = np.empty((num_barriers, 4), dtype=np.int32)
+        if num_barriers > 0:
+            comm.Bcast(barriers, root=0)
+    return (flags, float(header[2]), barriers)
 
-    # broadcast to all processes whether Trame is currently running
-    comm.Bcast((interactive, 1, MPI.BOOL), root=0)
+_STEERING_CHANGED = 1
+_STEERING_DISCONNECTED = 2
+_STEERING_ROI = 4
+_STEERING_FIELD = 8
+_STEERING_SLICE = 16
 
-    if interactive[0]:
-        # get access to Trame's queues
-        queue_data = mgr.get_data_queue()
-        queue_signal = mgr.get_signal_queue()
 
-        # get published blueprint data
-        mesh_data = ascent_data().child(0)
+def executeMainTask(task_id, num_tasks, comm, session):
+    global _frame_writer
+    steering_mode = session.options.get('steering_mode', 'sync')
 
-        # repartition data -> gather on main process (0)
-        result = repartitionMeshData(task_id, num_tasks, comm)
+    # get published blueprint data
+    mesh_data = ascent_data().child(0)
 
+    if session.volume_dims is None:
         num_barriers = mesh_data["state/num_barriers"]
         barriers = mesh_data["state/barriers"].reshape((num_barriers, 4))
-        topology_name = result['fields/vorticity/topology']
+    else:
+        # barriers are drawn on 2D meshes only
+        barriers = np.zeros((0, 4), dtype=np.int32)
+    # field statistics only need a few hundred bytes per rank
+    start = time.perf_counter()
+    statistics = reduceFieldStatistics(task_id, comm, session)
+    stats_ms = _elapsedMs(start)
+    # whole plane in cells, the viewer keeps a panned region of interest inside it
+    plane_dims = getPlaneDims(comm, session)
+    start = time.perf_counter()
+    if session.lod_width > 0:
+        # reduce on each rank, gather only the reduced tiles
+        values, origin, spacing = gatherLevelOfDetail(task_id, num_tasks, comm, session)
+    elif session.volume_dims is not None:
+        # only ranks intersecting the slice plane contribute -> gather volume is the plane area
+        values, origin, spacing = gatherSlice(task_id, num_tasks, comm, session)
+    else:
+        # repartition selected field (only the region of interest if one is set) -> gather on main process (0)
+        result = repartitionMeshData(task_id, num_tasks, comm, session.roi, session.field)
+        topology_name = result[f'fields/{session.field}/topology']
         coordset_name = result[f'topologies/{topology_name}/coordset']
         dim_x = result[f'coordsets/{coordset_name}/dims/i'] - 1 # 1 fewer element than vertex
         dim_y = result[f'coordsets/{coordset_name}/dims/j'] - 1 # 1 fewer element than vertex
-        vorticity = result['fields/vorticity/values'].reshape((dim_y, dim_x))
+        values = result[f'fields/{session.field}/values'].reshape((dim_y, dim_x))
+        origin = (0, 0)
+        if result.has_path(f'coordsets/{coordset_name}/origin'):
+            origin = (int(result[f'coordsets/{coordset_name}/origin/x']), int(result[f'coordsets/{coordset_name}/origin/y']))
+        spacing = 1
+    gather_ms = _elapsedMs(start)
+
+    # send simulation data to Trame
+    frame = {
+        'barriers': barriers,
+        session.field: values,
+        'field': np.array(session.field),
+        'fields': np.array(getFieldNames(mesh_data)),
+        'origin': np.array(origin, dtype=np.int32),
+        'spacing': np.array(spacing, dtype=np.int32),
+        'plane_dims': np.array(plane_dims, dtype=np.int32),
+        'step': np.array(mesh_data['state/cycle'], dtype=np.int64),
+        'time': np.array(mesh_data['state/time'], dtype=np.float64)
+    }
+    if session.volume_dims is not None:
+        frame['slice'] = np.array([_SLICE_AXES.index(session.slice_axis), session.slice_index], dtype=np.int32)
+        frame['volume_dims'] = np.array(session.volume_dims, dtype=np.int32)
+    # inlet speed of the simulation and the highest one it accepts (if it publishes them)
+    for name in ('flow_speed', 'max_flow_speed'):
+        if mesh_data.has_path(f'state/{name}'):
+            frame[name] = np.array(mesh_data[f'state/{name}'], dtype=np.float64)
+    frame.update(statistics)
+    start = time.perf_counter()
+    packField(frame, session.field, session.options)
+    pack_ms = _elapsedMs(start)
 
-        # send simulation data to Trame
-        queue_data.put({'barriers': barriers, 'vorticity': vorticity})
-        
-        # get steering updates from Trame
-        update_data = queue_signal.get()
+    # stage timings (see frame_timing.BRIDGE_TIMING), sent time is wall clock so the viewer can time the hops
+    frame['timing'] = np.array([time.time(), session.connect_ms, stats_ms, gather_ms, pack_ms,
+                                session.prev_step, session.send_ms, session.wait_ms], dtype=np.float64)
+    session.connect_ms = -1.0
+    if session.options.get('transport', 'socket') == 'shm':
+        if _frame_writer is None:
+            _frame_writer = SharedFrameWriter(session.options.get('shm_slots', 3))
+        frame = {'shm': _frame_writer.write(frame)}
+
+    try:
+        start = time.perf_counter()
+        session.sendFrame(frame)
+        session.send_ms = _elapsedMs(start)
+
+        # get steering updates from Trame (async: do not wait on the viewer, latest update wins)
+        start = time.perf_counter()
+        update_data = session.receiveSteering(wait=steering_mode != 'async')
+        session.wait_ms = _elapsedMs(start)
+        session.prev_step = int(mesh_data['state/cycle'])
+    except (OSError, EOFError, ValueError):
+        # viewer went away -> all ranks drop the session
+        update_data = {'disconnected': True}
 
     return update_data
 
 
-def executeDependentTask(task_id, num_tasks, comm):
-    interactive = np.array([False], bool)
+def _elapsedMs(start):
+    return (time.perf_counter() - start) * 1000.0
 
-    # receive whether session is interactive or not from main task
-    comm.Bcast((interactive, 1, MPI.BOOL), root=0)
 
-    if interactive[0]:
+def executeDependentTask(task_id, num_tasks, comm, session):
+    reduceFieldStatistics(task_id, comm, session)
+    # collective the first time on a 2D mesh (see executeMainTask)
+    getPlaneDims(comm, session)
+    if session.lod_width > 0:
+        gatherLevelOfDetail(task_id, num_tasks, comm, session)
+    elif session.volume_dims is not None:
+        gatherSlice(task_id, num_tasks, comm, session)
+    else:
         # repartition data -> gather on main process (0)
-        repartitionMeshData(task_id, num_tasks, comm)
+        repartitionMeshData(task_id, num_tasks, comm, session.roi, session.field)
+
 
+"""
+return: sorted names of the published fields (same order on all ranks)
+"""
+def getFieldNames(mesh_data):
+    return sorted(mesh_data['fields'].child_names())
 
-def repartitionMeshData(task_id, num_tasks, comm):
+
+def getOwnedCells(mesh_data, field):
+    # cells owned by this rank (local arrays include ghost cells) and their global offset
+    start_x = int(mesh_data['state/coords/start/x'])
+    start_y = int(mesh_data['state/coords/start/y'])
+    size_x = int(mesh_data['state/coords/size/x'])
+    size_y = int(mesh_data['state/coords/size/y'])
+    offset_x = int(mesh_data['coordsets/coords/origin/x']) + start_x
+    offset_y = int(mesh_data['coordsets/coords/origin/y']) + start_y
+    dim_x = int(mesh_data['coordsets/coords/dims/i']) - 1
+    dim_y = int(mesh_data['coordsets/coords/dims/j']) - 1
+    values = mesh_data[f'fields/{field}/values'].reshape((dim_y, dim_x))[start_y:start_y + size_y, start_x:start_x + size_x]
+    return (values, offset_x, offset_y)
+
+
+def getOwnedBlock(mesh_data, field):
+    # cells owned by this rank of a 3D mesh (z, y, x) and their global offset (x, y, z)
+    start = [int(mesh_data[f'state/coords/start/{axis}']) for axis in _SLICE_AXES]
+    size = [int(mesh_data[f'state/coords/size/{axis}']) for axis in _SLICE_AXES]
+    offset = [int(mesh_data[f'coordsets/coords/origin/{axis}']) + s for axis, s in zip(_SLICE_AXES, start)]
+    dims = [int(mesh_data[f'coordsets/coords/dims/{axis}']) - 1 for axis in ('i', 'j', 'k')]
+    values = mesh_data[f'fields/{field}/values'].reshape((dims[2], dims[1], dims[0]))
+    values = values[start[2]:start[2] + size[2], start[1]:start[1] + size[1], start[0]:start[0] + size[0]]
+    return (values, offset)
+
+
+def determineVolumeDims(comm, session):
+    # global cell dims of a 3D mesh (do not change -> only determined once), slice starts in the middle of z
+    values, offset = getOwnedBlock(ascent_data().child(0), session.field)
+    extent = np.array([offset[0] + values.shape[2], offset[1] + values.shape[1], offset[2] + values.shape[0]], dtype=np.int64)
+    comm.Allreduce(MPI.IN_PLACE, extent, op=MPI.MAX)
+    session.volume_dims = tuple(int(v) for v in extent)
+    session.slice_index = session.volume_dims[_SLICE_AXES.index(session.slice_axis)] // 2
+
+
+"""
+Cells of the displayed plane owned by this rank: the owned cells of a 2D mesh, the owned part of the slice plane
+of a 3D mesh (rows/columns: y/x for a z slice, z/x for a y slice, z/y for an x slice)
+return: (values, offset of first column, offset of first row), empty values if the rank does not intersect the plane
+"""
+def getPlaneCells(mesh_data, session):
+    if session.volume_dims is None:
+        return getOwnedCells(mesh_data, session.field)
+    values, offset = getOwnedBlock(mesh_data, session.field)
+    axis = _SLICE_AXES.index(session.slice_axis)
+    index = session.slice_index - offset[axis]
+    if not 0 <= index < values.shape[2 - axis]:
+        return (np.empty((0, 0), dtype=values.dtype), 0, 0)
+    column_axis, row_axis = _PLANE_AXES[session.slice_axis]
+    # copy of the slab only (the block itself is never copied)
+    return (np.take(values, index, axis=2 - axis), offset[column_axis], offset[row_axis])
+
+# axes of a 3D mesh and the (column, row) axes of the plane sliced along each of them
+_SLICE_AXES = ('x', 'y', 'z')
+_PLANE_AXES = {'x': (1, 2), 'y': (0, 2), 'z': (0, 1)}
+
+
+"""
+return: (width, height) of the displayed plane in cells
+"""
+def getPlaneDims(comm, session):
+    if session.volume_dims is not None:
+        column_axis, row_axis = _PLANE_AXES[session.slice_axis]
+        return (session.volume_dims[column_axis], session.volume_dims[row_axis])
+    # global grid size does not change -> only determined once
+    if session.grid_dims is None:
+        values, offset_x, offset_y = getOwnedCells(ascent_data().child(0), session.field)
+        extent = np.array([offset_x + values.shape[1], offset_y + values.shape[0]], dtype=np.int64)
+        comm.Allreduce(MPI.IN_PLACE, extent, op=MPI.MAX)
+        session.grid_dims = (int(extent[0]), int(extent[1]))
+    return session.grid_dims
+
+
+"""
+return: region to send (x0, y0, x1, y1): region of interest clipped to the plane or the whole plane
+"""
+def getRegion(session, width, height):
+    if session.roi is not None:
+        x0, y0 = max(0, session.roi[0]), max(0, session.roi[1])
+        x1, y1 = min(width, session.roi[2]), min(height, session.roi[3])
+        if x0 < x1 and y0 < y1:
+            return (x0, y0, x1, y1)
+    return (0, 0, width, height)
+
+
+def reduceFieldStatistics(task_id, comm, session):
+    # min, max, mean and histogram of the field (inside the region of interest if one is set)
+    mesh_data = ascent_data().child(0)
+    values, offset_x, offset_y = getPlaneCells(mesh_data, session)
+    if session.roi is not None:
+        x0, y0 = max(session.roi[0] - offset_x, 0), max(session.roi[1] - offset_y, 0)
+        values = values[y0:max(session.roi[3] - offset_y, y0), x0:max(session.roi[2] - offset_x, x0)]
+
+    # global (-min, max) first (fields have very different ranges), then bins between them
+    # Allreduce, not Reduce: every rank bins its own cells between low and high, so all ranks need the extremes
+    extremes = np.full(2, -np.inf)
+    if values.size > 0:
+        extremes[:] = (-values.min(), values.max())
+    comm.Allreduce(MPI.IN_PLACE, extremes, op=MPI.MAX)
+    low, high = -extremes[0], extremes[1]
+
+    # partial results per rank: (count, sum, histogram) are combined with SUM, only rank 0 needs them -> Reduce
+    sums = np.zeros(2 + _HISTOGRAM_BINS)
+    if values.size > 0:
+        sums[0] = values.size
+        sums[1] = values.sum(dtype=np.float64)
+        bins = np.subtract(values, low, dtype=np.float64)
+        bins *= _HISTOGRAM_BINS / (high - low) if high > low else 0.0
+        bins = np.clip(bins, 0, _HISTOGRAM_BINS - 1, out=bins).astype(np.intp)
+        sums[2:] = np.bincount(bins.ravel(), minlength=_HISTOGRAM_BINS)
+    total_sums = np.empty_like(sums) if task_id == 0 else None
+    comm.Reduce(sums, total_sums, op=MPI.SUM, root=0)
+    if task_id != 0:
+        return None
+
+    count = total_sums[0]
+    return {
+        'stats': np.array([low, high, total_sums[1] / max(count, 1), count]),
+        'histogram': total_sums[2:],
+        'histogram_range': np.array([low, high], dtype=np.float64)
+    }
+
+# histogram bins between the global min and max of the field
+_HISTOGRAM_BINS = 100
+
+
+def gatherLevelOfDetail(task_id, num_tasks, comm, session):
+    mesh_data = ascent_data().child(0)
+    values, offset_x, offset_y = getPlaneCells(mesh_data, session)
+    size_y, size_x = values.shape
+    width, height = getPlaneDims(comm, session)
+
+    # region to reduce: region of interest (clipped to the grid) or whole grid
+    region_x0, region_y0, region_x1, region_y1 = getRegion(session, width, height)
+
+    # coarse cells are spacing x spacing blocks starting at the region origin, a block can be split across ranks
+    spacing = max(1, -(-(region_x1 - region_x0) // session.lod_width))
+    x0, x1 = max(offset_x, region_x0), min(offset_x + size_x, region_x1)
+    y0, y1 = max(offset_y, region_y0), min(offset_y + size_y, region_y1)
+    if x0 < x1 and y0 < y1:
+        values = values[y0 - offset_y:y1 - offset_y, x0 - offset_x:x1 - offset_x]
+        tile_x0, tile_x1 = (x0 - region_x0) // spacing, -(-(x1 - region_x0) // spacing)
+        tile_y0, tile_y1 = (y0 - region_y0) // spacing, -(-(y1 - region_y0) // spacing)
+        edges_x = np.maximum(region_x0 + np.arange(tile_x0, tile_x1) * spacing, x0) - x0
+        edges_y = np.maximum(region_y0 + np.arange(tile_y0, tile_y1) * spacing, y0) - y0
+
+        # partial results per coarse cell: (sum, count) for mean, (min, max) for minmax
+        tile = np.empty((2, edges_y.size, edges_x.size), dtype=np.float64)
+        if session.lod_method == 'mean':
+            rows = np.add.reduceat(values, edges_y, axis=0, dtype=np.float64)
+            np.add.reduceat(rows, edges_x, axis=1, out=tile[0])
+            tile[1] = np.outer(np.diff(edges_y, append=y1 - y0), np.diff(edges_x, append=x1 - x0))
+        else:
+            np.minimum.reduceat(np.minimum.reduceat(values, edges_y, axis=0), edges_x, axis=1, out=tile[0])
+            np.maximum.reduceat(np.maximum.reduceat(values, edges_y, axis=0), edges_x, axis=1, out=tile[1])
+    else:
+        # rank does not overlap the region
+        tile_x0 = tile_y0 = 0
+        tile = np.empty((2, 0, 0), dtype=np.float64)
+
+    # gather tile headers, then tiles -> volume is bounded by the coarse grid, not the global grid
+    header = np.array([tile_x0, tile_y0, tile.shape[2], tile.shape[1]], dtype=np.int32)
+    headers = np.empty((num_tasks, 4), dtype=np.int32) if task_id == 0 else None
+    comm.Gather(header, headers, root=0)
+    if task_id != 0:
+        comm.Gatherv(tile, None, root=0)
+        return None
+
+    counts = 2 * headers[:, 2] * headers[:, 3]
+    displacements = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    tiles = np.empty(int(counts.sum()), dtype=np.float64)
+    comm.Gatherv(tile, (tiles, counts, displacements, MPI.DOUBLE), root=0)
+
+    # stitch tiles into the coarse grid
+    coarse_shape = (-(-(region_y1 - region_y0) // spacing), -(-(region_x1 - region_x0) // spacing))
+    if session.lod_method == 'mean':
+        first, second = np.zeros(coarse_shape), np.zeros(coarse_shape)
+        combine_first, combine_second = np.add, np.add
+    else:
+        first, second = np.full(coarse_shape, np.inf), np.full(coarse_shape, -np.inf)
+        combine_first, combine_second = np.minimum, np.maximum
+    for (x0, y0, nx, ny), displacement in zip(headers, displacements):
+        tile = tiles[displacement:displacement + 2 * nx * ny].reshape((2, ny, nx))
+        combine_first(first[y0:y0 + ny, x0:x0 + nx], tile[0], out=first[y0:y0 + ny, x0:x0 + nx])
+        combine_second(second[y0:y0 + ny, x0:x0 + nx], tile[1], out=second[y0:y0 + ny, x0:x0 + nx])
+
+    if session.lod_method == 'mean':
+        coarse = first / second
+    else:
+        # keep whichever extreme is larger in magnitude so vortex peaks survive decimation
+        coarse = np.where(np.abs(second) >= np.abs(first), second, first)
+    return (coarse.astype(np.float32), (region_x0, region_y0), spacing)
+
+
+def gatherSlice(task_id, num_tasks, comm, session):
+    # full resolution slice plane of a 3D mesh (only the region of interest if one is set)
+    mesh_data = ascent_data().child(0)
+    values, offset_x, offset_y = getPlaneCells(mesh_data, session)
+    width, height = getPlaneDims(comm, session)
+    region_x0, region_y0, region_x1, region_y1 = getRegion(session, width, height)
+
+    x0, x1 = max(offset_x, region_x0), min(offset_x + values.shape[1], region_x1)
+    y0, y1 = max(offset_y, region_y0), min(offset_y + values.shape[0], region_y1)
+    if x0 < x1 and y0 < y1:
+        slab = np.ascontiguousarray(values[y0 - offset_y:y1 - offset_y, x0 - offset_x:x1 - offset_x], dtype=np.float32)
+    else:
+        # rank does not intersect the plane (or the region)
+        x0, y0 = region_x0, region_y0
+        slab = np.empty((0, 0), dtype=np.float32)
+
+    # gather slab headers, then slabs -> ranks away from the plane only send a header
+    header = np.array([x0 - region_x0, y0 - region_y0, slab.shape[1], slab.shape[0]], dtype=np.int32)
+    headers = np.empty((num_tasks, 4), dtype=np.int32) if task_id == 0 else None
+    comm.Gather(header, headers, root=0)
+    if task_id != 0:
+        comm.Gatherv(slab, None, root=0)
+        return None
+
+    counts = headers[:, 2] * headers[:, 3]
+    displacements = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    slabs = np.empty(int(counts.sum()), dtype=np.float32)
+    comm.Gatherv(slab, (slabs, counts, displacements, MPI.FLOAT), root=0)
+
+    # stitch slabs into the region (the blocks of all ranks cover the plane)
+    plane = np.zeros((region_y1 - region_y0, region_x1 - region_x0), dtype=np.float32)
+    for (x0, y0, nx, ny), displacement in zip(headers, displacements):
+        plane[y0:y0 + ny, x0:x0 + nx] = slabs[displacement:displacement + nx * ny].reshape((ny, nx))
+    return (plane, (region_x0, region_y0), 1)
+
+
+def repartitionMeshData(task_id, num_tasks, comm, roi=None, field='vorticity'):
     # get published blueprint data
     mesh_data = ascent_data().child(0)
 
+    # pass requested field and region of interest along with the mesh (without modifying the published data)
+    params = conduit.Node()
+    params.set_external(mesh_data)
+    params['trame/field'] = field
+    if roi is not None:
+        params['trame/roi'].set(np.array(roi, dtype=np.int32))
+
     # Conduit Blueprint MPI not exposed in Python -> callback to C++ app for repartition instead
     output = conduit.Node()
-    ascent.mpi.execute_callback('repartitionCallback', mesh_data, output)
+    ascent.mpi.execute_callback('repartitionCallback', params, output)
 
     # once Conduit Blueprint MPI is available, use the following instead:
     """
@@ -0,0 +1,244 @@
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import socket
+import struct
+import zlib
+import numpy as np
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Protocol between the Ascent bridge and the Trame viewer, plus the simulation side of the connection (handshake,
+# shared memory frames, field packing). Used by ascent_trame_bridge.py, by the viewer (trame/bridge_server.py) and by
+# the synthetic stand-in (trame/bridge_standin.py), so it only needs NumPy.
+#
+# Messages: uint32 header length, JSON header {'type', 'values': JSON values, 'arrays': [[name, dtype, shape], ...]},
+#   then the raw bytes of every array in header order (nothing is pickled)
+#
+# Handshake (mutual, keyed with the shared authkey):
+#   viewer -> bridge: challenge {nonce}
+#   bridge -> viewer: response {digest of viewer nonce, nonce, host name}
+#   viewer -> bridge: session {digest of bridge nonce, options}, then demand {demanded}
+# Afterwards the bridge sends frames and the viewer sends steering updates, view settings (region of interest,
+# field, slice plane), demand and session option changes.
+MESSAGE_LENGTH = struct.Struct('<I')
+MAX_HEADER_SIZE = 1 << 20
+
+# Ring of shared memory slots holding frame arrays -> only a small descriptor goes over the connection
+class SharedFrameWriter:
+    def __init__(self, num_slots):
+        self._num_slots = max(2, num_slots)
+        self._shm = None
+        self._slot_size = 0
+        self._generation = 0
+        self._seq = 0
+        atexit.register(self.close)
+
+    def _allocate(self, slot_size):
+        # grow slots with some headroom so small size changes do not reallocate
+        self._slot_size = _align(slot_size + slot_size // 4)
+        self._generation += 1
+        name = f'ascent-trame-{os.getpid()}-{self._generation}'
+        shm = _untrackedSharedMemory(name=name, create=True, size=self._num_slots * self._slot_size)
+        # readers that are still attached to the old segment keep their mapping after unlink
+        self.close()
+        self._shm = shm
+
+    """
+    Copy arrays into the next slot of the ring
+    return: descriptor of the slot (name, sequence number, header offset, offset/shape/dtype per array)
+    """
+    def write(self, arrays):
+        layout = {}
+        slot_size = _FRAME_HEADER_SIZE
+        for name, array in arrays.items():
+            layout[name] = (slot_size, array.shape, array.dtype.str)
+            slot_size += _align(array.nbytes)
+        if self._shm is None or slot_size > self._slot_size:
+            self._allocate(slot_size)
+
+        self._seq += 1
+        base = (self._seq % self._num_slots) * self._slot_size
+        # header holds sequence number at start and end of write (seqlock) so readers can detect overwrites
+        header = np.frombuffer(self._shm.buf, dtype=np.uint64, count=2, offset=base)
+        header[0] = self._seq
+        for name, array in arrays.items():
+            offset, shape, dtype = layout[name]
+            layout[name] = (base + offset, shape, dtype)
+            slot = np.frombuffer(self._shm.buf, dtype=dtype, count=array.size, offset=base + offset)
+            np.copyto(slot.reshape(shape), array)
+        header[1] = self._seq
+        del header, slot
+
+        return {'name': self._shm.name, 'seq': self._seq, 'header': base, 'arrays': layout}
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            _untracked(self._shm.unlink)
+            self._shm = None
+
+_FRAME_HEADER_SIZE = 64
+
+def _align(nbytes, alignment=64):
+    return (nbytes + alignment - 1) // alignment * alignment
+
+def _untracked(func, *args, **kwargs):
+    # the resource tracker would be spawned with the embedded interpreter's executable (the simulation)
+    # -> segment lifetime is managed by SharedFrameWriter instead
+    register, unregister = resource_tracker.register, resource_tracker.unregister
+    resource_tracker.register = resource_tracker.unregister = lambda *args: None
+    try:
+        return func(*args, **kwargs)
+    finally:
+        resource_tracker.register, resource_tracker.unregister = register, unregister
+
+def _untrackedSharedMemory(**kwargs):
+    return _untracked(shared_memory.SharedMemory, **kwargs)
+
+"""
+Parse viewer address: 'host:port' for TCP, anything else is the path of a Unix socket
+return: (host, port) or path
+"""
+def parseAddress(address):
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit() and '/' not in address:
+        return (host or '127.0.0.1', int(port))
+    return address
+
+"""
+return: authkey shared by bridge and viewer (ASCENT_TRAME_AUTHKEY, default 'ascent-trame')
+"""
+def getAuthkey():
+    return os.environ.get('ASCENT_TRAME_AUTHKEY', 'ascent-trame').encode()
+
+"""
+return: proof of knowing the authkey for a nonce sent by the other side (hex)
+"""
+def authDigest(authkey, nonce):
+    return hmac.new(authkey, bytes.fromhex(nonce), hashlib.sha256).hexdigest()
+
+"""
+Encode message (arrays are referenced, not copied)
+return: list of buffers to write in order
+"""
+def encodeMessage(kind, values):
+    arrays = [(name, np.require(value, requirements='C')) for name, value in values.items() if isinstance(value, np.ndarray)]
+    header = json.dumps({
+        'type': kind,
+        'values': {name: value for name, value in values.items() if not isinstance(value, np.ndarray)},
+        'arrays': [[name, array.dtype.str, array.shape] for name, array in arrays]
+    }).encode()
+    return [MESSAGE_LENGTH.pack(len(header)) + header] + [memoryview(array).cast('B') for name, array in arrays if array.nbytes > 0]
+
+"""
+Connect to the Trame viewer and authenticate (mutual challenge-response, the key itself never goes over the connection)
+return: (connected socket, session options of the viewer)
+"""
+def connectToViewer(address, authkey, timeout):
+    sock = None
+    try:
+        if isinstance(address, tuple):
+            sock = socket.create_connection(address, timeout=timeout)
+            # frames and steering replies are single messages -> do not wait for more data
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(address)
+        kind, challenge = receiveMessage(sock)
+        nonce = secrets.token_hex(32)
+        # host name tells the viewer whether shared memory can be used
+        sendMessage(sock, 'response', {'digest': authDigest(authkey, challenge['nonce']), 'nonce': nonce, 'host': socket.gethostname()})
+        kind, session = receiveMessage(sock)
+        if kind != 'session' or not hmac.compare_digest(session['digest'], authDigest(authkey, nonce)):
+            raise AuthenticationError('Trame viewer failed to authenticate')
+        sock.settimeout(None)
+    except BaseException:
+        if sock is not None:
+            sock.close()
+        raise
+    return (sock, session['options'])
+
+"""
+Send message: JSON header, then the raw bytes of every array (no pickling, no intermediate copy)
+return: None
+"""
+def sendMessage(sock, kind, values):
+    for buffer in encodeMessage(kind, values):
+        sock.sendall(buffer)
+
+"""
+Receive one message (blocking), arrays are read straight into their final buffers
+return: (type, dict of values and arrays)
+"""
+def receiveMessage(sock):
+    length, = MESSAGE_LENGTH.unpack(_receiveExactly(sock, MESSAGE_LENGTH.size))
+    if length > MAX_HEADER_SIZE:
+        raise ValueError(f'message header too large ({length} bytes)')
+    header = json.loads(_receiveExactly(sock, length))
+    message = dict(header['values'])
+    for name, dtype, shape in header['arrays']:
+        array = np.empty(shape, dtype=dtype)
+        if array.nbytes > 0:
+            _receiveExactly(sock, array.nbytes, memoryview(array).cast('B'))
+        message[name] = array
+    return (header['type'], message)
+
+def _receiveExactly(sock, size, buffer=None):
+    data = bytearray(size) if buffer is None else buffer
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise EOFError('Trame viewer closed the connection')
+        received += count
+    return data
+
+"""
+Clip and quantize the field to unsigned integers (range travels with the frame), then optionally compress
+(options: session options of the viewer, see trame_app.py --payload and --payload-compression)
+return: None (frame is updated in place)
+"""
+def packField(frame, name, options):
+    payload = options.get('payload', 'float')
+    if payload == 'float':
+        return
+    # fields without a configured range are quantized over their current min/max
+    value_range = options.get('value_ranges', {}).get(name)
+    if value_range is None:
+        value_range = frame['stats'][:2]
+        if not value_range[1] > value_range[0]:
+            return
+    value_range = np.array(value_range, dtype=np.float64)
+    dtype = np.dtype(payload)
+    levels = np.iinfo(dtype).max
+    scaled = np.subtract(frame[name], value_range[0], dtype=np.float32)
+    scaled *= levels / (value_range[1] - value_range[0])
+    np.clip(scaled, 0, levels, out=scaled)
+    quantized = np.rint(scaled, out=scaled).astype(dtype)
+    frame[name] = quantized
+    frame['value_range'] = value_range
+
+    compression = options.get('compression', 'none')
+    if compression == 'lz4' and lz4 is None:
+        compression = 'zlib'
+    if compression != 'none':
+        if compression == 'lz4':
+            data = lz4.frame.compress(quantized, compression_level=0)
+        else:
+            data = zlib.compress(quantized, 1)
+        frame[name] = np.frombuffer(data, dtype=np.uint8)
+        frame['compression'] = np.array(COMPRESSIONS.index(compression), dtype=np.int8)
+        frame['field_shape'] = np.array(quantized.shape, dtype=np.int64)
+        frame['field_itemsize'] = np.array(dtype.itemsize, dtype=np.int8)
+
+# codes of the 'compression' array of a packed frame
+COMPRESSIONS = ('none', 'zlib', 'lz4')
@@ -1,5 +1,6 @@
 #include <iostream>
 #include <iomanip>
+#include <string>
 #include <vector>
 #include <cstdint>
 
@@ -173,6 +174,7 @@ void updateAscentData(int rank, int num_ranks, int step, double time, conduit::N
 {
     // Gather data on rank 0
     lbm->computeVorticity();
+    lbm->computeSpeed();
 
     uint32_t dim_x = lbm->getDimX();
     uint32_t dim_y = lbm->getDimY();
@@ -220,6 +222,23 @@ void updateAscentData(int rank, int num_ranks, int step, double time, conduit::N
     mesh["fields/vorticity/topology"] = "topo";
     mesh["fields/vorticity/values"].set_external(lbm->getVorticity(), prop_size);
 
+    // further fields the viewer can select (only the selected one is repartitioned)
+    mesh["fields/speed/association"] = "element";
+    mesh["fields/speed/topology"] = "topo";
+    mesh["fields/speed/values"].set_external(lbm->getSpeed(), prop_size);
+
+    mesh["fields/density/association"] = "element";
+    mesh["fields/density/topology"] = "topo";
+    mesh["fields/density/values"].set_external(lbm->getDensity(), prop_size);
+
+    mesh["fields/velocity_x/association"] = "element";
+    mesh["fields/velocity_x/topology"] = "topo";
+    mesh["fields/velocity_x/values"].set_external(lbm->getVelocityX(), prop_size);
+
+    mesh["fields/velocity_y/association"] = "element";
+    mesh["fields/velocity_y/topology"] = "topo";
+    mesh["fields/velocity_y/values"].set_external(lbm->getVelocityY(), prop_size);
+
 /*
     conduit::Node options, selections, output;
     for (i = 0; i < num_ranks; i++)
@@ -277,19 +296,69 @@ void runAscentInSituTasks(conduit::Node &mesh, conduit::Node &selections, ascent
 void repartitionCallback(conduit::Node &params, conduit::Node &output)
 {
     int num_ranks = (int)params["state/num_domains"].as_int32();
-    uint32_t layout[4] = {params["state/coords/start/x"].as_uint32(), params["state/coords/start/y"].as_uint32(),
-                          params["state/coords/size/x"].as_uint32(), params["state/coords/size/y"].as_uint32()};
-    uint32_t *layout_all = new uint32_t[4 * num_ranks];
-    MPI_Allgather(layout, 4, MPI_UNSIGNED, layout_all, 4, MPI_UNSIGNED, MPI_COMM_WORLD);
+    uint32_t start_x = params["state/coords/start/x"].as_uint32();
+    uint32_t start_y = params["state/coords/start/y"].as_uint32();
+    // global offset of first owned cell (coordset origin is the offset of the first ghost cell)
+    uint32_t layout[6] = {start_x, start_y, params["state/coords/size/x"].as_uint32(), params["state/coords/size/y"].as_uint32(),
+                          (uint32_t)params["coordsets/coords/origin/x"].to_int64() + start_x,
+                          (uint32_t)params["coordsets/coords/origin/y"].to_int64() + start_y};
+    uint32_t *layout_all = new uint32_t[6 * num_ranks];
+    MPI_Allgather(layout, 6, MPI_UNSIGNED, layout_all, 6, MPI_UNSIGNED, MPI_COMM_WORLD);
+
+    // optional region of interest (global cells x0, y0, x1, y1, end exclusive) requested by the viewer
+    bool has_roi = false;
+    int64_t roi[4] = {0, 0, 0, 0};
+    if (params.has_path("trame/roi"))
+    {
+        int32_t *roi_values = params["trame/roi"].as_int32_ptr();
+        int j;
+        for (j = 0; j < 4; j++)
+        {
+            roi[j] = roi_values[j];
+        }
+        // ignore regions that do not overlap any rank
+        for (j = 0; j < num_ranks && !has_roi; j++)
+        {
+            int64_t offset_x = layout_all[6 * j + 4];
+            int64_t offset_y = layout_all[6 * j + 5];
+            has_roi = std::max(roi[0], offset_x) < std::min(roi[2], offset_x + layout_all[6 * j + 2]) &&
+                      std::max(roi[1], offset_y) < std::min(roi[3], offset_y + layout_all[6 * j + 3]);
+        }
+    }
+
+    // field requested by the viewer
+    std::string field = "vorticity";
+    if (params.has_path("trame/field"))
+    {
+        field = params["trame/field"].as_string();
+    }
 
     int i;
     conduit::Node options, selections;
     for (i = 0; i < num_ranks; i++)
     {
-        uint32_t rank_start_x = layout_all[4 * i];
-        uint32_t rank_start_y = layout_all[4 * i + 1];
-        uint32_t rank_size_x = layout_all[4 * i + 2];
-        uint32_t rank_size_y = layout_all[4 * i + 3];
+        uint32_t rank_start_x = layout_all[6 * i];
+        uint32_t rank_start_y = layout_all[6 * i + 1];
+        uint32_t rank_size_x = layout_all[6 * i + 2];
+        uint32_t rank_size_y = layout_all[6 * i + 3];
+        if (has_roi)
+        {
+            // clip owned cells to the region of interest, ranks outside of it do not contribute
+            int64_t offset_x = layout_all[6 * i + 4];
+            int64_t offset_y = layout_all[6 * i + 5];
+            int64_t x0 = std::max(roi[0], offset_x);
+            int64_t y0 = std::max(roi[1], offset_y);
+            int64_t x1 = std::min(roi[2], offset_x + rank_size_x);
+            int64_t y1 = std::min(roi[3], offset_y + rank_size_y);
+            if (x0 >= x1 || y0 >= y1)
+            {
+                continue;
+            }
+            rank_start_x += (uint32_t)(x0 - offset_x);
+            rank_start_y += (uint32_t)(y0 - offset_y);
+            rank_size_x = (uint32_t)(x1 - x0);
+            rank_size_y = (uint32_t)(y1 - y0);
+        }
         conduit::Node &selection = selections.append();
         selection["type"] = "logical";
         selection["domain_id"] = i;
@@ -297,7 +366,7 @@ void repartitionCallback(conduit::Node &params, conduit::Node &output)
         selection["end"] = {rank_start_x + rank_size_x - 1u, rank_start_y + rank_size_y - 1u, 0u};
     }
     options["target"] = 1;
-    options["fields"] = {"vorticity"};
+    options["fields"].append().set(field);
     options["selections"] = selections;
     options["mapping"] = 0;
 
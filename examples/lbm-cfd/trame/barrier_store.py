@@ -0,0 +1,159 @@
+import numpy as np
+
+# Barrier segments (x0, y0, x1, y1 in simulation grid cells) with amortized appends and a spatial index
+#
+# Segments are kept in a capacity-doubling int32 array, removing a segment moves the last one into its place
+# (segment ids are positions and change on removal). The index maps buckets of a uniform grid to the segments
+# crossing them, so hit-testing and region queries only look at nearby segments. It is rebuilt lazily after
+# bulk replacements (e.g. every frame from the simulation) and kept up to date by single edits.
+class BarrierStore:
+    def __init__(self, bucket_size=32):
+        self._segments = np.empty((16, 4), dtype=np.int32)
+        self._count = 0
+        self._bucket_size = bucket_size
+        self._buckets = None
+
+    def __len__(self):
+        return self._count
+
+    """
+    return: (N, 4) int32 view of the segments (valid until the store is modified)
+    """
+    def toArray(self):
+        return self._segments[:self._count]
+
+    """
+    return: whether the store holds exactly these segments (in this order)
+    """
+    def equals(self, barriers):
+        barriers = np.asarray(barriers).reshape((-1, 4))
+        return barriers.shape[0] == self._count and np.array_equal(barriers, self.toArray())
+
+    """
+    Replace all segments
+    return: None
+    """
+    def set(self, barriers):
+        barriers = np.asarray(barriers, dtype=np.int32).reshape((-1, 4))
+        self._reserve(barriers.shape[0])
+        self._segments[:barriers.shape[0]] = barriers
+        self._count = barriers.shape[0]
+        self._buckets = None
+
+    """
+    Remove all segments
+    return: None
+    """
+    def clear(self):
+        self._count = 0
+        self._buckets = None
+
+    """
+    Add segment (amortized O(1))
+    return: id of the new segment
+    """
+    def append(self, segment):
+        self._reserve(self._count + 1)
+        segment_id = self._count
+        self._segments[segment_id] = segment
+        self._count += 1
+        if self._buckets is not None:
+            self._index(segment_id)
+        return segment_id
+
+    """
+    Remove segment, the last segment takes over its id
+    return: removed segment (x0, y0, x1, y1)
+    """
+    def remove(self, segment_id):
+        segment = tuple(int(v) for v in self._segments[segment_id])
+        last = self._count - 1
+        if self._buckets is not None:
+            self._unindex(segment_id)
+            if segment_id != last:
+                self._unindex(last)
+        self._segments[segment_id] = self._segments[last]
+        self._count = last
+        if self._buckets is not None and segment_id != last:
+            self._index(segment_id)
+        return segment
+
+    """
+    Move segment by (dx, dy) grid cells
+    return: (old segment, new segment)
+    """
+    def move(self, segment_id, dx, dy):
+        old = tuple(int(v) for v in self._segments[segment_id])
+        if self._buckets is not None:
+            self._unindex(segment_id)
+        self._segments[segment_id] += (dx, dy, dx, dy)
+        if self._buckets is not None:
+            self._index(segment_id)
+        return (old, tuple(int(v) for v in self._segments[segment_id]))
+
+    """
+    Find segments whose bounding box intersects the box (end exclusive)
+    return: array of segment ids
+    """
+    def query(self, x0, y0, x1, y1):
+        if self._count == 0 or x0 >= x1 or y0 >= y1:
+            return np.empty(0, dtype=np.intp)
+        buckets = self._getBuckets()
+        size = self._bucket_size
+        candidates = set()
+        for by in range(y0 // size, (y1 - 1) // size + 1):
+            for bx in range(x0 // size, (x1 - 1) // size + 1):
+                candidates.update(buckets.get((bx, by), ()))
+        ids = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+        segments = self._segments[ids]
+        inside = ((np.minimum(segments[:, 0], segments[:, 2]) < x1) & (np.maximum(segments[:, 0], segments[:, 2]) >= x0) &
+                  (np.minimum(segments[:, 1], segments[:, 3]) < y1) & (np.maximum(segments[:, 1], segments[:, 3]) >= y0))
+        return ids[inside]
+
+    """
+    Find the segment closest to a point
+    return: segment id, or None if no segment is within tolerance
+    """
+    def hitTest(self, x, y, tolerance):
+        ids = self.query(x - tolerance, y - tolerance, x + tolerance + 1, y + tolerance + 1)
+        if ids.size == 0:
+            return None
+        # distance of the point to each candidate segment
+        segments = self._segments[ids].astype(np.float64)
+        start, direction = segments[:, :2], segments[:, 2:] - segments[:, :2]
+        length2 = np.maximum((direction * direction).sum(axis=1), 1e-12)
+        t = np.clip(((np.array([x, y]) - start) * direction).sum(axis=1) / length2, 0.0, 1.0)
+        distance = np.hypot(*(start + t[:, None] * direction - (x, y)).T)
+        closest = int(np.argmin(distance))
+        if distance[closest] > tolerance:
+            return None
+        return int(ids[closest])
+
+    def _reserve(self, count):
+        if count > self._segments.shape[0]:
+            segments = np.empty((max(count, 2 * self._segments.shape[0]), 4), dtype=np.int32)
+            segments[:self._count] = self._segments[:self._count]
+            self._segments = segments
+
+    def _getBuckets(self):
+        if self._buckets is None:
+            self._buckets = {}
+            for segment_id in range(self._count):
+                self._index(segment_id)
+        return self._buckets
+
+    def _bucketKeys(self, segment_id):
+        x0, y0, x1, y1 = (int(v) // self._bucket_size for v in self._segments[segment_id])
+        return [(bx, by) for by in range(min(y0, y1), max(y0, y1) + 1) for bx in range(min(x0, x1), max(x0, x1) + 1)]
+
+    def _index(self, segment_id):
+        for key in self._bucketKeys(segment_id):
+            self._buckets.setdefault(key, set()).add(segment_id)
+
+    def _unindex(self, segment_id):
+        for key in self._bucketKeys(segment_id):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(segment_id)
+                if not bucket:
+                    del self._buckets[key]
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Compare RCA frame codecs on synthetic vorticity-like frames.
+Reports bytes per frame and encode time per codec.
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+import cv2
+from frame_codecs import BENCHMARK_CODECS
+
+def generateFrames(width, height, num_frames):
+    """Yield colormapped frames of a vortex street drifting downstream over a calm far field."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    rng = np.random.default_rng(0)
+    num_vortices = 12
+    start = width / 8
+    spacing = (width - start) / num_vortices
+    radius = height / 16
+    for t in range(num_frames):
+        vorticity = np.zeros((height, width), dtype=np.float32)
+        for i in range(num_vortices):
+            # vortices are shed behind an obstacle at 1/8 of the width, inflow and far field stay calm
+            cx = start + (i * spacing + t * spacing / 30) % (width - start)
+            cy = height / 2 + (radius if i % 2 else -radius)
+            sign = 1.0 if i % 2 else -1.0
+            vorticity += sign * 0.2 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * radius ** 2))
+        vorticity += rng.normal(0.0, 0.0005, vorticity.shape).astype(np.float32)
+        index = cv2.addWeighted(vorticity, 255 / 0.44, vorticity, 0.0, 127.5, dtype=cv2.CV_8U)
+        yield cv2.applyColorMap(index, cv2.COLORMAP_TURBO)
+
+def benchmarkCodec(name, frames, quality):
+    codec = BENCHMARK_CODECS[name]()
+    sizes = []
+    times = []
+    for frame in frames:
+        start = time.perf_counter()
+        data = codec.encode(frame, quality)
+        times.append(time.perf_counter() - start)
+        sizes.append(0 if data is None else len(data))
+    return {
+        'codec': name,
+        'bytes_per_frame': float(np.mean(sizes)),
+        'encode_ms_mean': 1000 * float(np.mean(times)),
+        'encode_ms_p95': 1000 * float(np.percentile(times, 95)),
+        'frames_skipped': sizes.count(0)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark RCA frame codecs')
+    parser.add_argument('--width', type=int, default=1920, help='frame width (default: 1920)')
+    parser.add_argument('--height', type=int, default=480, help='frame height (default: 480)')
+    parser.add_argument('--frames', type=int, default=60, help='number of frames (default: 60)')
+    parser.add_argument('--quality', type=int, default=None, help='quality for lossy codecs (default: per codec)')
+    parser.add_argument('--codecs', nargs='+', default=list(BENCHMARK_CODECS), help='codecs to compare (default: all)')
+    parser.add_argument('--json', help='write results to this file as JSON')
+    args = parser.parse_args()
+
+    frames = list(generateFrames(args.width, args.height, args.frames))
+    results = [benchmarkCodec(name, frames, args.quality) for name in args.codecs]
+
+    print(f'{args.frames} frames, {args.width}x{args.height}')
+    print(f'{"codec":<12}{"KiB/frame":>12}{"encode ms":>12}{"p95 ms":>10}{"skipped":>10}')
+    for result in results:
+        print(f'{result["codec"]:<12}{result["bytes_per_frame"] / 1024:>12.1f}{result["encode_ms_mean"]:>12.2f}'
+              f'{result["encode_ms_p95"]:>10.2f}{result["frames_skipped"]:>10}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'width': args.width, 'height': args.height, 'frames': args.frames, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
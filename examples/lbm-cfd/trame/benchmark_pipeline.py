@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Benchmark the bridge-to-browser pipeline without a simulation build.
+For every grid size a synthetic bridge (bridge_standin.py) streams frames into the viewer's frame loop while
+barriers are drawn through the RCA interaction handler. Reports per-stage throughput, latency percentiles and
+peak RSS. Run from the lbm-cfd directory (the viewer loads its colormaps from resrc/).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from bridge_server import BridgeServer
+from frame_history import FrameHistory
+from frame_timing import FrameTimings
+from trame_app import (AscentView, FrameBroadcaster, FrameIngestor, SteeringLock, addSessionArguments, checkForStateUpdates,
+                       getSessionOptions)
+
+DEFAULT_SIZES = ('400x100', '1920x480', '3840x960', '8192x2048')
+
+# client id of the simulated browser
+_CLIENT = 'benchmark-client'
+
+# Trame state stand-in for the frame loop (attribute access, updates are not sent anywhere)
+class BenchmarkState(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def flush(self):
+        pass
+
+# Stream manager stand-in that counts what would be pushed to the browsers
+class StreamRecorder:
+    def __init__(self):
+        self.num_images = 0
+        self.num_bytes = 0
+
+    def push_content(self, area_name, metadata, data):
+        self.num_images += 1
+        self.num_bytes += len(data)
+
+def summarizeSpans(spans):
+    spans = np.asarray(spans, dtype=np.float64)
+    if spans.size == 0:
+        return None
+    p50, p90, p99 = (float(v) for v in np.percentile(spans, (50, 90, 99)))
+    return {'count': int(spans.size), 'mean': float(spans.mean()), 'p50': p50, 'p90': p90, 'p99': p99}
+
+async def drawBarriers(view, adapter, bridge, display_size, rate, interaction_ms):
+    """Drag a barrier across the client area `rate` times per second and submit the result."""
+    rng = np.random.default_rng(0)
+    width, height = display_size
+    while True:
+        await asyncio.sleep(1.0 / rate)
+        x0, y0 = rng.uniform(0.1, 0.9) * width, rng.uniform(0.1, 0.9) * height
+        x1, y1 = rng.uniform(0.1, 0.9) * width, rng.uniform(0.1, 0.9) * height
+        events = [{'type': 'LeftButtonPress', 'x': x0, 'y': y0}]
+        events += [{'type': 'MouseMove', 'x': x0 + (x1 - x0) * t, 'y': y0 + (y1 - y0) * t} for t in np.linspace(0.2, 1.0, 5)]
+        events.append({'type': 'LeftButtonRelease', 'x': x1, 'y': y1})
+        for event in events:
+            start = time.perf_counter()
+            adapter.on_interaction(_CLIENT, event)
+            interaction_ms.append((time.perf_counter() - start) * 1000.0)
+            # let the encoder push the interactive frames in between
+            await asyncio.sleep(0.005)
+        bridge.sendSteering({'flow_speed': 0.75, 'barriers': view.submitBarriers()})
+
+async def measureGrid(width, height, options):
+    """Run the viewer frame loop against a synthetic bridge streaming width x height frames."""
+    session_options = options['session']
+    timings = FrameTimings(window=max(256, 2 * options['frames']))
+    view = AscentView(timings)
+    encoder_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='frame-encoder')
+    steering_lock = SteeringLock()
+    history = FrameHistory(int(options['history_mb'] * 1024 * 1024))
+    frame_ingestor = FrameIngestor()
+    num_received = 0
+    def onFrame(frame):
+        nonlocal num_received
+        num_received += 1
+        frame_ingestor.put(frame)
+    bridge = BridgeServer(options['address'], session_options, onFrame)
+    broadcaster = FrameBroadcaster(view, encoder_pool, steering_lock, options['codec'],
+                                   lambda roi: bridge.sendViewSettings({'roi': roi}), timings)
+
+    # one browser watching the selected tier, holding control
+    recorder = StreamRecorder()
+    adapter = next(a for a in broadcaster.getAdapters() if a.area_name == f'view-{options["tier"]}')
+    adapter.set_streamer(recorder)
+    steering_lock.acquire(_CLIENT)
+    # the browser shows live frames (matters with --sample-on-demand)
+    bridge.setDemand(True)
+    display_size = (options['display_width'], max(1, round(options['display_width'] * height / width)))
+    adapter.update_size(_CLIENT, {'w': display_size[0], 'h': display_size[1], 'p': 1})
+
+    # no one submits in the browser -> the frame loop lets a sync simulation continue after every frame
+    state = BenchmarkState(enable_steering=False, color_range_mode='fixed', history_live=True, show_timings=False)
+    await bridge.start()
+    frame_loop = asyncio.create_task(checkForStateUpdates(state, frame_ingestor, bridge.sendSteering,
+                                                          lambda: bridge.updateSessionOptions({'transport': 'socket'}),
+                                                          view, broadcaster, history, None, session_options['steering_mode']))
+
+    with tempfile.NamedTemporaryFile(suffix='.json') as standin_result:
+        standin = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bridge_standin.py'),
+            '--address', options['address'], '--width', str(width), '--height', str(height),
+            '--rate', str(options['rate']), '--frames', str(options['frames']), '--json', standin_result.name,
+            stdout=asyncio.subprocess.DEVNULL)
+        interaction_ms = []
+        interactions = None
+        if options['interaction_rate'] > 0:
+            interactions = asyncio.create_task(drawBarriers(view, adapter, bridge, display_size,
+                                                            options['interaction_rate'], interaction_ms))
+        await standin.wait()
+        # let the last frames reach the encoder
+        await asyncio.sleep(0.5)
+        if interactions is not None:
+            interactions.cancel()
+        frame_loop.cancel()
+        with open(standin_result.name) as f:
+            simulation = json.load(f) if os.path.getsize(standin_result.name) > 0 else {}
+    encoder_pool.shutdown()
+
+    stages = {}
+    for row in timings.getSummary():
+        stage = row.pop('stage')
+        # throughput a stage could sustain on its own
+        row['fps'] = 1000.0 / row['mean'] if row['mean'] > 0 else None
+        stages[stage] = row
+    elapsed = simulation.get('elapsed_s', 0.0)
+    num_delivered = stages.get('total', {}).get('count', 0)
+    return {
+        'width': width,
+        'height': height,
+        'frames_sent': simulation.get('frames_sent', 0),
+        'frames_received': num_received,
+        'frames_delivered': num_delivered,
+        'frames_dropped': frame_ingestor.frames_dropped,
+        'frames_coalesced': frame_ingestor.frames_coalesced,
+        'simulation_fps': simulation.get('fps', 0.0),
+        'delivered_fps': num_delivered / elapsed if elapsed > 0 else 0.0,
+        'images_pushed': recorder.num_images,
+        'bytes_per_image': recorder.num_bytes / max(1, recorder.num_images),
+        'stages': stages,
+        'interaction_ms': summarizeSpans(interaction_ms),
+        'peak_rss_mb': {'viewer': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                        'simulation': simulation.get('peak_rss_mb')}
+    }
+
+def _measureGridProcess(width, height, options, results):
+    # fresh process per grid size -> peak RSS belongs to this size only
+    results.put(asyncio.run(measureGrid(width, height, options)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bridge-to-browser pipeline with a synthetic simulation')
+    parser.add_argument('--sizes', nargs='+', default=list(DEFAULT_SIZES), help='grid sizes WxH (default: 400x100 up to 8192x2048)')
+    parser.add_argument('--frames', type=int, default=60, help='frames per grid size (default: 60)')
+    parser.add_argument('--rate', type=float, default=30, help='frames per second the simulation sends, 0: as fast as possible (default: 30)')
+    parser.add_argument('--codec', default='jpeg', help='image codec of the stream (default: jpeg)')
+    parser.add_argument('--tier', default='medium', help='stream tier the simulated browser watches (default: medium)')
+    parser.add_argument('--display-width', type=int, default=1000, help='width of the browser view area in pixels (default: 1000)')
+    parser.add_argument('--interaction-rate', type=float, default=2, help='barriers drawn per second, 0: none (default: 2)')
+    parser.add_argument('--history-mb', type=float, default=256, help='frame history budget in MiB (default: 256)')
+    parser.add_argument('--address', default=os.path.join(tempfile.gettempdir(), f'ascent-trame-benchmark-{os.getpid()}.sock'),
+                        help='bridge address, host:port or Unix socket path (default: Unix socket in the temp directory)')
+    parser.add_argument('--json', default='benchmark_pipeline.json', help='write results to this file as JSON (default: benchmark_pipeline.json)')
+    # session options of the viewer with its defaults (transport, payload, ...), except that the simulation never waits
+    addSessionArguments(parser)
+    parser.set_defaults(steering_mode='async')
+    args = parser.parse_args()
+
+    options = {
+        'frames': args.frames,
+        'rate': args.rate,
+        'session': getSessionOptions(args),
+        'codec': args.codec,
+        'tier': args.tier,
+        'display_width': args.display_width,
+        'interaction_rate': args.interaction_rate,
+        'history_mb': args.history_mb,
+        'address': args.address
+    }
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.lower().split('x'))
+        queue = context.Queue()
+        process = context.Process(target=_measureGridProcess, args=(width, height, options, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+        result = results[-1]
+        print(f'{width}x{height}: {result["frames_delivered"]}/{result["frames_sent"]} frames delivered, '
+              f'{result["delivered_fps"]:.1f} fps (simulation {result["simulation_fps"]:.1f} fps), '
+              f'peak RSS viewer {result["peak_rss_mb"]["viewer"]:.0f} MiB, simulation {result["peak_rss_mb"]["simulation"] or 0:.0f} MiB')
+        print(f'  {"stage":<15}{"frames":>8}{"mean ms":>10}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"fps":>10}')
+        for stage, row in result['stages'].items():
+            fps = f'{row["fps"]:>10.1f}' if row['fps'] is not None else f'{"-":>10}'
+            print(f'  {stage:<15}{row["count"]:>8}{row["mean"]:>10.2f}{row["p50"]:>10.2f}{row["p90"]:>10.2f}{row["p99"]:>10.2f}{fps}')
+        if result['interaction_ms'] is not None:
+            interaction = result['interaction_ms']
+            print(f'  {"interaction":<15}{interaction["count"]:>8}{interaction["mean"]:>10.2f}{interaction["p50"]:>10.2f}'
+                  f'{interaction["p90"]:>10.2f}{interaction["p99"]:>10.2f}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+                'options': options,
+                'results': results
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
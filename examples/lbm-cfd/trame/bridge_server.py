@@ -0,0 +1,204 @@
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import socket
+import sys
+import time
+import numpy as np
+# message format and handshake are shared with the Ascent bridge (see ascent/bridge_transport.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ascent'))
+from bridge_transport import MAX_HEADER_SIZE, MESSAGE_LENGTH, authDigest, encodeMessage, getAuthkey, parseAddress
+
+# largest array of an authenticated message (bytes), nothing is allocated for unauthenticated ones
+_MAX_ARRAY_SIZE = 1 << 32
+_AUTH_TIMEOUT = 10.0
+
+# Accepts the connection of the Ascent bridge on the Trame event loop
+#
+# Frames are handed to on_frame (with the wall clock time they were received as 'received') as soon as they are
+# read. Only one simulation is attached at a time, a new connection replaces the previous one.
+class BridgeServer:
+    def __init__(self, address, session_options, on_frame, authkey=None):
+        self._address = parseAddress(address)
+        self._session_options = session_options
+        self._on_frame = on_frame
+        self._authkey = getAuthkey() if authkey is None else authkey
+        self._connection = None
+        self._demanded = False
+        self._server = None
+
+    """
+    Start listening (must be called from the event loop)
+    return: None
+    """
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if isinstance(self._address, tuple):
+            self._server = await loop.create_server(lambda: _BridgeConnection(self), *self._address)
+        else:
+            if os.path.exists(self._address):
+                os.unlink(self._address)
+            self._server = await loop.create_unix_server(lambda: _BridgeConnection(self), self._address)
+
+    """
+    return: whether a simulation is attached
+    """
+    def isConnected(self):
+        return self._connection is not None
+
+    """
+    Send steering update to the simulation (sync mode: every update lets the simulation run one more step)
+    return: whether the update was sent
+    """
+    def sendSteering(self, update):
+        if self._connection is None:
+            return False
+        self._connection.send('steering', update)
+        return True
+
+    """
+    Send view settings to the simulation (region of interest, field, slice plane), applied from its next step on
+    (sync mode: unlike steering updates they do not let the simulation run another step)
+    return: whether the settings were sent
+    """
+    def sendViewSettings(self, settings):
+        if self._connection is None:
+            return False
+        self._connection.send('view', settings)
+        return True
+
+    """
+    Change session options of the attached simulation (and of simulations attaching later)
+    return: None
+    """
+    def updateSessionOptions(self, options):
+        self._session_options.update(options)
+        if self._connection is not None:
+            self._connection.send('options', options)
+
+    """
+    Tell the simulation whether any viewer currently wants frames (used with --sample-on-demand)
+    return: None
+    """
+    def setDemand(self, demanded):
+        if demanded != self._demanded:
+            self._demanded = demanded
+            if self._connection is not None:
+                self._connection.send('demand', {'demanded': demanded})
+
+    def _attach(self, connection, bridge_nonce, bridge_host):
+        if self._connection is not None:
+            # simulation restarted -> drop the stale connection
+            self._connection.close()
+        self._connection = connection
+        options = dict(self._session_options)
+        # shared memory only works with a bridge on this host
+        if options.get('transport') == 'shm' and isinstance(self._address, tuple) and bridge_host != socket.gethostname():
+            options['transport'] = 'socket'
+        connection.send('session', {'digest': authDigest(self._authkey, bridge_nonce), 'options': options})
+        connection.send('demand', {'demanded': self._demanded})
+
+    def _detach(self, connection):
+        if self._connection is connection:
+            self._connection = None
+
+# One bridge connection, messages are received straight into the arrays they end up in (no stream buffer copies)
+class _BridgeConnection(asyncio.BufferedProtocol):
+    def __init__(self, server):
+        self._server = server
+        self._transport = None
+        self._nonce = secrets.token_hex(32)
+        self._authenticated = False
+        self._auth_timer = None
+        # part of the message being received (length, header or one of the arrays) and how much of it arrived
+        self._length = bytearray(MESSAGE_LENGTH.size)
+        self._target = memoryview(self._length)
+        self._position = 0
+        self._header = None
+        self._message = None
+        self._pending_arrays = None
+        self._receiving = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._auth_timer = asyncio.get_running_loop().call_later(_AUTH_TIMEOUT, self.close)
+        self.send('challenge', {'nonce': self._nonce})
+
+    def connection_lost(self, exc):
+        if self._auth_timer is not None:
+            self._auth_timer.cancel()
+        self._server._detach(self)
+
+    def send(self, kind, values):
+        self._transport.writelines(encodeMessage(kind, values))
+
+    def close(self):
+        self._transport.close()
+
+    def get_buffer(self, sizehint):
+        return self._target[self._position:]
+
+    def buffer_updated(self, nbytes):
+        self._position += nbytes
+        if self._position < len(self._target):
+            return
+        try:
+            self._advance()
+        except (ValueError, KeyError, TypeError, MemoryError):
+            # not a bridge speaking this protocol (or one sending arrays that do not fit)
+            self.close()
+
+    def _advance(self):
+        # current part is complete -> continue with the next part of the message
+        if self._header is None:
+            length, = MESSAGE_LENGTH.unpack(self._length)
+            if length == 0 or length > MAX_HEADER_SIZE:
+                raise ValueError(f'invalid bridge message header size ({length} bytes)')
+            self._header = bytearray(length)
+            self._setTarget(self._header)
+            return
+        if self._message is None:
+            header = json.loads(self._header)
+            if not self._authenticated and (header['type'] != 'response' or header['arrays']):
+                raise ValueError('unauthenticated peer sent more than a challenge response')
+            self._message = (header['type'], dict(header['values']))
+            self._pending_arrays = list(reversed(header['arrays']))
+        else:
+            name, array = self._receiving
+            self._message[1][name] = array
+        while self._pending_arrays:
+            name, dtype, shape = self._pending_arrays.pop()
+            dtype = np.dtype(dtype)
+            nbytes = int(np.prod(shape, dtype=object)) * dtype.itemsize
+            if dtype.hasobject or min(shape, default=0) < 0 or nbytes > _MAX_ARRAY_SIZE:
+                raise ValueError(f'invalid bridge array {name} ({dtype.str}, {shape})')
+            array = np.empty(shape, dtype=dtype)
+            if array.nbytes == 0:
+                self._message[1][name] = array
+                continue
+            self._receiving = (name, array)
+            self._setTarget(array)
+            return
+        kind, message = self._message
+        self._header = self._message = self._receiving = None
+        self._setTarget(self._length)
+        self._onMessage(kind, message)
+
+    def _setTarget(self, buffer):
+        self._target = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def _onMessage(self, kind, message):
+        if not self._authenticated:
+            if kind != 'response' or not hmac.compare_digest(str(message.get('digest', '')), authDigest(self._server._authkey, self._nonce)):
+                self.close()
+                return
+            self._authenticated = True
+            self._auth_timer.cancel()
+            self._auth_timer = None
+            self._server._attach(self, message['nonce'], message.get('host'))
+        elif kind == 'frame':
+            message['received'] = time.time()
+            self._server._on_frame(message)
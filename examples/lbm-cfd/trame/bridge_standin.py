@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Synthetic stand-in for the Ascent bridge (no MPI, Ascent or LBM build needed).
+Connects to a running Trame viewer with the bridge's own code (bridge_transport.py, so the transport and payload
+options of the session are honored), sends vorticity-like frames of any size at a given rate and applies steering
+replies (flow speed, barriers, region of interest, field, slice plane of a volume).
+"""
+
+import argparse
+import json
+import os
+import resource
+import select
+import sys
+import time
+from collections import deque
+import numpy as np
+# handshake, messages, shared memory and field packing are the bridge's own code
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ascent'))
+from bridge_transport import SharedFrameWriter, connectToViewer, getAuthkey, packField, parseAddress, receiveMessage, sendMessage
+
+"""
+Generate one period of a vortex street (the field of later steps is this one shifted downstream)
+return: (height, width) float32 vorticity
+"""
+def generateVortexStreet(width, height, num_vortices=12):
+    x = np.arange(width, dtype=np.float32)
+    y = np.arange(height, dtype=np.float32)
+    radius = max(height / 16, 1.0)
+    spacing = width / num_vortices
+    vorticity = np.zeros((height, width), dtype=np.float32)
+    for i in range(num_vortices):
+        # gaussians are separable -> outer product of two 1D profiles instead of a 2D exp per vortex
+        cx = (i + 0.5) * spacing
+        cy = height / 2 + (radius if i % 2 else -radius)
+        # periodic in x so shifting the street wraps around without a seam
+        dx = np.minimum(np.abs(x - cx), width - np.abs(x - cx))
+        profile_x = np.exp(-dx ** 2 / (2 * radius ** 2))
+        profile_y = np.exp(-(y - cy) ** 2 / (2 * radius ** 2))
+        vorticity += (0.2 if i % 2 else -0.2) * np.outer(profile_y, profile_x)
+    return vorticity
+
+"""
+Slice plane of a volume where every z layer is the street shifted a bit further downstream
+return: float32 plane (rows/columns: y/x for a z slice, z/x for a y slice, z/y for an x slice)
+"""
+def sliceVortexStreet(street, shift, axis, index, depth):
+    width = street.shape[1]
+    layer_shifts = int(shift) + 4 * np.arange(depth)
+    if axis == 'z':
+        return np.roll(street, layer_shifts[index], axis=1)
+    if axis == 'y':
+        return street[index][(np.arange(width) - layer_shifts[:, None]) % width]
+    return np.ascontiguousarray(street[:, (index - layer_shifts) % width].T)
+
+# Single-process counterpart of the bridge's TrameSession (messages go through bridge_transport like in the bridge)
+class SyntheticBridge:
+    def __init__(self, address, authkey):
+        self._address = parseAddress(address)
+        self._authkey = authkey
+        self._socket = None
+        self._steering = deque()
+        self._view = {}
+        self.options = {}
+        self.demanded = False
+
+    """
+    Connect and authenticate, retrying until the viewer is up or timeout seconds have passed
+    return: None
+    """
+    def connect(self, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._socket, self.options = connectToViewer(self._address, self._authkey, timeout)
+                return
+            except (ConnectionError, FileNotFoundError):
+                # viewer not up yet
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+    def close(self):
+        self._socket.close()
+
+    def sendFrame(self, frame):
+        sendMessage(self._socket, 'frame', frame)
+
+    """
+    Get steering updates (wait: block for the next one like the bridge in sync mode, otherwise merge pending ones)
+    return: dict of steering updates
+    """
+    def receiveSteering(self, wait):
+        self.receivePending()
+        if wait:
+            while not self._steering:
+                self._dispatch(*receiveMessage(self._socket))
+            update = self._steering.popleft()
+        else:
+            update = {}
+            while self._steering:
+                update.update(self._steering.popleft())
+        # view settings go with whatever step comes next (latest wins)
+        update.update(self._view)
+        self._view = {}
+        return update
+
+    def receivePending(self):
+        while select.select([self._socket], [], [], 0)[0]:
+            self._dispatch(*receiveMessage(self._socket))
+
+    def _dispatch(self, kind, message):
+        if kind == 'demand':
+            self.demanded = bool(message['demanded'])
+        elif kind == 'steering':
+            self._steering.append(message)
+        elif kind == 'view':
+            self._view.update(message)
+        elif kind == 'options':
+            self.options.update(message)
+
+"""
+Statistics the bridge reduces over all ranks (min, max, mean, count and a 100-bin histogram)
+return: dict of frame arrays
+"""
+def computeStatistics(values, num_bins=100):
+    low, high = float(values.min()), float(values.max())
+    bins = np.subtract(values, low, dtype=np.float32)
+    bins *= num_bins / (high - low) if high > low else 0.0
+    histogram = np.bincount(np.clip(bins, 0, num_bins - 1, out=bins).astype(np.intp).ravel(), minlength=num_bins)
+    return {
+        'stats': np.array([low, high, float(values.mean(dtype=np.float64)), values.size]),
+        'histogram': histogram.astype(np.float64),
+        'histogram_range': np.array([low, high], dtype=np.float64)
+    }
+
+"""
+Send frames until num_frames were sent (0: until the viewer goes away)
+return: dict of run statistics
+"""
+def run(bridge, width, height, rate, num_frames, depth=0):
+    street = generateVortexStreet(width, height)
+    steering_mode = bridge.options.get('steering_mode', 'sync')
+    sample_on_demand = bridge.options.get('sample_on_demand', False)
+    field = 'vorticity'
+    roi = None
+    # volumes run slower (like the 3D example, whose time step only allows its initial speed)
+    flow_speed = 0.75 if depth == 0 else 0.25
+    barriers = np.zeros((0, 4), dtype=np.int32)
+    volume_dims = (width, height, depth)
+    slice_axis, slice_index = 'z', depth // 2
+    statistics, statistics_key = None, None
+    shift = 0.0
+    step = 0
+    frames_sent = 0
+    prev_step, send_ms, wait_ms = -1, -1.0, -1.0
+    frame_writer = None
+    start = time.perf_counter()
+    next_frame = start
+    while num_frames == 0 or frames_sent < num_frames:
+        step += 1
+        # street drifts downstream with the flow speed
+        shift = (shift + flow_speed * 4) % width
+        if sample_on_demand:
+            bridge.receivePending()
+            if not bridge.demanded:
+                time.sleep(0.01)
+                continue
+
+        # 'gather': shifted copy of the street (cropped to the region of interest)
+        gather_start = time.perf_counter()
+        if depth > 0:
+            values = sliceVortexStreet(street, shift, slice_axis, slice_index, depth)
+        else:
+            values = np.roll(street, int(shift), axis=1)
+        if field == 'speed':
+            values = np.abs(values, out=values)
+        origin = (0, 0)
+        plane_dims = (values.shape[1], values.shape[0])
+        if roi is not None:
+            values = np.ascontiguousarray(values[roi[1]:roi[3], roi[0]:roi[2]])
+            origin = roi[:2]
+        gather_ms = (time.perf_counter() - gather_start) * 1000.0
+        # shifting the whole street does not change its statistics -> only computed again for a region of interest
+        stats_start = time.perf_counter()
+        if roi is not None or depth > 0 or statistics_key != field:
+            statistics = computeStatistics(values)
+            statistics_key = field if roi is None else None
+        stats_ms = (time.perf_counter() - stats_start) * 1000.0
+
+        frame = {
+            'barriers': barriers,
+            field: values,
+            'field': np.array(field),
+            'fields': np.array(['speed', 'vorticity']),
+            'origin': np.array(origin, dtype=np.int32),
+            'spacing': np.array(1, dtype=np.int32),
+            'plane_dims': np.array(plane_dims, dtype=np.int32),
+            'step': np.array(step, dtype=np.int64),
+            'time': np.array(step * 0.001, dtype=np.float64)
+        }
+        if depth > 0:
+            frame['slice'] = np.array(['xyz'.index(slice_axis), slice_index], dtype=np.int32)
+            frame['volume_dims'] = np.array(volume_dims, dtype=np.int32)
+            frame['flow_speed'] = np.array(flow_speed, dtype=np.float64)
+            frame['max_flow_speed'] = np.array(0.25, dtype=np.float64)
+        frame.update(statistics)
+        # payload and transport like the bridge (options can change, e.g. viewer falls back to socket transport)
+        pack_start = time.perf_counter()
+        packField(frame, field, bridge.options)
+        pack_ms = (time.perf_counter() - pack_start) * 1000.0
+        frame['timing'] = np.array([time.time(), -1.0, stats_ms, gather_ms, pack_ms, prev_step, send_ms, wait_ms], dtype=np.float64)
+        if bridge.options.get('transport', 'socket') == 'shm':
+            if frame_writer is None:
+                frame_writer = SharedFrameWriter(bridge.options.get('shm_slots', 3))
+            frame = {'shm': frame_writer.write(frame)}
+
+        send_start = time.perf_counter()
+        bridge.sendFrame(frame)
+        send_ms = (time.perf_counter() - send_start) * 1000.0
+        wait_start = time.perf_counter()
+        update = bridge.receiveSteering(wait=steering_mode != 'async')
+        wait_ms = (time.perf_counter() - wait_start) * 1000.0
+        prev_step = step
+        frames_sent += 1
+
+        # apply steering like the simulation would on its next step
+        flow_speed = float(update.get('flow_speed', flow_speed))
+        if depth > 0:
+            flow_speed = min(flow_speed, 0.25)
+        if 'barriers' in update:
+            barriers = np.asarray(update['barriers'], dtype=np.int32).reshape((-1, 4))
+        if 'roi' in update:
+            roi = tuple(int(v) for v in update['roi']) if update['roi'] else None
+            if roi is not None and not (roi[2] > roi[0] and roi[3] > roi[1]):
+                roi = None
+        if update.get('field') in ('speed', 'vorticity'):
+            field = update['field']
+        if depth > 0 and update.get('slice', [None])[0] in ('x', 'y', 'z'):
+            axis = update['slice'][0]
+            if axis != slice_axis:
+                roi = None
+            slice_axis = axis
+            slice_index = min(max(int(update['slice'][1]), 0), volume_dims['xyz'.index(axis)] - 1)
+
+        if rate > 0:
+            next_frame += 1.0 / rate
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # behind schedule -> do not try to catch up with a burst
+                next_frame = time.perf_counter()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'frames_sent': frames_sent,
+        'elapsed_s': elapsed,
+        'fps': frames_sent / elapsed if elapsed > 0 else 0.0,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic stand-in for the Ascent bridge')
+    parser.add_argument('--address', default=os.environ.get('ASCENT_TRAME_ADDRESS', '127.0.0.1:8000'),
+                        help='viewer bridge address, host:port or Unix socket path (default: ASCENT_TRAME_ADDRESS or 127.0.0.1:8000)')
+    parser.add_argument('--width', type=int, default=400, help='grid width (default: 400)')
+    parser.add_argument('--height', type=int, default=100, help='grid height (default: 100)')
+    parser.add_argument('--depth', type=int, default=0, help='grid depth, > 0: stream slices of a volume (default: 0)')
+    parser.add_argument('--rate', type=float, default=30, help='frames per second, 0: as fast as possible (default: 30)')
+    parser.add_argument('--frames', type=int, default=0, help='number of frames to send, 0: until the viewer exits (default: 0)')
+    parser.add_argument('--connect-timeout', type=float, default=30, help='seconds to wait for the viewer (default: 30)')
+    parser.add_argument('--json', help='write run statistics to this file as JSON')
+    args = parser.parse_args()
+
+    bridge = SyntheticBridge(args.address, getAuthkey())
+    bridge.connect(args.connect_timeout)
+    try:
+        result = run(bridge, args.width, args.height, args.rate, args.frames, args.depth)
+    except (OSError, EOFError):
+        print('viewer closed the connection')
+        return
+    finally:
+        bridge.close()
+
+    size = f'{args.width}x{args.height}' + (f'x{args.depth}' if args.depth > 0 else '')
+    print(f'{result["frames_sent"]} frames of {size} in {result["elapsed_s"]:.1f} s '
+          f'({result["fps"]:.1f} fps), peak RSS {result["peak_rss_mb"]:.0f} MiB')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
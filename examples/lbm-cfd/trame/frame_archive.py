@@ -0,0 +1,199 @@
+import json
+import os
+import queue
+import struct
+import threading
+import numpy as np
+
+# Archive layout (one directory per run):
+#   archive.json     - format version, names of the archived fields, dtype, frames per chunk
+#   chunk_NNNNN.npy  - fields of up to chunk_frames frames (frames x height x width), memory mapped, trimmed to the
+#                      frames written when closed early (field shape changed, e.g. zoom, or the writer was closed)
+#   barriers.bin     - barriers of all frames (int32 x0, y0, x1, y1)
+#   index.bin        - one INDEX_DTYPE record per frame
+INDEX_DTYPE = np.dtype([('step', '<i8'), ('time', '<f8'), ('chunk', '<i4'), ('slot', '<i4'),
+                        ('barrier_offset', '<i8'), ('num_barriers', '<i4'),
+                        ('origin_x', '<i4'), ('origin_y', '<i4'), ('spacing', '<i4'), ('field', '<i2')])
+ARCHIVE_VERSION = 3
+
+# Appends received frames to an on-disk archive on a background thread
+class FrameArchiveWriter:
+    def __init__(self, directory, chunk_frames=64, max_pending=8):
+        self._directory = directory
+        self._fields = []
+        self._chunk_frames = chunk_frames
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._chunk = None
+        self._chunk_id = -1
+        self._slot = 0
+        self._barrier_offset = 0
+        self.frames_dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        # continue an existing archive after its last chunk (only one written in this format)
+        index = _readIndex(directory)
+        if index.size > 0:
+            with open(os.path.join(directory, 'archive.json')) as f:
+                metadata = json.load(f)
+            if metadata.get('version') != ARCHIVE_VERSION:
+                raise ValueError(f'cannot append to frame archive version {metadata.get("version")} '
+                                 f'(version {ARCHIVE_VERSION} is written), use another directory')
+            self._fields = metadata['fields']
+            self._chunk_id = int(index['chunk'].max())
+            self._barrier_offset = int(index['barrier_offset'][-1] + index['num_barriers'][-1])
+        self._index_file = open(os.path.join(directory, 'index.bin'), 'ab')
+        self._barriers_file = open(os.path.join(directory, 'barriers.bin'), 'ab')
+        # cut off anything written after the last complete record
+        self._index_file.truncate(index.size * INDEX_DTYPE.itemsize)
+        self._barriers_file.truncate(self._barrier_offset * 4 * 4)
+        self._writeMetadata()
+        self._thread = threading.Thread(target=self._writeFrames, daemon=True)
+        self._thread.start()
+
+    def _writeMetadata(self):
+        metadata = {'version': ARCHIVE_VERSION, 'fields': self._fields, 'dtype': 'float32', 'chunk_frames': self._chunk_frames}
+        with open(os.path.join(self._directory, 'archive.json'), 'w') as f:
+            json.dump(metadata, f)
+
+    """
+    Queue frame for writing without blocking (frame is dropped if the writer falls behind)
+    return: whether frame was queued
+    """
+    def append(self, frame, step, time):
+        # copy now, shared memory frames get overwritten by the bridge
+        origin = frame.get('origin', (0, 0))
+        grid = (int(origin[0]), int(origin[1]), int(frame.get('spacing', 1)))
+        name = str(frame.get('field', 'vorticity'))
+        field = np.array(frame[name], dtype=np.float32)
+        if 'value_range' in frame:
+            # quantized by the bridge -> store values
+            value_min, value_max = (float(v) for v in frame['value_range'])
+            field *= (value_max - value_min) / np.iinfo(frame[name].dtype).max
+            field += value_min
+        item = (name, field, np.array(frame['barriers'], dtype=np.int32), step, time, grid)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+        return True
+
+    """
+    Write remaining frames and close archive files
+    return: None
+    """
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _writeFrames(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._writeFrame(*item)
+        self._closeChunk()
+        self._index_file.close()
+        self._barriers_file.close()
+
+    def _writeFrame(self, name, field, barriers, step, time, grid):
+        if name not in self._fields:
+            self._fields.append(name)
+            self._writeMetadata()
+        if self._chunk is None or self._slot == self._chunk_frames or self._chunk.shape[1:] != field.shape:
+            self._openChunk(field.shape)
+        self._chunk[self._slot] = field
+
+        barriers = barriers.reshape(-1, 4)
+        self._barriers_file.write(barriers.tobytes())
+        self._barriers_file.flush()
+        record = np.array([(step, time, self._chunk_id, self._slot, self._barrier_offset, barriers.shape[0]) + grid +
+                           (self._fields.index(name),)], dtype=INDEX_DTYPE)
+        self._index_file.write(record.tobytes())
+        self._index_file.flush()
+
+        self._slot += 1
+        self._barrier_offset += barriers.shape[0]
+
+    def _openChunk(self, shape):
+        self._closeChunk()
+        self._chunk_id += 1
+        self._slot = 0
+        filename = os.path.join(self._directory, f'chunk_{self._chunk_id:05d}.npy')
+        self._chunk = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=(self._chunk_frames,) + shape)
+
+    def _closeChunk(self):
+        if self._chunk is not None:
+            self._chunk.flush()
+            filename = self._chunk.filename
+            # drop the mapping before the file is truncated
+            self._chunk = None
+            if self._slot < self._chunk_frames:
+                _trimChunk(filename, self._slot)
+
+# Reads frames from an archive on demand (chunks are memory mapped, nothing is loaded up front)
+class FrameArchiveReader:
+    def __init__(self, directory):
+        self._directory = directory
+        with open(os.path.join(directory, 'archive.json')) as f:
+            self._metadata = json.load(f)
+        if self._metadata['version'] != ARCHIVE_VERSION:
+            raise ValueError(f'unsupported frame archive version {self._metadata["version"]}')
+        self._index = _readIndex(directory, mmap=True)
+        barriers_path = os.path.join(directory, 'barriers.bin')
+        if os.path.getsize(barriers_path) > 0:
+            self._barriers = np.memmap(barriers_path, dtype='<i4', mode='r').reshape(-1, 4)
+        else:
+            self._barriers = np.empty((0, 4), dtype=np.int32)
+        self._chunk = None
+        self._chunk_id = -1
+
+    def __len__(self):
+        return self._index.size
+
+    """
+    Read frame (same keys as frames received from the Ascent bridge)
+    return: dict with field name and values, barriers, grid origin and spacing, step and time
+    """
+    def read(self, position):
+        record = self._index[position]
+        if record['chunk'] != self._chunk_id:
+            self._chunk_id = int(record['chunk'])
+            self._chunk = np.load(os.path.join(self._directory, f'chunk_{self._chunk_id:05d}.npy'), mmap_mode='r')
+        offset, num_barriers = int(record['barrier_offset']), int(record['num_barriers'])
+        name = self._metadata['fields'][record['field']]
+        return {
+            'field': name,
+            name: np.array(self._chunk[record['slot']]),
+            'barriers': np.array(self._barriers[offset:offset + num_barriers]),
+            'origin': (int(record['origin_x']), int(record['origin_y'])),
+            'spacing': int(record['spacing']),
+            'step': int(record['step']),
+            'time': float(record['time'])
+        }
+
+def _trimChunk(filename, num_frames):
+    # rewrite the shape in the .npy header (padded to its old length, data stays in place) and cut off unused frames
+    with open(filename, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version != (1, 0):
+            return
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        offset = f.tell()
+        shape = (num_frames,) + shape[1:]
+        header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran_order, 'shape': shape})
+        prefix = np.lib.format.magic(1, 0)
+        header_size = offset - len(prefix) - 2
+        f.seek(0)
+        f.write(prefix + struct.pack('<H', header_size) + (header.ljust(header_size - 1) + '\n').encode('latin1'))
+        f.truncate(offset + int(np.prod(shape)) * dtype.itemsize)
+
+def _readIndex(directory, mmap=False):
+    path = os.path.join(directory, 'index.bin')
+    # drop a partially written record at the end (e.g. after a crash)
+    num_records = os.path.getsize(path) // INDEX_DTYPE.itemsize if os.path.exists(path) else 0
+    if num_records == 0:
+        return np.empty(0, dtype=INDEX_DTYPE)
+    if mmap:
+        return np.memmap(path, dtype=INDEX_DTYPE, mode='r', shape=(num_records,))
+    return np.fromfile(path, dtype=INDEX_DTYPE, count=num_records)
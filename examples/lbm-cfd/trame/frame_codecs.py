@@ -0,0 +1,164 @@
+import struct
+from abc import ABC, abstractmethod
+import numpy as np
+import cv2
+
+# Base class for codecs used to encode frames of the RCA stream (subclasses implement encode)
+class FrameCodec(ABC):
+    name = ''
+    mime_type = ''
+    default_quality = 100
+
+    """
+    Encode BGR image
+    return: encoded binary data (None if there is nothing to send)
+    """
+    @abstractmethod
+    def encode(self, image, quality=None):
+        pass
+
+    """
+    Decode binary data produced by encode
+    return: BGR image
+    """
+    def decode(self, data):
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def _imencode(self, extension, image, params):
+        result, encoded_img = cv2.imencode(extension, image, params)
+        if result:
+            return encoded_img.tobytes()
+        return None
+
+class JpegCodec(FrameCodec):
+    name = 'jpeg'
+    mime_type = 'image/jpeg'
+    default_quality = 94
+
+    def encode(self, image, quality=None):
+        quality = self.default_quality if quality is None else quality
+        return self._imencode('.jpg', image, (cv2.IMWRITE_JPEG_QUALITY, int(quality)))
+
+class WebpCodec(FrameCodec):
+    name = 'webp'
+    mime_type = 'image/webp'
+    default_quality = 90
+
+    def encode(self, image, quality=None):
+        quality = self.default_quality if quality is None else quality
+        return self._imencode('.webp', image, (cv2.IMWRITE_WEBP_QUALITY, int(quality)))
+
+# Lossless, for inspecting exact colormap values (quality is ignored)
+class PngCodec(FrameCodec):
+    name = 'png'
+    mime_type = 'image/png'
+
+    def __init__(self, compression=1):
+        self._compression = compression
+
+    def encode(self, image, quality=None):
+        return self._imencode('.png', image, (cv2.IMWRITE_PNG_COMPRESSION, self._compression))
+
+# Only re-encodes tiles whose content changed by more than a threshold since they were last sent
+#
+# Payload: header (magic, width, height, tile size, number of tiles, key frame flag) followed by
+# (tile x, tile y, size, data) for each tile, tile data is encoded with tile_codec. Benchmark only
+# (benchmark_codecs.py measures what a delta stream would save): the RCA image view shows every pushed
+# frame as a whole image and cannot composite tiles onto the previous one (see decode), so it is not a
+# stream codec.
+class TileDeltaCodec(FrameCodec):
+    name = 'tile-delta'
+    mime_type = 'application/x-ascent-tile-delta'
+    _header = struct.Struct('<4sHHHIB')
+    _tile_header = struct.Struct('<HHI')
+
+    def __init__(self, tile_codec=None, tile_size=128, threshold=1.0, key_frame_interval=120):
+        self._tile_codec = JpegCodec() if tile_codec is None else tile_codec
+        self._tile_size = tile_size
+        self._threshold = threshold
+        self._key_frame_interval = key_frame_interval
+        self._reference = None
+        self._diff = None
+        self._frames_since_key = 0
+        self._decoded = None
+        self.default_quality = self._tile_codec.default_quality
+
+    """
+    Find tiles that differ from the reference by more than the threshold (mean absolute difference)
+    return: boolean array of shape (tiles y, tiles x)
+    """
+    def changedTiles(self, image):
+        if self._diff is None or self._diff.shape != image.shape:
+            self._diff = np.empty_like(image)
+        cv2.absdiff(image, self._reference, dst=self._diff)
+        height, width, channels = image.shape
+        ys = np.arange(0, height, self._tile_size)
+        xs = np.arange(0, width, self._tile_size)
+        sums = np.empty((ys.size, xs.size), dtype=np.int64)
+        for i, y0 in enumerate(ys):
+            # sum each band of tile rows with cv2.reduce, then split the column sums into tiles
+            band = self._diff[y0:y0 + self._tile_size].reshape(-1, width * channels)
+            column_sums = cv2.reduce(band, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).reshape(width, channels).sum(axis=1)
+            sums[i] = np.add.reduceat(column_sums, xs)
+        counts = np.outer(np.diff(np.append(ys, height)), np.diff(np.append(xs, width))) * channels
+        return sums > self._threshold * counts
+
+    def encode(self, image, quality=None):
+        height, width = image.shape[:2]
+        key_frame = (self._reference is None or self._reference.shape != image.shape or
+                     self._frames_since_key >= self._key_frame_interval)
+        if key_frame:
+            self._reference = image.copy()
+            changed = np.ones(((height + self._tile_size - 1) // self._tile_size,
+                               (width + self._tile_size - 1) // self._tile_size), dtype=bool)
+            self._frames_since_key = 0
+        else:
+            changed = self.changedTiles(image)
+            self._frames_since_key += 1
+            if not changed.any():
+                return None
+
+        chunks = []
+        for ty, tx in zip(*np.nonzero(changed)):
+            y0, x0 = ty * self._tile_size, tx * self._tile_size
+            tile = image[y0:y0 + self._tile_size, x0:x0 + self._tile_size]
+            tile_data = self._tile_codec.encode(tile, quality)
+            if tile_data is None:
+                # client keeps its old tile -> retry with the next frame (a key frame already set the reference, so send another)
+                if key_frame:
+                    self._frames_since_key = self._key_frame_interval
+                continue
+            chunks.append(self._tile_header.pack(tx, ty, len(tile_data)))
+            chunks.append(tile_data)
+            # reference tracks what the client has, so slow drifts still add up to an update
+            self._reference[y0:y0 + self._tile_size, x0:x0 + self._tile_size] = tile
+        if not chunks and not key_frame:
+            return None
+        header = self._header.pack(b'ATDT', width, height, self._tile_size, len(chunks) // 2, key_frame)
+        return header + b''.join(chunks)
+
+    def decode(self, data):
+        magic, width, height, tile_size, num_tiles, key_frame = self._header.unpack_from(data, 0)
+        if self._decoded is None or self._decoded.shape[:2] != (height, width):
+            self._decoded = np.zeros((height, width, 3), dtype=np.uint8)
+        offset = self._header.size
+        for i in range(num_tiles):
+            tx, ty, size = self._tile_header.unpack_from(data, offset)
+            offset += self._tile_header.size
+            tile = self._tile_codec.decode(data[offset:offset + size])
+            offset += size
+            y0, x0 = ty * tile_size, tx * tile_size
+            self._decoded[y0:y0 + tile.shape[0], x0:x0 + tile.shape[1]] = tile
+        return self._decoded
+
+# codecs of the RCA stream (browsers display every encoded frame as is)
+CODECS = {codec.name: codec for codec in (JpegCodec, WebpCodec, PngCodec)}
+# codecs compared by benchmark_codecs.py
+BENCHMARK_CODECS = dict(CODECS, **{TileDeltaCodec.name: TileDeltaCodec})
+
+"""
+Create stream codec by name ('jpeg', 'webp' or 'png')
+return: FrameCodec
+"""
+def createCodec(name):
+    return CODECS[name]()
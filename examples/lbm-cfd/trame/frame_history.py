@@ -0,0 +1,70 @@
+from collections import deque
+import numpy as np
+
+# Bounded history of recent frames kept as quantized colormap indices (1 byte per cell) and barriers
+#
+# Frames are numbered with consecutive sequence numbers. Once the memory budget is exceeded the oldest
+# frames are evicted and their buffers are reused for new frames of the same size.
+class FrameHistory:
+    def __init__(self, budget_bytes):
+        self._budget = budget_bytes
+        self._frames = deque()
+        self._free = []
+        self._first_seq = 0
+        self._nbytes = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    """
+    return: bytes used by stored frames
+    """
+    def getSize(self):
+        return self._nbytes
+
+    """
+    return: sequence numbers of the oldest and newest stored frame (None if empty)
+    """
+    def getRange(self):
+        if not self._frames:
+            return None
+        return (self._first_seq, self._first_seq + len(self._frames) - 1)
+
+    """
+    Copy frame into the history, evicting the oldest frames to stay within the budget
+    return: sequence number of the frame (None if a single frame exceeds the budget)
+    """
+    def append(self, index, barriers, frame_time, grid=(0, 0, 1)):
+        nbytes = index.nbytes + barriers.nbytes
+        if nbytes > self._budget:
+            return None
+        while self._frames and self._nbytes + nbytes > self._budget:
+            self._evict()
+
+        buffer = self._takeBuffer(index.shape)
+        np.copyto(buffer, index)
+        self._frames.append({'index': buffer, 'barriers': barriers.copy(), 'time': frame_time, 'grid': grid})
+        self._nbytes += nbytes
+        return self._first_seq + len(self._frames) - 1
+
+    """
+    return: frame (dict with 'index', 'barriers', 'time' and 'grid') or None if it has been evicted
+    """
+    def get(self, seq):
+        position = seq - self._first_seq
+        if position < 0 or position >= len(self._frames):
+            return None
+        return self._frames[position]
+
+    def _evict(self):
+        frame = self._frames.popleft()
+        self._first_seq += 1
+        self._nbytes -= frame['index'].nbytes + frame['barriers'].nbytes
+        # keep one spare buffer around, the next frame most likely has the same size
+        self._free = [frame['index']]
+
+    def _takeBuffer(self, shape):
+        if self._free and self._free[0].shape == shape:
+            return self._free.pop()
+        self._free = []
+        return np.empty(shape, dtype=np.uint8)
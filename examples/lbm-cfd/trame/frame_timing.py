@@ -0,0 +1,103 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# stages of a frame from the simulation to the browser (in display order)
+#   connect .. steering wait: Ascent bridge (rank 0), transfer: bridge -> viewer event loop,
+#   ingest: waiting for the frame loop, colormap .. push: viewer, total: bridge send -> push
+STAGES = ('connect', 'stats', 'gather', 'pack', 'send', 'steering wait', 'transfer', 'ingest',
+          'colormap', 'barriers', 'encode', 'push', 'total')
+
+# layout of the 'timing' array sent along with frames by the Ascent bridge (durations in ms, < 0: not measured)
+# send/steering wait are only known after a frame was sent -> they travel with the next frame (tagged prev_step)
+BRIDGE_TIMING = ('sent', 'connect', 'stats', 'gather', 'pack', 'prev_step', 'send', 'steering wait')
+
+# Rolling per-stage timings of frames, tagged with the simulation step they belong to
+#
+# Only the most recent `window` spans per stage are kept for percentiles. With a log file every span is also
+# written as a JSON line ({"seq": step, "stage": name, "ms": duration, "t": end time}). Not thread safe, spans
+# are recorded on the event loop thread.
+class FrameTimings:
+    def __init__(self, window=256, log_path=None):
+        self._spans = {stage: deque(maxlen=window) for stage in STAGES}
+        self._log = open(log_path, 'a', buffering=1) if log_path is not None else None
+        self.current_seq = -1
+        self._current_sent = None
+        self._delivered = True
+
+    """
+    Start timing a new frame (spans without explicit seq are tagged with it)
+    sent: wall clock time the bridge sent the frame (None if unknown)
+    return: None
+    """
+    def begin(self, seq, sent=None):
+        self.current_seq = seq
+        self._current_sent = sent
+        self._delivered = False
+
+    """
+    Record the total time of a frame when it is pushed to the clients for the first time
+    return: None
+    """
+    def recordDelivered(self, seq):
+        if seq == self.current_seq and not self._delivered and self._current_sent is not None:
+            self._delivered = True
+            self.record('total', (time.time() - self._current_sent) * 1000.0, seq)
+
+    """
+    Add a span of stage
+    return: None
+    """
+    def record(self, stage, ms, seq=None):
+        seq = self.current_seq if seq is None else seq
+        self._spans[stage].append(ms)
+        if self._log is not None:
+            self._log.write(json.dumps({'seq': int(seq), 'stage': stage, 'ms': round(ms, 3), 't': time.time()}) + '\n')
+
+    """
+    Time the body of a with statement as stage
+    return: context manager
+    """
+    @contextmanager
+    def span(self, stage, seq=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000.0, seq)
+
+    """
+    Add the spans measured by the Ascent bridge and the transfer to the viewer
+    return: None
+    """
+    def recordBridge(self, timing, seq, received=None):
+        timing = dict(zip(BRIDGE_TIMING, (float(v) for v in timing)))
+        for stage in ('connect', 'stats', 'gather', 'pack'):
+            if timing[stage] >= 0:
+                self.record(stage, timing[stage], seq)
+        for stage in ('send', 'steering wait'):
+            if timing[stage] >= 0:
+                self.record(stage, timing[stage], int(timing['prev_step']))
+        # wall clock difference (simulation rank 0 and viewer usually run on the same node)
+        if received is not None:
+            self.record('transfer', (received - timing['sent']) * 1000.0, seq)
+
+    """
+    return: list of {'stage', 'count', 'mean', 'p50', 'p90', 'p99'} (ms) for stages with spans
+    """
+    def getSummary(self):
+        summary = []
+        for stage in STAGES:
+            spans = self._spans[stage]
+            if spans:
+                spans = np.fromiter(spans, dtype=np.float64, count=len(spans))
+                p50, p90, p99 = (round(float(v), 2) for v in np.percentile(spans, (50, 90, 99)))
+                summary.append({'stage': stage, 'count': len(spans), 'mean': round(float(spans.mean()), 2), 'p50': p50, 'p90': p90, 'p99': p99})
+        return summary
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -1,102 +1,514 @@
+import argparse
 import asyncio
 import time
+import zlib
 import numpy as np
 import cv2
-from multiprocessing import Process, Queue
-from multiprocessing.managers import BaseManager
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
 from trame.app import get_server, asynchronous
 from trame.widgets import vuetify, rca, client
 from trame.ui.vuetify import SinglePageLayout
+from frame_codecs import createCodec, CODECS
+from frame_history import FrameHistory
+from frame_archive import FrameArchiveReader, FrameArchiveWriter
+from barrier_store import BarrierStore
+from frame_timing import FrameTimings
+from bridge_server import BridgeServer
+# on the path through bridge_server (shared with the Ascent bridge)
+from bridge_transport import COMPRESSIONS
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# values mapped to the ends of the colormap
+DEFAULT_VALUE_RANGE = (-0.22, 0.22)
+# fixed colormap range per field (fields not listed here are shown over their current min/max)
+FIELD_VALUE_RANGES = {'vorticity': DEFAULT_VALUE_RANGE}
+# flow speed slider (m/s) unless the simulation reports its speed and the highest one it accepts
+DEFAULT_FLOW_SPEED = 0.75
+DEFAULT_FLOW_SPEED_RANGE = (0.25, 1.50)
+
+# Lease that lets one client at a time steer (draw barriers, change flow speed, submit)
+class SteeringLock:
+    def __init__(self, timeout=60.0):
+        self._timeout = timeout
+        self._last_activity = 0.0
+        self.owner = None
+
+    """
+    Take the lease if it is free, already held by the client or the owner has been idle too long
+    return: whether client holds the lease
+    """
+    def acquire(self, client_id):
+        if not client_id:
+            return False
+        if self.owner is None or time.monotonic() - self._last_activity > self._timeout:
+            self.owner = client_id
+        return self.isOwner(client_id)
+
+    """
+    Give up the lease (only the owner can release it)
+    return: None
+    """
+    def release(self, client_id):
+        if self.isOwner(client_id):
+            self.owner = None
+
+    """
+    Check whether client holds the lease (and count the check as activity of the owner)
+    return: True if client is the owner
+    """
+    def isOwner(self, client_id):
+        if client_id and client_id == self.owner:
+            self._last_activity = time.monotonic()
+            return True
+        return False
+
+# Reads frames written to shared memory by the Ascent bridge
+#
+# The bridge keeps writing into its ring while frames are read, so arrays are copied out of the slot and the
+# sequence number of the slot is checked again afterwards (no views into the segment outlive resolve).
+class SharedFrameReader:
+    def __init__(self):
+        self._segments = {}
+        self._attached = False
+        self._missing = set()
+
+    def _attach(self, name):
+        if name not in self._segments:
+            # the bridge owns the segment -> do not let the resource tracker unlink it when Trame exits
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                self._segments[name] = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                # the bridge unlinks a segment when it grows the ring, descriptors still on their way name the old one
+                # (frames only grow on viewer requests, so before the first attach a segment missing again was never there)
+                if self._attached or name not in self._missing:
+                    self._missing.add(name)
+                    return None
+                raise
+            finally:
+                resource_tracker.register = register
+            self._attached = True
+            # release segments the bridge has replaced
+            for old_name in [n for n in self._segments if n != name]:
+                self._segments.pop(old_name).close()
+        return self._segments[name]
+
+    """
+    Resolve frame descriptor into frame data (raises OSError if the segment can never be attached, e.g. remote bridge)
+    return: dict of arrays, or None if the slot has been overwritten or the segment replaced by a newer one
+    """
+    def resolve(self, descriptor):
+        shm = self._attach(descriptor['name'])
+        if shm is None:
+            return None
+        seq = descriptor['seq']
+        header = np.frombuffer(shm.buf, dtype=np.uint64, count=2, offset=descriptor['header'])
+        if header[0] != seq or header[1] != seq:
+            return None
+        frame = {}
+        for name, (offset, shape, dtype) in descriptor['arrays'].items():
+            count = int(np.prod(shape))
+            frame[name] = np.frombuffer(shm.buf, dtype=np.dtype(dtype), count=count, offset=offset).reshape(shape).copy()
+        # the bridge bumps the sequence number at the start of every write -> a changed one means torn copies
+        overwritten = header[0] != seq
+        del header
+        return None if overwritten else frame
+
+"""
+Decompress a field packed by the Ascent bridge (quantized fields stay quantized, see AscentView.quantize)
+return: None (frame is updated in place)
+"""
+def unpackField(frame, name):
+    if 'compression' not in frame:
+        return
+    compression = COMPRESSIONS[int(frame.pop('compression'))]
+    shape = tuple(int(n) for n in frame.pop('field_shape'))
+    dtype = np.dtype(f'u{int(frame.pop("field_itemsize"))}')
+    if compression == 'lz4':
+        data = lz4.frame.decompress(frame[name])
+    else:
+        data = zlib.decompress(frame[name])
+    frame[name] = np.frombuffer(data, dtype=dtype).reshape(shape)
+
+"""
+CSS of the view area: as wide as the page and in the aspect ratio of the frame, at most 80% of the window high
+(streamed frames follow the area size each client reports, up to the resolution of its stream tier)
+return: style string
+"""
+def viewAreaStyle(width, height):
+    return (f'width: 100%; max-width: calc(80vh * {width} / {height}); aspect-ratio: {width} / {height}; '
+            'border: solid 2px #000000; box-sizing: content-box;')
+
+"""
+Pick the color range from the field statistics reduced by the Ascent bridge
+mode: 'fixed' (FIELD_VALUE_RANGES), 'minmax' or 'percentile' (1st to 99th percentile of the histogram)
+return: (min, max) of the colormap
+"""
+def colorRangeFromStatistics(frame, mode):
+    field = str(frame.get('field', 'vorticity'))
+    if mode == 'fixed' and field in FIELD_VALUE_RANGES:
+        return FIELD_VALUE_RANGES[field]
+    if 'stats' not in frame:
+        if field in FIELD_VALUE_RANGES:
+            return FIELD_VALUE_RANGES[field]
+        # e.g. replayed frames -> only the (already gathered) values are at hand
+        value_min, value_max = float(frame[field].min()), float(frame[field].max())
+    elif mode != 'percentile':
+        value_min, value_max = float(frame['stats'][0]), float(frame['stats'][1])
+    else:
+        # invert the cumulative histogram, interpolating linearly inside a bin
+        histogram = np.asarray(frame['histogram'], dtype=np.float64)
+        hist_min, hist_max = (float(v) for v in frame['histogram_range'])
+        cdf = np.cumsum(histogram)
+        if cdf[-1] <= 0:
+            return DEFAULT_VALUE_RANGE
+        edges = np.linspace(hist_min, hist_max, histogram.size + 1)
+        value_min, value_max = np.interp(np.array([0.01, 0.99]) * cdf[-1], np.concatenate(([0.0], cdf)), edges)
+    if not value_max > value_min:
+        # constant field
+        return DEFAULT_VALUE_RANGE
+    return (float(value_min), float(value_max))
+
+# Hands frames read from the bridge connection (or an archive) to the frame loop, both run on the event loop
+class FrameIngestor:
+    def __init__(self):
+        self._latest = None
+        self._num_pending = 0
+        self._frame_ready = asyncio.Event()
+        self.frames_dropped = 0
+        self.frames_coalesced = 0
+
+    """
+    Hand over a frame (replaces a frame that has not been picked up yet)
+    return: None
+    """
+    def put(self, frame):
+        self._latest = frame
+        self._num_pending += 1
+        self._frame_ready.set()
+
+    """
+    Wait for next frame (bursts are coalesced, only the newest frame is returned)
+    return: frame data
+    """
+    async def nextFrame(self):
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            frame, num_pending = self._latest, self._num_pending
+            self._latest, self._num_pending = None, 0
+            if frame is not None:
+                if num_pending > 1:
+                    self.frames_coalesced += 1
+                    self.frames_dropped += num_pending - 1
+                return frame
+
+"""
+Add the options sent to the Ascent bridge to an argument parser (shared with benchmark_pipeline.py)
+return: None
+"""
+def addSessionArguments(parser):
+    parser.add_argument('--steering-mode', choices=['sync', 'async'], default='sync',
+                        help='sync: simulation waits for the viewer every step, '
+                             'async: simulation never waits and picks up the latest steering update')
+    parser.add_argument('--transport', choices=['socket', 'shm'], default='socket',
+                        help='socket: frames are sent over the bridge connection, '
+                             'shm: frames are written to shared memory and only a descriptor is sent '
+                             '(only used if the bridge runs on the same host, socket otherwise)')
+    parser.add_argument('--shm-slots', type=int, default=3,
+                        help='number of frames the shared memory ring holds')
+    parser.add_argument('--sample-every', type=int, default=1,
+                        help='only send every n-th output step of the simulation to the viewer')
+    parser.add_argument('--sample-on-demand', action='store_true',
+                        help='only send output steps while a viewer is connected and showing live frames')
+    parser.add_argument('--lod-width', type=int, default=0,
+                        help='reduce the field on each simulation rank to about this width before gathering (0: full field)')
+    parser.add_argument('--lod-method', choices=['mean', 'minmax'], default='mean',
+                        help='mean: block average, minmax: keep the larger extreme of each block')
+    parser.add_argument('--payload', choices=['float', 'uint8', 'uint16'], default='float',
+                        help='float: send field as is, uint8/uint16: clip and quantize in the simulation before sending')
+    parser.add_argument('--payload-compression', choices=list(COMPRESSIONS), default='none',
+                        help='compress quantized fields (lz4 needs the lz4 package, zlib is used otherwise)')
+
+"""
+return: options shared with the Ascent bridge (sent when it connects)
+"""
+def getSessionOptions(args):
+    return {
+        'steering_mode': args.steering_mode,
+        'transport': args.transport,
+        'shm_slots': args.shm_slots,
+        'sample_every': args.sample_every,
+        'sample_on_demand': args.sample_on_demand,
+        'lod_width': args.lod_width,
+        'lod_method': args.lod_method,
+        'payload': args.payload,
+        'compression': args.payload_compression,
+        'value_ranges': FIELD_VALUE_RANGES
+    }
 
-class QueueManager(BaseManager):
-    pass
-    
 def main():
-    # create queues for Trame state and updates
-    state_queue = Queue()
-    update_queue = Queue()
-    
-    # start Trame app in new thread
-    trame_thread = Process(target=runTrameServer, args=(state_queue, update_queue))
-    trame_thread.daemon = True
-    trame_thread.start()
-
-    # create queues from Ascent data
-    queue_data = Queue()
-    queue_signal = Queue()
-
-    # start Queue Manager in new thread
-    queue_mgr_thread = Process(target=runQueueManager, args=(queue_data, queue_signal))
-    queue_mgr_thread.daemon = True
-    queue_mgr_thread.start()
-   
-    # wait for data coming from Ascent 
-    data = None
-    while data != '':
-        print('waiting on data... ', end='')
-        sim_data = queue_data.get()
-        print(f'received!')
-        
-        state_queue.put(sim_data)
-        updates = update_queue.get()
-
-        queue_signal.put(updates)
-
-def runTrameServer(state_queue, update_queue):
+    # parse Ascent-Trame options (remaining arguments are handled by Trame)
+    parser = argparse.ArgumentParser(add_help=False)
+    addSessionArguments(parser)
+    parser.add_argument('--bridge-address', default='127.0.0.1:8000',
+                        help='host:port or Unix socket path the Ascent bridge connects to (set ASCENT_TRAME_ADDRESS '
+                             'for the simulation, the shared key is read from ASCENT_TRAME_AUTHKEY)')
+    parser.add_argument('--codec', choices=list(CODECS), default='jpeg',
+                        help='initial image codec of the stream (can be changed in the UI)')
+    parser.add_argument('--history-mb', type=float, default=256,
+                        help='memory budget of the frame history in MiB (oldest frames are evicted)')
+    parser.add_argument('--archive', metavar='DIR',
+                        help='append every received frame to a frame archive in this directory')
+    parser.add_argument('--replay', metavar='DIR',
+                        help='replay a frame archive instead of connecting to a simulation')
+    parser.add_argument('--replay-rate', type=float, default=10,
+                        help='frames per second when replaying an archive')
+    parser.add_argument('--timing-log', metavar='FILE',
+                        help='append the timing of every frame stage to this file (JSON lines)')
+    args, _ = parser.parse_known_args()
+    if args.archive is not None and args.replay is not None:
+        parser.error('--archive and --replay cannot be combined')
+    session_options = getSessionOptions(args)
+
+    # Trame event loop accepts the bridge connection itself (no queue manager or relay process)
+    runTrameServer(session_options, args.codec, args.history_mb, args.archive, args.timing_log,
+                   args.bridge_address, args.replay, args.replay_rate)
+
+def runTrameServer(session_options, codec, history_mb, archive_dir, timing_log=None, bridge_address='127.0.0.1:8000',
+                   replay_dir=None, replay_rate=10):
+    steering_mode = session_options['steering_mode']
+
+    # rolling timings of all frame stages (optionally logged)
+    timings = FrameTimings(log_path=timing_log)
+
     # create Ascent View
-    view = AscentView()
+    view = AscentView(timings)
+
+    # image encoding runs on worker threads (cv2 releases the GIL) to keep the event loop responsive
+    encoder_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='frame-encoder')
+
+    # only one client at a time may steer
+    steering_lock = SteeringLock()
+
+    # recent frames for scrubbing and playback
+    history = FrameHistory(int(history_mb * 1024 * 1024))
+
+    # optional on-disk archive of all received frames
+    archive = FrameArchiveWriter(archive_dir) if archive_dir is not None else None
+
+    # frames from the simulation (or replayed from an archive) are read on the event loop
+    frame_ingestor = FrameIngestor()
+    bridge = BridgeServer(bridge_address, session_options, frame_ingestor.put) if replay_dir is None else None
 
     # set up Trame application
     server = get_server(client_type="vue2")
     state = server.state
     ctrl = server.controller
 
-    # register RCA view with Trame controller
-    view_handler = None
+    # register one RCA view per stream tier with Trame controller
+    # regions of interest go to the simulation with the other view settings
+    def requestRoi(roi):
+        sendViewSettings({'roi': roi})
+
+    def sendSteering(update):
+        if bridge is not None:
+            bridge.sendSteering(update)
+
+    # view settings never count as the reply a sync simulation waits for
+    def sendViewSettings(settings):
+        if bridge is not None:
+            bridge.sendViewSettings(settings)
+
+    # shared memory of the bridge cannot be attached -> frames go over the connection from now on
+    def useSocketTransport():
+        if bridge is not None:
+            bridge.updateSessionOptions({'transport': 'socket'})
+
+    broadcaster = FrameBroadcaster(view, encoder_pool, steering_lock, codec, requestRoi, timings)
     @ctrl.add("on_server_ready")
     def initRca(**kwargs):
-        nonlocal view_handler
-        view_handler = RcaViewAdapter(view, 'view')
-        ctrl.rc_area_register(view_handler)
+        for view_handler in broadcaster.getAdapters():
+            ctrl.rc_area_register(view_handler)
     
-        asynchronous.create_task(checkForStateUpdates(state, state_queue, update_queue, view, view_handler))
+        asynchronous.create_task(checkForStateUpdates(state, frame_ingestor, sendSteering, useSocketTransport, view, broadcaster,
+                                                      history, archive, steering_mode))
+        if bridge is not None:
+            asynchronous.create_task(bridge.start())
+        else:
+            # no simulation attached -> stream archived frames, then keep serving the viewer
+            asynchronous.create_task(replayArchive(replay_dir, frame_ingestor, replay_rate))
+
+    # frames are wanted while at least one client is connected and showing live frames
+    num_clients = 0
+    def updateFrameDemand():
+        if bridge is not None:
+            bridge.setDemand(num_clients > 0 and state.history_live)
+
+    @ctrl.add("on_client_connected")
+    def clientConnected(**kwargs):
+        nonlocal num_clients
+        num_clients += 1
+        updateFrameDemand()
+
+    # called from the page's exit trigger (with its id, unlike on_client_exited) -> its streams and lease are dropped
+    def clientExited(client_id):
+        nonlocal num_clients
+        num_clients = max(0, num_clients - 1)
+        updateFrameDemand()
+        broadcaster.removeClient(client_id)
+        steering_lock.release(client_id)
+        state.steering_owner = steering_lock.owner or ''
 
     # callback for steering enabled change
     def uiStateEnableSteeringUpdate(enable_steering, **kwargs):
         if state.connected:
             state.allow_submit = enable_steering
-        if not enable_steering:
-            update_queue.put({})
+        if not enable_steering and steering_mode == 'sync':
+            sendSteering({})
 
     # callback for color map change
     def uiStateColorMapUpdate(color_map, **kwargs):
         view.setColormap(color_map.lower())
-        if view_handler is not None:
-            view_handler.pushFrame()
+        broadcaster.pushFrame()
 
-    #
-    def clearBarriers():
+    # callback for stream codec change
+    def uiStateCodecUpdate(codec, **kwargs):
+        broadcaster.setCodec(codec)
+        broadcaster.pushFrame()
+
+    # callbacks for frame history (scrubbing, going back to live frames and playback)
+    def showHistoryFrame(seq):
+        frame = history.get(seq)
+        if frame is not None:
+            view.showFrame(frame['index'], frame['barriers'], frame['grid'])
+            broadcaster.pushFrame()
+
+    def uiStateHistoryPositionUpdate(history_position, **kwargs):
+        if not state.history_live:
+            showHistoryFrame(history_position)
+
+    def uiStateHistoryLiveUpdate(history_live, **kwargs):
+        updateFrameDemand()
+        if history_live:
+            state.history_playing = False
+            state.history_position = state.history_last
+            showHistoryFrame(state.history_last)
+
+    def uiStateHistoryPlayingUpdate(history_playing, **kwargs):
+        if history_playing:
+            state.history_live = False
+            asynchronous.create_task(playHistory())
+
+    async def playHistory():
+        # frames are served from the history only, the simulation is not involved
+        while state.history_playing and not state.history_live:
+            seq_range = history.getRange()
+            if seq_range is None or state.history_position >= seq_range[1]:
+                state.history_playing = False
+            else:
+                state.history_position = max(state.history_position + 1, seq_range[0])
+            state.flush()
+            await asyncio.sleep(1.0 / state.history_rate)
+
+    # callbacks for taking and releasing control over steering
+    def requestSteering(client_id):
+        steering_lock.acquire(client_id)
+        state.steering_owner = steering_lock.owner or ''
+
+    def releaseSteering(client_id):
+        steering_lock.release(client_id)
+        state.steering_owner = steering_lock.owner or ''
+
+    # callback for field selection (the simulation sends the new field from its next step on)
+    def uiStateFieldNameUpdate(field_name, **kwargs):
+        if field_name != state.sim_field:
+            sendViewSettings({'field': field_name})
+
+    # callback for slice plane selection (3D runs, the simulation extracts the new plane from its next step on)
+    def uiStateSliceUpdate(slice_axis, slice_index, **kwargs):
+        if not state.volume_dims:
+            return
+        index = min(max(int(slice_index), 0), state.volume_dims['xyz'.index(slice_axis)] - 1)
+        if [slice_axis, index] != state.sim_slice:
+            sendViewSettings({'slice': [slice_axis, index]})
+
+    # callback for interaction mode change (barrier / zoom / pan / edit)
+    def uiStateInteractionModeUpdate(interaction_mode, **kwargs):
+        view.setInteractionMode(interaction_mode)
+
+    # callback for going back to the whole domain
+    def resetZoom(client_id):
+        if steering_lock.isOwner(client_id):
+            requestRoi(None)
+
+    # callbacks for editing barriers
+    def clearBarriers(client_id):
+        if not steering_lock.isOwner(client_id):
+            return
         view.clearBarriers()
-        if view_handler is not None:
-            view_handler.pushFrame()
+        broadcaster.pushFrame()
+
+    def deleteBarrier(client_id):
+        if steering_lock.isOwner(client_id) and view.deleteSelectedBarrier():
+            broadcaster.pushFrame()
 
     # callback for clicking submit button
-    def submitSteeringOptions():
+    def submitSteeringOptions(client_id):
+        if not steering_lock.isOwner(client_id):
+            return
         steering_data = {
-            'flow_speed': state.flow_speed,
-            'barriers': view.getBarriers()
+            'flow_speed': min(max(state.flow_speed, state.flow_speed_range[0]), state.flow_speed_range[1]),
+            'barriers': view.submitBarriers()
         }
-        update_queue.put(steering_data)
+        sendSteering(steering_data)
 
     # register callbacks
     state.change('enable_steering')(uiStateEnableSteeringUpdate)    
     state.change('color_map')(uiStateColorMapUpdate)
+    state.change('codec')(uiStateCodecUpdate)
+    state.change('field_name')(uiStateFieldNameUpdate)
+    state.change('slice_axis', 'slice_index')(uiStateSliceUpdate)
+    state.change('interaction_mode')(uiStateInteractionModeUpdate)
+    state.change('history_position')(uiStateHistoryPositionUpdate)
+    state.change('history_live')(uiStateHistoryLiveUpdate)
+    state.change('history_playing')(uiStateHistoryPlayingUpdate)
 
     # define webpage layout
     state.allow_submit = False
-    state.vis_style = 'width: 800px; height: 600px; border: solid 2px #000000; box-sizing: content-box;'
+    state.codec = codec
+    state.frames_dropped = 0
+    state.frames_coalesced = 0
+    state.steering_owner = ''
+    state.history_first = 0
+    state.history_last = 0
+    state.history_mb = 0
+    state.sim_step = -1
+    state.sim_field = 'vorticity'
+    state.field_names = ['vorticity']
+    # 3D runs only: global cell dims (x, y, z) and slice plane shown by the simulation (axis, index)
+    state.volume_dims = []
+    state.sim_slice = []
+    # inlet speed the simulation reported last (None: it does not report one)
+    state.sim_flow_speed = None
+    state.flow_speed_range = list(DEFAULT_FLOW_SPEED_RANGE)
+    state.field_stats = None
+    state.timing_rows = []
+    state.field_histogram = []
+    state.color_range = list(DEFAULT_VALUE_RANGE)
+    # identity and stream tier are picked by each browser on its own
+    state.client_only('client_id', 'stream_tier')
+    state.client_id = ''
+    state.stream_tier = 'view-medium'
+    state.vis_style = viewAreaStyle(4, 3)
     with SinglePageLayout(server) as layout:
         client.Style('#rca-view div div img { width: 100%; height: auto; }')
+        client.ClientTriggers(mounted='client_id = Math.random().toString(36).slice(2)', exit=(clientExited, '[client_id]'))
         layout.title.set_text('Ascent-Trame')
         with layout.toolbar:
             vuetify.VDivider(vertical=True, classes="mx-2")
@@ -107,12 +519,26 @@ def runTrameServer(state_queue, update_queue):
                 dense=True
             )
             vuetify.VSpacer()
+            vuetify.VBtn(
+                'Take Control',
+                v_if=('steering_owner !== client_id',),
+                click=(requestSteering, '[client_id]'),
+                small=True
+            )
+            vuetify.VBtn(
+                'Release Control',
+                v_if=('steering_owner === client_id',),
+                click=(releaseSteering, '[client_id]'),
+                small=True
+            )
+            vuetify.VSpacer()
             vuetify.VSlider(
                 label='Flow speed',
-                v_model=('flow_speed', 0.75),
-                min=0.25,
-                max=1.50,
+                v_model=('flow_speed', DEFAULT_FLOW_SPEED),
+                min=('flow_speed_range[0]',),
+                max=('flow_speed_range[1]',),
                 step=0.05,
+                disabled=('steering_owner !== client_id',),
                 hide_details=True,
                 dense=True
             )
@@ -128,68 +554,419 @@ def runTrameServer(state_queue, update_queue):
                 dense=True
             )
             vuetify.VSpacer()
+            vuetify.VSelect(
+                label='Field',
+                v_model=('field_name', 'vorticity'),
+                items=('field_names',),
+                disabled=('steering_owner !== client_id',),
+                hide_details=True,
+                dense=True
+            )
+            vuetify.VSpacer()
+            # slice plane of a 3D run (the index is sent when the slider is released)
+            vuetify.VSelect(
+                label='Slice',
+                v_if=('volume_dims.length',),
+                v_model=('slice_axis', 'z'),
+                items=('slice_axes', [{'text': f'{axis.upper()} plane', 'value': axis} for axis in 'xyz']),
+                disabled=('steering_owner !== client_id',),
+                style='max-width: 100px;',
+                hide_details=True,
+                dense=True
+            )
+            vuetify.VSlider(
+                v_if=('volume_dims.length',),
+                value=('slice_index', 0),
+                change='slice_index = $event',
+                min=0,
+                max=('volume_dims["xyz".indexOf(slice_axis)] - 1',),
+                disabled=('steering_owner !== client_id',),
+                hide_details=True,
+                dense=True
+            )
+            vuetify.VCol(
+                '{{sim_slice[0]}} = {{sim_slice[1]}}',
+                v_if=('volume_dims.length',),
+                classes='text-caption'
+            )
+            vuetify.VSpacer()
+            vuetify.VSelect(
+                label='Color Range',
+                v_model=('color_range_mode', 'fixed'),
+                items=('color_range_modes', [{'text': 'Fixed', 'value': 'fixed'}, {'text': 'Min-Max', 'value': 'minmax'},
+                                             {'text': 'Percentile (1-99%)', 'value': 'percentile'}]),
+                hide_details=True,
+                dense=True
+            )
+            vuetify.VSpacer()
+            vuetify.VSelect(
+                label='Encoding',
+                v_model=('codec',),
+                items=('codecs', [{'text': name.upper(), 'value': name} for name in CODECS]),
+                hide_details=True,
+                dense=True
+            )
+            vuetify.VSpacer()
+            vuetify.VSelect(
+                label='Stream',
+                v_model=('stream_tier',),
+                items=('stream_tiers', [{'text': name.capitalize(), 'value': f'view-{name}'} for name in STREAM_TIERS]),
+                hide_details=True,
+                dense=True
+            )
+            vuetify.VSpacer()
+            vuetify.VCol(
+                '{{sim_field}} step: {{sim_step}}, dropped: {{frames_dropped}}, coalesced: {{frames_coalesced}}',
+                classes='text-caption'
+            )
+            vuetify.VSpacer()
+            with vuetify.VBtnToggle(v_model=('interaction_mode', 'barrier'), mandatory=True, dense=True):
+                vuetify.VBtn('Barrier', value='barrier', small=True, disabled=('steering_owner !== client_id || volume_dims.length',))
+                vuetify.VBtn('Zoom', value='zoom', small=True, disabled=('steering_owner !== client_id',))
+                vuetify.VBtn('Pan', value='pan', small=True, disabled=('steering_owner !== client_id',))
+                vuetify.VBtn('Edit', value='edit', small=True, disabled=('steering_owner !== client_id || volume_dims.length',))
+            vuetify.VBtn(
+                'Reset Zoom',
+                disabled=('steering_owner !== client_id',),
+                click=(resetZoom, '[client_id]'),
+                classes='ml-2',
+                small=True
+            )
+            vuetify.VSpacer()
+            vuetify.VBtn(
+                'Delete Barrier',
+                disabled=('steering_owner !== client_id || interaction_mode !== "edit"',),
+                click=(deleteBarrier, '[client_id]'),
+                classes='mr-2',
+                small=True
+            )
             vuetify.VBtn(
                 'Clear Barriers',
                 color='secondary',
-                click=clearBarriers
+                disabled=('steering_owner !== client_id || volume_dims.length',),
+                click=(clearBarriers, '[client_id]')
             )
             vuetify.VSpacer()
             vuetify.VBtn(
                 'Submit',
                 color='primary',
-                disabled=('!allow_submit',),
-                click=submitSteeringOptions
+                disabled=('!allow_submit || !history_live || steering_owner !== client_id',),
+                click=(submitSteeringOptions, '[client_id]')
             )
         with layout.content:
             with vuetify.VContainer(fluid=True, classes='pa-0 fill-height', style='justify-content: center; align-items: start;'):
-                v = rca.RemoteControlledArea(name='view', display='image', id='rca-view', style=('vis_style',))
+                v = rca.RemoteControlledArea(name=('stream_tier',), origin=('client_id',), display='image', id='rca-view', style=('vis_style',))
+            # timeline of the frame history
+            with vuetify.VRow(classes='px-4', align='center', dense=True):
+                vuetify.VSwitch(
+                    label='Live',
+                    v_model=('history_live', True),
+                    hide_details=True,
+                    dense=True
+                )
+                vuetify.VBtn(
+                    '{{history_playing ? "Pause" : "Play"}}',
+                    click='history_playing = !history_playing',
+                    classes='mx-2',
+                    small=True
+                )
+                vuetify.VSelect(
+                    label='Rate (fps)',
+                    v_model=('history_rate', 10),
+                    items=('[1, 5, 10, 30]',),
+                    style='max-width: 100px;',
+                    hide_details=True,
+                    dense=True
+                )
+                vuetify.VSlider(
+                    v_model=('history_position', 0),
+                    min=('history_first',),
+                    max=('history_last',),
+                    disabled=('history_live',),
+                    classes='mx-2',
+                    hide_details=True,
+                    dense=True
+                )
+                vuetify.VCol(
+                    '{{history_last - history_first + 1}} frames, {{history_mb.toFixed(1)}} MiB',
+                    classes='text-caption'
+                )
+                vuetify.VSwitch(
+                    label='Timings',
+                    v_model=('show_timings', False),
+                    hide_details=True,
+                    dense=True
+                )
+            # percentiles of the time frames spend in each stage
+            with vuetify.VRow(classes='px-4', dense=True, v_if=('show_timings',)):
+                vuetify.VDataTable(
+                    headers=('timing_headers', [{'text': 'Stage', 'value': 'stage'}, {'text': 'Frames', 'value': 'count'},
+                                                {'text': 'p50 (ms)', 'value': 'p50'}, {'text': 'p90 (ms)', 'value': 'p90'},
+                                                {'text': 'p99 (ms)', 'value': 'p99'}]),
+                    items=('timing_rows',),
+                    disable_pagination=True,
+                    hide_default_footer=True,
+                    disable_sort=True,
+                    dense=True,
+                    style='max-width: 600px;'
+                )
+            # histogram and statistics of the field (whole domain or region of interest)
+            with vuetify.VRow(classes='px-4', align='center', dense=True, v_if=('field_stats',)):
+                vuetify.VSparkline(
+                    value=('field_histogram',),
+                    type='bar',
+                    auto_line_width=True,
+                    height=40,
+                    padding=0,
+                    style='max-width: 400px;'
+                )
+                vuetify.VCol(
+                    'min: {{field_stats.min.toFixed(4)}}, max: {{field_stats.max.toFixed(4)}}, '
+                    'mean: {{field_stats.mean.toFixed(4)}}, cells: {{field_stats.count}}, '
+                    'color range: [{{color_range[0].toFixed(4)}}, {{color_range[1].toFixed(4)}}]',
+                    classes='text-caption'
+                )
 
-    # start Trame server
-    server.start()
+    # start Trame server (frames still queued for the archive are written and the timing log is closed when it stops)
+    try:
+        server.start()
+    finally:
+        if archive is not None:
+            archive.close()
+        timings.close()
 
-async def checkForStateUpdates(state, state_queue, update_queue, view, view_handler):
+async def checkForStateUpdates(state, frame_ingestor, sendSteering, useSocketTransport, view, broadcaster, history, archive,
+                               steering_mode):
+    frame_reader = SharedFrameReader()
+    history_index = None
+    timings = broadcaster.timings
+    next_timing_update = 0.0
     while True:
-        try:
-            state_data = state_queue.get(block=False)
-           
-            state.connected = True
-            if state.enable_steering:
-                state.allow_submit = True
+        # wait (without polling) until the bridge connection hands over a frame
+        state_data = await frame_ingestor.nextFrame()
+        handled = time.time()
+        received = state_data.pop('received', None)
+        if 'shm' in state_data:
+            try:
+                state_data = frame_reader.resolve(state_data['shm'])
+            except OSError:
+                # e.g. bridge on another host (with the same host name) -> frames go over the connection
+                useSocketTransport()
+                frame_ingestor.frames_dropped += 1
+                # sync mode: the simulation waits for a reply to the lost frame -> let the user submit
+                state.connected = True
+                if state.enable_steering:
+                    state.allow_submit = True
+                continue
+            if state_data is None:
+                # overwritten by a newer frame or in a replaced segment, the newer frame is already on its way
+                frame_ingestor.frames_dropped += 1
+                continue
+        field = str(state_data.get('field', 'vorticity'))
+        unpackField(state_data, field)
+
+        # spans of this frame are tagged with its simulation step
+        step = int(state_data.get('step', -1))
+        timing = state_data.get('timing')
+        timings.begin(step, float(timing[0]) if timing is not None else None)
+        if timing is not None:
+            timings.recordBridge(timing, step, received)
+        if received is not None:
+            timings.record('ingest', (handled - received) * 1000.0)
+
+        state.connected = True
+        if state.enable_steering:
+            state.allow_submit = True
+
+        h, w = state_data[field].shape
 
-            h, w = state_data['vorticity'].shape
-            img_w = 1000
-            img_h = img_w * h // w
+        # colormap range (also used for frames only recorded in the history)
+        view.setValueRange(colorRangeFromStatistics(state_data, state.color_range_mode))
 
-            view.updateScale(img_w / w)
+        if state.history_live:
             view.updateData(state_data)
-            view_handler.pushFrame()
+            broadcaster.pushFrame()
+            history.append(view.getIndex(), state_data['barriers'], view.getFrameTime(), view.getGrid())
+        else:
+            # keep showing the frame being scrubbed, only record the new one
+            if history_index is None or history_index.shape != (h, w):
+                history_index = np.empty((h, w), dtype=np.uint8)
+            view.quantize(state_data[field], history_index, state_data.get('value_range'))
+            origin = state_data.get('origin', (0, 0))
+            grid = (int(origin[0]), int(origin[1]), int(state_data.get('spacing', 1)))
+            history.append(history_index, state_data['barriers'], round(time.time_ns() / 1000000), grid)
 
-            state.update({'vis_style': f'width: {img_w}px; height: {img_h}px; border: solid 2px #000000; box-sizing: content-box;'})
-            state.flush()
+        # archive writes happen on a background thread
+        if archive is not None:
+            archive.append(state_data, step, float(state_data.get('time', 0.0)))
 
-            if not state.enable_steering:
-                update_queue.put({})
-        except:
-            pass
-        await asyncio.sleep(0)
+        seq_range = history.getRange() or (0, 0)
+        if state.history_live:
+            state.history_position = seq_range[1]
 
-def runQueueManager(queue_data, queue_signal):
-    # register queues with Queue Manager
-    QueueManager.register('get_data_queue', callable=lambda:queue_data)
-    QueueManager.register('get_signal_queue', callable=lambda:queue_signal)
-    
-    # create Queue Manager
-    mgr = QueueManager(address=('127.0.0.1', 8000), authkey=b'ascent-trame')
-    
-    # start Queue Manager server
-    server = mgr.get_server()
-    server.serve_forever()
+        # statistics reduced by the simulation (only a few hundred bytes, the field is never gathered for them)
+        if 'fields' in state_data:
+            state.field_names = [str(name) for name in state_data['fields']]
+        state.sim_field = field
+        if 'volume_dims' in state_data:
+            sim_slice = ['xyz'[int(state_data['slice'][0])], int(state_data['slice'][1])]
+            if not state.volume_dims:
+                # first frame of a 3D run -> start the controls at the plane shown, no barriers on slices
+                state.slice_axis, state.slice_index = sim_slice
+                if state.interaction_mode in ('barrier', 'edit'):
+                    state.interaction_mode = 'zoom'
+            state.volume_dims = [int(v) for v in state_data['volume_dims']]
+            state.sim_slice = sim_slice
+        if 'max_flow_speed' in state_data:
+            max_speed = float(state_data['max_flow_speed'])
+            state.flow_speed_range = [min(DEFAULT_FLOW_SPEED_RANGE[0], round(max_speed / 5, 2)), max_speed]
+        if 'flow_speed' in state_data and float(state_data['flow_speed']) != state.sim_flow_speed:
+            # first frame or a submitted speed took effect -> slider follows the simulation
+            state.sim_flow_speed = float(state_data['flow_speed'])
+            state.flow_speed = state.sim_flow_speed
+        if 'stats' in state_data and state_data['stats'][3] > 0:
+            field_min, field_max, field_mean, field_count = (float(v) for v in state_data['stats'])
+            state.field_stats = {'min': field_min, 'max': field_max, 'mean': field_mean, 'count': int(field_count)}
+            # log scale, otherwise the most common values flatten everything else
+            state.field_histogram = np.log1p(np.asarray(state_data['histogram'], dtype=np.float64)).round(3).tolist()
+        state.color_range = [float(v) for v in view.getValueRange()]
+        if state.show_timings and handled >= next_timing_update:
+            # percentiles are recomputed at most once per second
+            state.timing_rows = timings.getSummary()
+            next_timing_update = handled + 1.0
+
+        # each client's area shrinks with its window (keeping the aspect ratio)
+        state.update({
+            'history_first': seq_range[0],
+            'history_last': seq_range[1],
+            'history_mb': history.getSize() / (1024 * 1024),
+            'sim_step': step,
+            'vis_style': viewAreaStyle(w, h),
+            'frames_dropped': frame_ingestor.frames_dropped,
+            'frames_coalesced': frame_ingestor.frames_coalesced
+        })
+        state.flush()
+
+        if not state.enable_steering and steering_mode == 'sync':
+            sendSteering({})
+
+async def replayArchive(directory, frame_ingestor, rate):
+    # frames are read one at a time, the archive is never loaded as a whole
+    archive = FrameArchiveReader(directory)
+    for position in range(len(archive)):
+        frame_ingestor.put(archive.read(position))
+        await asyncio.sleep(1.0 / rate)
+
+# stream tiers (RCA area 'view-<tier>' -> maximum encoded width, None for full resolution)
+STREAM_TIERS = {'full': None, 'high': 1600, 'medium': 1000, 'low': 500}
+
+# Encodes every frame once per stream tier that has viewers and fans the bytes out to all clients of
+# the tier -> encoding cost depends on the number of tiers, not on the number of clients
+class FrameBroadcaster:
+    def __init__(self, view, encoder_pool, steering_lock, codec='jpeg', roi_handler=None, timings=None):
+        self._view = view
+        self.timings = timings if timings is not None else FrameTimings()
+        self._steering_lock = steering_lock
+        self._roi_handler = roi_handler
+        self._clients = {}
+        self._adapters = [RcaViewAdapter(view, f'view-{tier}', encoder_pool, self, codec, max_width)
+                          for tier, max_width in STREAM_TIERS.items()]
+
+    """
+    return: RCA view adapters (one per tier) to register with Trame
+    """
+    def getAdapters(self):
+        return self._adapters
+
+    """
+    Select codec for all tiers by name (see frame_codecs)
+    return: None
+    """
+    def setCodec(self, codec_name):
+        for adapter in self._adapters:
+            adapter.setCodec(codec_name)
 
-# Trame RCA View Adapter
+    """
+    Encode and send current image of the view to every tier with viewers
+    return: None
+    """
+    def pushFrame(self):
+        for adapter in self._adapters:
+            adapter.pushFrame()
+
+    """
+    Track which tier a client watches and the size (CSS pixels) of its area
+    return: None
+    """
+    def onClientResize(self, adapter, origin, width, height):
+        previous = self._clients.get(origin)
+        if previous is not None and previous['adapter'] is not adapter:
+            # client switched tier -> stop encoding for it in the old one
+            previous['adapter'].removeClient(origin)
+        self._clients[origin] = {'adapter': adapter, 'size': (width, height)}
+
+    """
+    Forget a client that closed its page (tiers only it watched are no longer encoded)
+    return: None
+    """
+    def removeClient(self, origin):
+        self._clients.pop(origin, None)
+        for adapter in self._adapters:
+            adapter.removeClient(origin)
+
+    """
+    Handle interaction of a client (only the client holding the steering lock may draw barriers)
+    return: None
+    """
+    def onInteraction(self, origin, event):
+        client = self._clients.get(origin)
+        if client is None or not self._steering_lock.isOwner(origin):
+            return
+
+        # mouse positions are relative to the client's own area
+        view_width = self._view.getSize()[0]
+        if view_width > 0:
+            self._view.updateScale(client['size'][0] / view_width)
+
+        event_type = event['type']
+        rerender = False
+
+        if event_type == 'LeftButtonPress':
+            rerender = self._view.onLeftMouseButton(event['x'], event['y'], True)
+        elif event_type == 'LeftButtonRelease':
+            rerender = self._view.onLeftMouseButton(event['x'], event['y'], False)
+        elif event_type == 'MouseMove':
+            rerender = self._view.onMouseMove(event['x'], event['y'])
+
+        # zooming and panning ask the simulation for a different region
+        roi = self._view.takeRoiRequest()
+        if roi is not None and self._roi_handler is not None:
+            self._roi_handler(roi)
+
+        if rerender:
+            for adapter in self._adapters:
+                adapter.startInteraction()
+            self.pushFrame()
+
+# Trame RCA View Adapter (one stream tier)
 class RcaViewAdapter:
-    def __init__(self, view, name):
+    def __init__(self, view, name, encoder_pool, broadcaster, codec='jpeg', max_width=None):
         self._view = view
         self._streamer = None
+        self._encoder_pool = encoder_pool
+        self._broadcaster = broadcaster
+        self._codec = None
+        self._snapshot = None
+        self._encoding = False
+        self._frame_pending = False
+        self._last_frame_time = 0
+        self._max_width = max_width
+        self._client_sizes = {}
+        self._interactive_quality = 60
+        self._interactive_scale = 0.5
+        self._refine_delay = 0.25
+        self._interacting = False
+        self._refine_handle = None
         self._metadata = {
             'type': 'image/jpeg',
             'codec': '',
@@ -200,54 +977,147 @@ class RcaViewAdapter:
         }
 
         self.area_name = name
+        self.setCodec(codec)
+
+    """
+    Select codec for the stream by name (see frame_codecs)
+    return: None
+    """
+    def setCodec(self, codec_name):
+        self._codec = createCodec(codec_name)
+        self._metadata['type'] = self._codec.mime_type
+
+    """
+    Stop encoding for a client (it switched to another tier or closed its page)
+    return: None
+    """
+    def removeClient(self, origin):
+        self._client_sizes.pop(origin, None)
+
+    """
+    Switch to cheap frames until interaction stops for a moment
+    return: None
+    """
+    def startInteraction(self):
+        self._interacting = True
+        if self._refine_handle is not None:
+            self._refine_handle.cancel()
+        self._refine_handle = asyncio.get_running_loop().call_later(self._refine_delay, self._refineFrame)
 
     def pushFrame(self):
-        if self._streamer is not None:
-            asynchronous.create_task(self._asyncPushFrame())
+        # tiers nobody watches are not encoded
+        if self._streamer is None or not self._client_sizes:
+            return
+        if self._encoding:
+            # at most one encode in flight -> latest frame is encoded once the current one is done
+            self._frame_pending = True
+            return
+        self._encoding = True
+        asynchronous.create_task(self._asyncPushFrame())
 
     async def _asyncPushFrame(self):
-        frame_data = self._view.getFrame()
-        self._streamer.push_content(self.area_name, self._getMetadata(), frame_data.data)
+        loop = asyncio.get_running_loop()
+        timings = self._broadcaster.timings
+        self._frame_pending = True
+        try:
+            while self._frame_pending:
+                self._frame_pending = False
+                # snapshot image (scaled to what the clients display) so interaction can keep
+                # drawing into the view while encoding
+                image = self._view.getImage()
+                width, height, quality = self._getEncodeSettings(image)
+                if self._snapshot is None or self._snapshot.shape != (height, width, 3):
+                    self._snapshot = np.empty((height, width, 3), dtype=np.uint8)
+                if (width, height) == (image.shape[1], image.shape[0]):
+                    np.copyto(self._snapshot, image)
+                else:
+                    cv2.resize(image, (width, height), dst=self._snapshot, interpolation=cv2.INTER_AREA)
+                metadata = self._getMetadata(self._snapshot)
+                seq = timings.current_seq
+                with timings.span('encode', seq):
+                    frame_data = await loop.run_in_executor(self._encoder_pool, self._codec.encode, self._snapshot, quality)
+                if frame_data is not None and metadata['st'] >= self._last_frame_time:
+                    self._last_frame_time = metadata['st']
+                    # one push reaches every client subscribed to this tier
+                    with timings.span('push', seq):
+                        self._streamer.push_content(self.area_name, metadata, frame_data)
+                    timings.recordDelivered(seq)
+        finally:
+            self._encoding = False
     
-    def _getMetadata(self):
-        width, height = self._view.getSize()
-        self._metadata['w'] = width
-        self._metadata['h'] = height
-        self._metadata['st'] = self._view.getFrameTime()
-        return self._metadata
+    def _getEncodeSettings(self, image):
+        # never upscale, the browser already scales the image to the area
+        height, width = image.shape[:2]
+        scale = 1.0
+        if self._client_sizes:
+            # largest client of the tier decides, smaller ones are scaled down by the browser
+            client_width = max(size[0] for size in self._client_sizes.values())
+            client_height = max(size[1] for size in self._client_sizes.values())
+            scale = min(1.0, client_width / width, client_height / height)
+        if self._max_width is not None:
+            scale = min(scale, self._max_width / width)
+        quality = self._codec.default_quality
+        if self._interacting:
+            # cheap frames while dragging, refined once interaction stops
+            scale *= self._interactive_scale
+            quality = min(quality, self._interactive_quality)
+        return (max(1, round(width * scale)), max(1, round(height * scale)), quality)
+
+    def _refineFrame(self):
+        self._refine_handle = None
+        self._interacting = False
+        self.pushFrame()
+
+    def _getMetadata(self, image):
+        height, width = image.shape[:2]
+        metadata = dict(self._metadata)
+        metadata['w'] = width
+        metadata['h'] = height
+        metadata['st'] = self._view.getFrameTime()
+        return metadata
 
     def set_streamer(self, stream_manager):
         self._streamer = stream_manager
 
     def update_size(self, origin, size):
-        width = int(size.get('w', 400))
-        height = int(size.get('h', 300))
-        print(f'new size: {width}x{height}')
+        # render at the client's actual pixel size
+        pixel_ratio = size.get('p', 1)
+        css_width = size.get('w', 400)
+        css_height = size.get('h', 300)
+        width = int(css_width * pixel_ratio)
+        height = int(css_height * pixel_ratio)
+        if width > 0 and height > 0:
+            self._client_sizes[origin] = (width, height)
+            self._broadcaster.onClientResize(self, origin, css_width, css_height)
+            self.pushFrame()
 
     def on_interaction(self, origin, event):
-        event_type = event['type']
-        rerender = False
-
-        if event_type == 'LeftButtonPress':
-            rerender = self._view.onLeftMouseButton(event['x'], event['y'], True)
-        elif event_type == 'LeftButtonRelease':
-            rerender = self._view.onLeftMouseButton(event['x'], event['y'], False)
-        elif event_type == 'MouseMove':
-            rerender = self._view.onMouseMove(event['x'], event['y'])
-
-        if rerender:
-            frame_data = self._view.getFrame()
-            self._streamer.push_content(self.area_name, self._getMetadata(), frame_data.data)
+        self._broadcaster.onInteraction(origin, event)
 
 
 # Trame Custom View
 class AscentView:
-    def __init__(self):
+    def __init__(self, timings=None):
+        self._timings = timings if timings is not None else FrameTimings()
         self._data = None
+        # barriers in simulation grid coordinates, rasterized into the barrier layer for grid/shape in _mask_key
+        self._barriers = BarrierStore()
+        # barriers edited here and not submitted yet (incoming frames still carry the old ones)
+        self._barriers_dirty = False
+        # barriers submitted last, adopted from frames again once the simulation sends them back
+        self._submitted_barriers = None
+        self._mask_key = None
+        self._selected_barrier = None
         self._scale = 1.0
+        # image pixel (x, y) covers grid cells origin + spacing * (x, y) (level of detail)
+        self._grid = (0, 0, 1)
+        # size of the whole simulation plane in grid cells (None: not sent, e.g. archived frames)
+        self._plane_dims = None
+        self._value_range = DEFAULT_VALUE_RANGE
+        self._index = None
+        self._index_bgr = None
         self._base_image = None
-        self._image = np.zeros((2,1), dtype=np.uint8)
-        self._jpeg_quality = 94
+        self._image = np.zeros((2, 1, 3), dtype=np.uint8)
         self._frame_time = round(time.time_ns() / 1000000)
         self._colormaps = {
             'divergent': self._loadColorMap('resrc/colormap_divergent.png'),
@@ -258,10 +1128,29 @@ class AscentView:
         self._new_barrier = {'display': False, 'p0': None, 'p1': None}
         self._mouse_down = False
         self._mouse_start = {'x': 0, 'y': 0}
+        # 'barrier': draw barriers, 'zoom': select region of interest, 'pan': move region of interest
+        self._interaction_mode = 'barrier'
+        self._selection = {'display': False, 'p0': None, 'p1': None}
+        self._roi_request = None
 
     def _loadColorMap(self, filename):
+        # resample colormap to a 256 entry lookup table that cv2.LUT can use directly
         cmap = cv2.imread(filename, cv2.IMREAD_COLOR)
-        return cmap.reshape((cmap.shape[1], 3))
+        lut = cv2.resize(cmap, (256, 1), interpolation=cv2.INTER_AREA)
+        return lut.reshape((256, 1, 3))
+
+    def _allocateBuffers(self, shape):
+        # buffers are reused across frames and only reallocated when the data size changes
+        if self._index is None or self._index.shape != shape:
+            self._index = np.empty(shape, dtype=np.uint8)
+            self._index_bgr = np.empty(shape + (3,), dtype=np.uint8)
+            self._base_image = np.empty(shape + (3,), dtype=np.uint8)
+            self._image = np.empty(shape + (3,), dtype=np.uint8)
+            self._barrier_mask = np.zeros(shape, dtype=np.uint8)
+
+    def _applyColormap(self):
+        cv2.cvtColor(self._index, cv2.COLOR_GRAY2BGR, dst=self._index_bgr)
+        cv2.LUT(self._index_bgr, self._colormaps[self._cmap], dst=self._base_image)
 
     def _calculateBarrierEnd(self, start, end):
         dx = abs(end['x'] - start['x'])
@@ -273,15 +1162,99 @@ class AscentView:
             pos['x'] = start['x']
         return pos
 
-    def _renderBarriers(self):
-        # draw lines for barriers
-        self._image = self._base_image.copy()
-        for barrier in self._data['barriers']:
-            self._image = cv2.line(self._image, (barrier[0], barrier[1]), (barrier[2], barrier[3]), (0, 0, 0), 1)
+    def _newBarrierBounds(self):
+        if not self._new_barrier['display']:
+            return None
+        return self._lineBounds(self._new_barrier['p0'], self._new_barrier['p1'])
+
+    def _lineBounds(self, p0, p1):
+        # bounding box (x0, y0, x1, y1) of a 1 pixel wide line, end exclusive
+        return (min(p0['x'], p1['x']), min(p0['y'], p1['y']), max(p0['x'], p1['x']) + 1, max(p0['y'], p1['y']) + 1)
+
+    def _rasterizeBarriers(self):
+        # barrier layer: 1 where a barrier covers a pixel, all segments are drawn in one call
+        self._barrier_mask.fill(0)
+        if len(self._barriers) > 0:
+            cv2.polylines(self._barrier_mask, self._segmentsToImage(self._barriers.toArray()), False, 1, 1)
+        self._mask_key = (self._grid, self._barrier_mask.shape)
+
+    def _redrawBarrierRegion(self, bounds):
+        # rasterize only the segments crossing bounds (image pixels), e.g. after removing or moving one
+        height, width = self._barrier_mask.shape
+        x0, y0 = max(bounds[0], 0), max(bounds[1], 0)
+        x1, y1 = min(bounds[2], width), min(bounds[3], height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        region = self._barrier_mask[y0:y1, x0:x1]
+        region.fill(0)
+        origin_x, origin_y, spacing = self._grid
+        ids = self._barriers.query(origin_x + x0 * spacing, origin_y + y0 * spacing, origin_x + x1 * spacing, origin_y + y1 * spacing)
+        if ids.size > 0:
+            cv2.polylines(region, self._segmentsToImage(self._barriers.toArray()[ids], (x0, y0)), False, 1, 1)
+        self._compositeRegion((x0, y0, x1, y1))
+
+    def _segmentsToImage(self, segments, offset=(0, 0)):
+        # (N, 4) grid segments -> (N, 2, 2) pixel end points (same mapping as _gridToImage)
+        origin_x, origin_y, spacing = self._grid
+        points = (segments.reshape((-1, 2, 2)) - (origin_x, origin_y)) // spacing - offset
+        return points.astype(np.int32)
+
+    def _segmentBounds(self, segment):
+        p0 = self._gridToImage(segment[0], segment[1])
+        p1 = self._gridToImage(segment[2], segment[3])
+        return self._lineBounds({'x': p0[0], 'y': p0[1]}, {'x': p1[0], 'y': p1[1]})
+
+    def _setBarriers(self, barriers):
+        # local edits are kept until they are submitted and the simulation sends them back
+        if self._barriers_dirty:
+            return
+        if self._submitted_barriers is not None:
+            if not np.array_equal(np.asarray(barriers).reshape((-1, 4)), self._submitted_barriers):
+                return
+            self._submitted_barriers = None
+        # barriers usually come back from the simulation unchanged -> keep the rasterized layer
+        if not self._barriers.equals(barriers):
+            self._barriers.set(barriers)
+            self._selected_barrier = None
+            self._mask_key = None
+
+    def _gridToImage(self, x, y):
+        origin_x, origin_y, spacing = self._grid
+        return (int(x - origin_x) // spacing, int(y - origin_y) // spacing)
+
+    def _imageToGrid(self, x, y):
+        # center of the block of grid cells covered by the pixel
+        origin_x, origin_y, spacing = self._grid
+        return (origin_x + x * spacing + spacing // 2, origin_y + y * spacing + spacing // 2)
+
+    def _compositeRegion(self, bounds):
+        # rebuild image inside bounds from base image, barrier layer and new barrier layer
+        height, width = self._barrier_mask.shape
+        x0, y0 = max(bounds[0], 0), max(bounds[1], 0)
+        x1, y1 = min(bounds[2], width), min(bounds[3], height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        self._frame_time = round(time.time_ns() / 1000000)
+        region = self._image[y0:y1, x0:x1]
+        np.copyto(region, self._base_image[y0:y1, x0:x1])
+        np.copyto(region, 0, where=self._barrier_mask[y0:y1, x0:x1, None].view(np.bool_))
+        if self._selection['display']:
+            pt0 = (self._selection['p0']['x'] - x0, self._selection['p0']['y'] - y0)
+            pt1 = (self._selection['p1']['x'] - x0, self._selection['p1']['y'] - y0)
+            cv2.rectangle(region, pt0, pt1, (255, 255, 255), 1)
         if self._new_barrier['display']:
-            pt0 = (self._new_barrier['p0']['x'], self._new_barrier['p0']['y'])
-            pt1 = (self._new_barrier['p1']['x'], self._new_barrier['p1']['y'])
-            self._image = cv2.line(self._image, pt0, pt1, (0, 0, 0), 1)
+            pt0 = (self._new_barrier['p0']['x'] - x0, self._new_barrier['p0']['y'] - y0)
+            pt1 = (self._new_barrier['p1']['x'] - x0, self._new_barrier['p1']['y'] - y0)
+            cv2.line(region, pt0, pt1, (0, 0, 0), 1)
+        if self._selected_barrier is not None:
+            pt0, pt1 = self._segmentsToImage(self._barriers.toArray()[self._selected_barrier], (x0, y0))[0]
+            cv2.line(region, tuple(int(v) for v in pt0), tuple(int(v) for v in pt1), (0, 0, 255), 1)
+
+    def _renderBarriers(self):
+        # draw lines for barriers (barrier layer is only rasterized again when barriers or mapping changed)
+        if self._mask_key != (self._grid, self._barrier_mask.shape):
+            self._rasterizeBarriers()
+        self._compositeRegion((0, 0, self._image.shape[1], self._image.shape[0]))
 
     """
     return: size of view (width, height)
@@ -291,13 +1264,10 @@ class AscentView:
         return (width, height)
 
     """
-    return: jpeg encoded binary data
+    return: current image (updated in place)
     """
-    def getFrame(self):
-        result, encoded_img = cv2.imencode('.jpg', self._image, (cv2.IMWRITE_JPEG_QUALITY, self._jpeg_quality))
-        if result:
-            return encoded_img
-        return None
+    def getImage(self):
+        return self._image
 
     """
     return: time frame was created
@@ -309,11 +1279,16 @@ class AscentView:
     return list of barriers
     """
     def getBarriers(self):
-        barriers = None
-        if self._data is not None:
-            barriers = self._data['barriers']
-        else:
-            barriers = np.empty(shape=(0,0), dtype=np.int32)
+        return self._barriers.toArray().copy()
+
+    """
+    Hand the current barriers over for submitting (frames replace them again once they carry them)
+    return: list of barriers
+    """
+    def submitBarriers(self):
+        barriers = self.getBarriers()
+        self._barriers_dirty = False
+        self._submitted_barriers = barriers
         return barriers
 
     """
@@ -322,21 +1297,86 @@ class AscentView:
     def updateScale(self, scale):
         self._scale = scale
 
+    """
+    Set values mapped to the ends of the colormap (applies from the next frame)
+    return: None
+    """
+    def setValueRange(self, value_range):
+        self._value_range = (float(value_range[0]), float(value_range[1]))
+
+    """
+    return: values mapped to the ends of the colormap
+    """
+    def getValueRange(self):
+        return self._value_range
+
     """
     Update data and create new visualization
     return: None
     """
     def updateData(self, data):
         self._data = data
-        # apply colormap to data
-        val_min = -0.22
-        val_max = 0.22
-        vorticity = np.clip(data['vorticity'], val_min, val_max)
-        colormap = self._colormaps[self._cmap]
-        size = colormap.shape[0]
-        d_norm = ((size - 1) * ((vorticity - val_min) / (val_max - val_min))).astype(dtype=np.uint16)
-        self._base_image = colormap[d_norm]
+        origin = data.get('origin', (0, 0))
+        self._grid = (int(origin[0]), int(origin[1]), int(data.get('spacing', 1)))
+        if 'plane_dims' in data:
+            self._plane_dims = (int(data['plane_dims'][0]), int(data['plane_dims'][1]))
+        values = data[str(data.get('field', 'vorticity'))]
+        self._allocateBuffers(values.shape)
+        with self._timings.span('colormap'):
+            self.quantize(values, self._index, data.get('value_range'))
+            # apply colormap to data
+            self._applyColormap()
         # draw lines for barriers
+        with self._timings.span('barriers'):
+            self._setBarriers(data['barriers'])
+            self._renderBarriers()
+
+    """
+    Clip, normalize and quantize values to colormap indices in one pass (saturating cast clips)
+    Values already quantized by the bridge (unsigned integers covering source_range) are remapped linearly
+    return: uint8 array of indices (dst if given)
+    """
+    def quantize(self, values, dst=None, source_range=None):
+        val_min, val_max = self._value_range
+        alpha = 255.0 / (val_max - val_min)
+        beta = -val_min * alpha
+        if source_range is not None:
+            src_min, src_max = float(source_range[0]), float(source_range[1])
+            levels = np.iinfo(values.dtype).max
+            if levels == 255 and (src_min, src_max) == (val_min, val_max):
+                # already colormap indices
+                if dst is None:
+                    return values.copy()
+                np.copyto(dst, values)
+                return dst
+            # index = alpha * (src_min + q * (src_max - src_min) / levels) + beta
+            beta += alpha * src_min
+            alpha *= (src_max - src_min) / levels
+        return cv2.addWeighted(values, alpha, values, 0.0, beta, dst=dst, dtype=cv2.CV_8U)
+
+    """
+    return: colormap indices of the current frame (updated in place)
+    """
+    def getIndex(self):
+        return self._index
+
+    """
+    return: mapping of image to simulation grid (origin x, origin y, spacing)
+    """
+    def getGrid(self):
+        return self._grid
+
+    """
+    Show a frame from quantized colormap indices (e.g. from the frame history)
+    return: None
+    """
+    def showFrame(self, index, barriers, grid=(0, 0, 1)):
+        self._allocateBuffers(index.shape)
+        np.copyto(self._index, index)
+        self._grid = grid
+        self._data = {'barriers': barriers}
+        self._setBarriers(barriers)
+        self._applyColormap()
         self._renderBarriers()
 
     """
@@ -346,14 +1386,19 @@ class AscentView:
     def setColormap(self, cmap_name):
         self._cmap = cmap_name
         if self._data is not None:
-            self.updateData(self._data)
+            # quantized data is kept -> only the lookup has to be redone
+            self._applyColormap()
+            self._renderBarriers()
 
     """
 
     """
     def clearBarriers(self):
         if self._data is not None:
-            self._data['barriers'] = np.empty(shape=(0,0), dtype=np.int32)
+            self._barriers.clear()
+            self._barriers_dirty = True
+            self._selected_barrier = None
+            self._mask_key = None
             self._renderBarriers()
 
     """
@@ -364,6 +1409,10 @@ class AscentView:
         height = self._image.shape[0]
         mx = int(mouse_x / self._scale)
         my = height - int(mouse_y / self._scale)
+        if self._interaction_mode == 'edit':
+            return self._onEditMouseButton(mx, my, pressed)
+        if self._interaction_mode != 'barrier':
+            return self._onRegionMouseButton(mx, my, pressed)
         rerender = False
         if pressed:
             self._mouse_start['x'] = mx
@@ -373,14 +1422,16 @@ class AscentView:
             self._new_barrier['p1'] = self._mouse_start
         elif self._mouse_down:
             b_end = self._calculateBarrierEnd(self._mouse_start, {'x': mx, 'y': my})
-            if self._data is not None:
-                n_barrier = np.array([[self._mouse_start['x'], self._mouse_start['y'], b_end['x'], b_end['y']]], dtype=np.int32)
-                if self._data['barriers'].size == 0:
-                    self._data['barriers'] = n_barrier
-                else:
-                    self._data['barriers'] = np.concatenate((self._data['barriers'], n_barrier))
+            bounds = self._newBarrierBounds()
             self._new_barrier['display'] = False
-            self._renderBarriers()
+            if self._data is not None:
+                # barriers are kept in simulation grid coordinates
+                self._barriers.append(self._imageToGrid(self._mouse_start['x'], self._mouse_start['y']) +
+                                      self._imageToGrid(b_end['x'], b_end['y']))
+                self._barriers_dirty = True
+                # only the area covered by the rubber band line and the new barrier changes
+                cv2.line(self._barrier_mask, (self._mouse_start['x'], self._mouse_start['y']), (b_end['x'], b_end['y']), 1, 1)
+                self._compositeRegion(_unionBounds(bounds, self._lineBounds(self._mouse_start, b_end)))
             rerender = True
         self._mouse_down = pressed
         return rerender
@@ -394,13 +1445,140 @@ class AscentView:
         mx = int(mouse_x / self._scale)
         my = height - int(mouse_y / self._scale)
         rerender = False
-        if self._mouse_down:
+        if self._interaction_mode == 'zoom' and self._selection['display']:
+            # redraw only where the selection rectangle was and where it is now
+            old_bounds = self._lineBounds(self._selection['p0'], self._selection['p1'])
+            self._selection['p1'] = {'x': mx, 'y': my}
+            self._compositeRegion(_unionBounds(old_bounds, self._lineBounds(self._selection['p0'], self._selection['p1'])))
+            rerender = True
+        elif self._mouse_down and self._interaction_mode == 'edit' and self._selected_barrier is not None:
+            # preview the dragged barrier as rubber band line
+            dx, dy = mx - self._mouse_start['x'], my - self._mouse_start['y']
+            p0, p1 = self._segmentsToImage(self._barriers.toArray()[self._selected_barrier])[0]
+            old_bounds = self._newBarrierBounds()
+            self._new_barrier = {'display': True, 'p0': {'x': int(p0[0]) + dx, 'y': int(p0[1]) + dy},
+                                 'p1': {'x': int(p1[0]) + dx, 'y': int(p1[1]) + dy}}
+            self._compositeRegion(_unionBounds(old_bounds, self._newBarrierBounds()))
+            rerender = True
+        elif self._mouse_down and self._data is not None and self._interaction_mode == 'barrier':
             b_end = self._calculateBarrierEnd(self._mouse_start, {'x': mx, 'y': my})
+            # redraw only where the rubber band line was and where it is now
+            old_bounds = self._newBarrierBounds()
             self._new_barrier['p1'] = b_end
-            self._renderBarriers()
+            self._compositeRegion(_unionBounds(old_bounds, self._newBarrierBounds()))
             rerender = True
         return rerender
 
+    def _onEditMouseButton(self, mx, my, pressed):
+        rerender = False
+        if self._data is None:
+            pass
+        elif pressed:
+            # select the barrier under the mouse (or nothing)
+            self._mouse_start = {'x': mx, 'y': my}
+            previous = self._selected_barrier
+            grid_x, grid_y = self._imageToGrid(mx, my)
+            self._selected_barrier = self._barriers.hitTest(grid_x, grid_y, _PICK_TOLERANCE * self._grid[2])
+            for segment_id in {previous, self._selected_barrier} - {None}:
+                self._compositeRegion(self._segmentBounds(self._barriers.toArray()[segment_id]))
+            rerender = previous != self._selected_barrier
+        elif self._mouse_down and self._selected_barrier is not None:
+            # drop the dragged barrier, only the layer around its old and new position is rasterized again
+            bounds = self._newBarrierBounds()
+            self._new_barrier['display'] = False
+            spacing = self._grid[2]
+            dx, dy = (mx - self._mouse_start['x']) * spacing, (my - self._mouse_start['y']) * spacing
+            if dx != 0 or dy != 0:
+                old, new = self._barriers.move(self._selected_barrier, dx, dy)
+                self._barriers_dirty = True
+                self._redrawBarrierRegion(self._segmentBounds(old))
+                bounds = _unionBounds(bounds, self._segmentBounds(new))
+            if bounds is not None:
+                self._redrawBarrierRegion(bounds)
+            rerender = True
+        self._mouse_down = pressed
+        return rerender
+
+    def _onRegionMouseButton(self, mx, my, pressed):
+        rerender = False
+        if pressed:
+            self._mouse_start = {'x': mx, 'y': my}
+            if self._interaction_mode == 'zoom':
+                self._selection = {'display': True, 'p0': self._mouse_start, 'p1': self._mouse_start}
+        elif self._mouse_down and self._data is not None:
+            height, width = self._index.shape
+            origin_x, origin_y, spacing = self._grid
+            if self._interaction_mode == 'zoom':
+                bounds = self._lineBounds(self._selection['p0'], self._selection['p1'])
+                self._selection['display'] = False
+                self._compositeRegion(bounds)
+                x0, y0 = max(bounds[0], 0), max(bounds[1], 0)
+                x1, y1 = min(bounds[2], width), min(bounds[3], height)
+                # ignore clicks and tiny rectangles
+                if x1 - x0 >= 4 and y1 - y0 >= 4:
+                    self._roi_request = [origin_x + x0 * spacing, origin_y + y0 * spacing,
+                                         origin_x + x1 * spacing, origin_y + y1 * spacing]
+                rerender = True
+            else:
+                # move the region against the drag direction (content follows the mouse)
+                dx = (self._mouse_start['x'] - mx) * spacing
+                dy = (self._mouse_start['y'] - my) * spacing
+                if dx != 0 or dy != 0:
+                    x0, y0 = origin_x + dx, origin_y + dy
+                    if self._plane_dims is not None:
+                        # stop at the far edges so the region keeps its size (clipping would change the zoom)
+                        x0 = min(x0, self._plane_dims[0] - width * spacing)
+                        y0 = min(y0, self._plane_dims[1] - height * spacing)
+                    x0, y0 = max(0, x0), max(0, y0)
+                    self._roi_request = [x0, y0, x0 + width * spacing, y0 + height * spacing]
+        self._mouse_down = pressed
+        return rerender
+
+    """
+    Remove the barrier selected in 'edit' mode
+    return: whether a barrier was removed
+    """
+    def deleteSelectedBarrier(self):
+        if self._selected_barrier is None:
+            return False
+        segment = self._barriers.remove(self._selected_barrier)
+        self._barriers_dirty = True
+        self._selected_barrier = None
+        self._redrawBarrierRegion(self._segmentBounds(segment))
+        return True
+
+    """
+    Select what dragging with the left mouse button does ('barrier', 'zoom', 'pan' or 'edit')
+    return: None
+    """
+    def setInteractionMode(self, mode):
+        self._interaction_mode = mode
+        self._mouse_down = False
+        if mode != 'edit' and self._selected_barrier is not None:
+            bounds = self._segmentBounds(self._barriers.toArray()[self._selected_barrier])
+            self._selected_barrier = None
+            self._compositeRegion(bounds)
+
+    """
+    Remove and return region of interest selected by zooming or panning
+    return: [x0, y0, x1, y1] in simulation grid cells (end exclusive), or None if nothing was selected
+    """
+    def takeRoiRequest(self):
+        roi = self._roi_request
+        self._roi_request = None
+        return roi
+
+# distance (in pixels) within which a click selects a barrier
+_PICK_TOLERANCE = 3
+
+def _unionBounds(bounds_a, bounds_b):
+    if bounds_a is None:
+        return bounds_b
+    if bounds_b is None:
+        return bounds_a
+    return (min(bounds_a[0], bounds_b[0]), min(bounds_a[1], bounds_b[1]),
+            max(bounds_a[2], bounds_b[2]), max(bounds_a[3], bounds_b[3]))
+
 
 if __name__ == '__main__':
     main()